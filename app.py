@@ -1,13 +1,21 @@
 import streamlit as st
 import uuid
-from datetime import datetime
+from datetime import datetime, time
 from auth import login_page, logout
+from passwords import get_hash_metrics
+import instrumentation
+from settings import get_setting
 from database import (
-    db, get_clubs, join_club_request, approve_club_request, 
-    create_chat, send_message, get_chat_messages, create_call, 
-    get_calls, get_user_calls, update_call_status, create_confession,
-    get_confessions_for_students, get_confessions_for_admin, like_confession,
-    get_likes_count, add_comment, get_comments_for_students, create_announcement
+    get_students, resolve_names, get_announcements, get_clubs, update_club, get_clubs_for_user,
+    count_clubs_for_user, join_club_request,
+    get_club_requests, approve_club_request, reject_club_request,
+    create_chat, send_message, get_chat_messages, get_messages_since, get_chat_version,
+    get_inbox, mark_chat_read, create_call, 
+    get_calls, get_user_calls, update_call_status, heartbeat_call, start_maintenance, create_confession,
+    get_confession_feed, get_moderation_queue, moderate_confessions,
+    like_confession, has_liked,
+    get_likes_count, add_comment, get_comments_for_students, create_announcement, get_stats, search,
+    find_students, CALL_HEARTBEAT_SECONDS
 )
 
 # Page configuration
@@ -19,6 +27,9 @@ st.set_page_config(
 )
 
 def main():
+    # Times out abandoned calls and archives old records in the background
+    start_maintenance()
+    
     # Initialize session state
     if 'user' not in st.session_state:
         st.session_state.user = None
@@ -71,12 +82,15 @@ def show_main_app():
             st.subheader("Admin Tools")
             pages = [
                 "📊 Dashboard", "👥 User Management", "📢 Announcements", 
-                "👥 Club Management", "🗣️ Confessions", "💬 Chat", "📞 Calls"
+                "👥 Club Management", "🗣️ Confessions", "💬 Chat", "📞 Calls", "⚡ Performance"
             ]
             
             selected_page = st.radio("Go to:", pages, key="admin_nav")
             st.session_state.current_page = selected_page
         
+        st.markdown("---")
+        show_search()
+        
         st.markdown("---")
         if st.button("🚪 Logout", use_container_width=True):
             logout()
@@ -84,10 +98,28 @@ def show_main_app():
     # Main content area
     display_current_page()
 
+SEARCH_ICONS = {"announcement": "📢", "club": "👥", "confession": "🗣️"}
+
+def show_search():
+    query = st.text_input("🔍 Search", key="search_query", placeholder="Announcements, clubs, confessions...")
+    if query.strip():
+        results = search(query, limit=8)
+        if not results:
+            st.caption("No matches")
+        for result in results:
+            title = result['title'] if result['kind'] != "confession" else f"Confession · {result['title']}"
+            st.markdown(f"{SEARCH_ICONS[result['kind']]} **{title}**")
+            st.caption(result['snippet'][:100])
+
 def display_current_page():
     """Display the current page based on selection"""
     page = st.session_state.current_page
     
+    # Storage reads and writes made while rendering are attributed to this page
+    with instrumentation.track_page(page):
+        show_page(page)
+
+def show_page(page):
     if st.session_state.role == 'student':
         if page == "🏠 Home":
             show_student_home()
@@ -118,6 +150,8 @@ def display_current_page():
             show_chat()
         elif page == "📞 Calls":
             show_calls()
+        elif page == "⚡ Performance":
+            show_performance()
 
 # Student Pages
 def show_student_home():
@@ -125,24 +159,20 @@ def show_student_home():
     st.write(f"Hello, {st.session_state.user['name']}! 👋")
     
     # Quick stats
+    stats = get_stats()
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        clubs = get_clubs()
-        user_clubs = sum(1 for club in clubs.values() if st.session_state.user['email'] in club.get('members', []))
-        st.metric("Clubs Joined", user_clubs)
+        st.metric("Clubs Joined", count_clubs_for_user(st.session_state.user['email']))
     
     with col2:
-        announcements = db.load_data("announcements.json")
-        st.metric("Announcements", len(announcements))
+        st.metric("Announcements", stats['announcements'])
     
     with col3:
-        students = db.load_data("students.json")
-        st.metric("Campus Members", len(students))
+        st.metric("Campus Members", stats['students'])
     
     with col4:
-        confessions = get_confessions_for_students()
-        st.metric("Confessions", len(confessions))
+        st.metric("Confessions", stats['approved_confessions'])
     
     st.divider()
     
@@ -177,7 +207,7 @@ def show_student_home():
     
     # Recent announcements
     st.subheader("📢 Recent Announcements")
-    announcements = db.load_data("announcements.json")[-3:]
+    announcements = get_announcements(limit=3)
     
     if announcements:
         for announcement in announcements:
@@ -190,7 +220,7 @@ def show_student_home():
                     st.write(f"{message[:150]}...")
                 else:
                     st.write(message)
-                st.caption(f"By {announcement.get('author', 'Admin')} • {announcement.get('created_date', '')[:10]}")
+                st.caption(announcement_caption(announcement))
                 st.divider()
     else:
         st.info("No announcements yet.")
@@ -210,8 +240,7 @@ def show_student_profile():
     
     with col2:
         st.subheader("Club Memberships")
-        clubs = get_clubs()
-        user_clubs = [club for club in clubs.values() if st.session_state.user['email'] in club.get('members', [])]
+        user_clubs = get_clubs_for_user(st.session_state.user['email'])
         
         if user_clubs:
             for club in user_clubs:
@@ -222,7 +251,7 @@ def show_student_profile():
 def show_announcements():
     st.title("📢 Campus Announcements")
     
-    announcements = db.load_data("announcements.json")
+    announcements = get_announcements()
     
     if announcements:
         for announcement in announcements:
@@ -231,11 +260,17 @@ def show_announcements():
                 emoji = "🔴" if priority == "high" else "🟡" if priority == "medium" else "🟢"
                 st.write(f"{emoji} **{announcement.get('title', 'No Title')}**")
                 st.write(announcement.get('message', ''))
-                st.caption(f"By {announcement.get('author', 'Admin')} • {announcement.get('created_date', '')[:10]}")
+                st.caption(announcement_caption(announcement))
                 st.divider()
     else:
         st.info("No announcements available.")
 
+def announcement_caption(announcement):
+    caption = f"By {announcement.get('author', 'Admin')} • {(announcement.get('created_date') or '')[:10]}"
+    if announcement.get('expiry_date'):
+        caption += f" • Until {announcement['expiry_date'][:10]}"
+    return caption
+
 def show_clubs():
     st.title("👥 Campus Clubs")
     
@@ -277,7 +312,37 @@ def show_chat():
     else:
         show_chat_list()
 
+# Matches shown by a student picker; everyone else is one more letter away
+DIRECTORY_RESULTS = 8
+
+def pick_students(key, exclude=()):
+    """Search box over the student directory; returns the top matches for what was typed"""
+    query = st.text_input("🔍 Find a student", key=key, placeholder="Name, email or major")
+    if not query.strip():
+        st.caption("Start typing to find a student.")
+        return []
+    matches = find_students(query, limit=DIRECTORY_RESULTS, exclude=exclude)
+    if not matches:
+        st.info("No students match your search.")
+    return matches
+
 def show_chat_list():
+    my_email = st.session_state.user['email']
+    conversations = get_inbox(my_email)
+    if conversations:
+        st.subheader("My Conversations")
+        peer_names = resolve_names({conversation['peer'] for conversation in conversations})
+        for conversation in conversations:
+            peer_name = "Admin" if conversation['peer'] == "MES.edu" else peer_names[conversation['peer']]
+            unread = f" · 🔴 {conversation['unread']} new" if conversation['unread'] else ""
+            if st.button(f"💬 {peer_name}{unread}", key=f"inbox_{conversation['chat_id']}"):
+                st.session_state.current_chat = conversation['chat_id']
+                st.rerun()
+            if conversation['last_message'] is not None:
+                sender = "You" if conversation['last_sender'] == my_email else peer_name
+                st.caption(f"{sender}: {conversation['last_message']} · {conversation['last_timestamp'][:16].replace('T', ' ')}")
+        st.divider()
+    
     st.subheader("Start a Conversation")
     
     if st.session_state.role == 'student':
@@ -291,62 +356,102 @@ def show_chat_list():
         st.divider()
         
         # Other students
-        students = db.load_data("students.json")
-        other_students = [s for s in students.items() if s[0] != st.session_state.user['email']]
-        
-        if other_students:
-            st.write("**Other Students**")
-            for email, student in other_students:
-                if st.button(f"💬 {student['name']} ({student.get('major', 'Student')})", key=f"chat_{email}"):
-                    chat_id = create_chat(st.session_state.user['email'], email)
-                    st.session_state.current_chat = chat_id
-                    st.rerun()
-        else:
-            st.info("No other students registered yet.")
+        st.write("**Other Students**")
+        for student in pick_students("chat_student_search", exclude=[my_email]):
+            email = student['email']
+            if st.button(f"💬 {student['name']} ({student.get('major') or 'Student'})", key=f"chat_{email}"):
+                chat_id = create_chat(my_email, email)
+                st.session_state.current_chat = chat_id
+                st.rerun()
     
     else:  # Admin
-        students = db.load_data("students.json")
-        
-        if students:
-            for email, student in students.items():
-                if st.button(f"💬 {student['name']} - {student.get('major', 'Student')}", key=f"admin_chat_{email}"):
-                    chat_id = create_chat("MES.edu", email)
-                    st.session_state.current_chat = chat_id
-                    st.rerun()
-        else:
-            st.info("No students registered yet.")
+        for student in pick_students("admin_chat_search"):
+            email = student['email']
+            if st.button(f"💬 {student['name']} - {student.get('major') or 'Student'}", key=f"admin_chat_{email}"):
+                chat_id = create_chat("MES.edu", email)
+                st.session_state.current_chat = chat_id
+                st.rerun()
+
+CHAT_PAGE_SIZE = 50
+# How often the open chat checks for new messages
+CHAT_POLL_SECONDS = 2
 
 def show_chat_messages():
     chat_id = st.session_state.current_chat
-    messages = get_chat_messages(chat_id)
     
     # Display chat header
     st.subheader("Chat Messages")
     
-    # Display messages
-    chat_container = st.container()
-    with chat_container:
-        for msg in messages:
-            if msg['sender'] == st.session_state.user['email']:
-                st.write(f"**You:** {msg['message']}")
-            else:
-                sender_name = "Admin" if msg['sender'] == "MES.edu" else msg['sender']
-                st.write(f"**{sender_name}:** {msg['message']}")
-            st.caption(f"Sent at {msg['timestamp'][11:16]}")
-    
-    # Message input
-    st.divider()
-    new_message = st.text_input("Type your message...", key="new_message")
+    show_live_chat(chat_id)
     
-    col1, col2 = st.columns([1, 4])
-    with col1:
-        if st.button("Send") and new_message.strip():
-            send_message(chat_id, st.session_state.user['email'], new_message.strip())
-            st.rerun()
-    with col2:
-        if st.button("Back to Chat List"):
-            st.session_state.current_chat = None
-            st.rerun()
+    if st.button("Back to Chat List"):
+        st.session_state.current_chat = None
+        st.session_state.chat_window_for = None
+        st.rerun()
+
+@st.fragment(run_every=CHAT_POLL_SECONDS)
+def show_live_chat(chat_id):
+    """Message list and input; reruns on its own without reloading the rest of the page.
+    
+    Each poll only compares the chat's version counter. Messages are fetched
+    when it changes, and then only those after the last one shown.
+    """
+    # Fragment reruns skip display_current_page; count their storage traffic here too
+    with instrumentation.track_page(st.session_state.current_page):
+        my_email = st.session_state.user['email']
+        if st.session_state.get('chat_window_for') != chat_id:
+            st.session_state.chat_window_for = chat_id
+            st.session_state.chat_version = get_chat_version(chat_id)
+            st.session_state.chat_messages = get_chat_messages(chat_id, limit=CHAT_PAGE_SIZE)
+            st.session_state.chat_has_older = len(st.session_state.chat_messages) == CHAT_PAGE_SIZE
+            st.session_state.chat_names = {}
+            mark_chat_read(chat_id, my_email)
+        else:
+            version = get_chat_version(chat_id)
+            if version != st.session_state.chat_version:
+                st.session_state.chat_version = version
+                messages = st.session_state.chat_messages
+                new_messages = get_messages_since(chat_id, messages[-1]['id'] if messages else None)
+                messages.extend(new_messages)
+                if any(msg['sender'] != my_email for msg in new_messages):
+                    mark_chat_read(chat_id, my_email)
+        messages = st.session_state.chat_messages
+        
+        if st.session_state.chat_has_older:
+            st.button("⬆️ Load older messages", on_click=load_older_messages, args=(chat_id,))
+        
+        # Display messages; names are resolved once per sender
+        sender_names = st.session_state.chat_names
+        unknown_senders = {msg['sender'] for msg in messages} - sender_names.keys()
+        if unknown_senders:
+            sender_names.update(resolve_names(unknown_senders))
+        chat_container = st.container()
+        with chat_container:
+            for msg in messages:
+                if msg['sender'] == st.session_state.user['email']:
+                    st.write(f"**You:** {msg['message']}")
+                else:
+                    sender_name = "Admin" if msg['sender'] == "MES.edu" else sender_names[msg['sender']]
+                    st.write(f"**{sender_name}:** {msg['message']}")
+                st.caption(f"Sent at {msg['timestamp'][11:16]}")
+        
+        # Message input
+        st.divider()
+        st.text_input("Type your message...", key="new_message")
+        st.button("Send", on_click=send_chat_message, args=(chat_id,))
+
+def load_older_messages(chat_id):
+    messages = st.session_state.chat_messages
+    older = get_chat_messages(chat_id, before=messages[0]['id'], limit=CHAT_PAGE_SIZE) if messages else []
+    st.session_state.chat_messages = older + messages
+    st.session_state.chat_has_older = len(older) == CHAT_PAGE_SIZE
+
+def send_chat_message(chat_id):
+    # Runs before the fragment reruns, which then picks the message up as new
+    text = st.session_state.new_message.strip()
+    if text:
+        send_message(chat_id, st.session_state.user['email'], text)
+        st.session_state.new_message = ""
 
 def show_calls():
     st.title("📞 Voice/Video Calls")
@@ -368,25 +473,22 @@ def show_call_dashboard():
             st.rerun()
     else:
         # Admin can call students
-        students = db.load_data("students.json")
-        
-        if students:
-            for email, student in students.items():
-                if st.button(f"📞 Call {student['name']}", key=f"call_{email}", use_container_width=True):
-                    st.session_state.start_call_with = email
-                    st.rerun()
-        else:
-            st.info("No students available to call.")
+        for student in pick_students("call_student_search"):
+            email = student['email']
+            if st.button(f"📞 Call {student['name']}", key=f"call_{email}", use_container_width=True):
+                st.session_state.start_call_with = email
+                st.rerun()
     
     st.divider()
     st.subheader("Call History")
     
-    calls = get_user_calls(st.session_state.user['email'])
-    if calls:
-        for call in calls[-5:]:
+    recent_calls = get_user_calls(st.session_state.user['email'], limit=5)
+    if recent_calls:
+        names = resolve_names({p for call in recent_calls for p in call['participants']})
+        for call in recent_calls:
             with st.container():
                 other_participants = [p for p in call['participants'] if p != st.session_state.user['email']]
-                other_user = other_participants[0] if other_participants else "Unknown"
+                other_user = names[other_participants[0]] if other_participants else "Unknown"
                 
                 col1, col2, col3 = st.columns([2, 1, 1])
                 with col1:
@@ -402,8 +504,7 @@ def show_call_dashboard():
 
 def show_call_interface():
     target_email = st.session_state.start_call_with
-    students = db.load_data("students.json")
-    target_name = students.get(target_email, {}).get('name', 'User') if target_email != "MES.edu" else "Administrator"
+    target_name = resolve_names([target_email])[target_email] if target_email != "MES.edu" else "Administrator"
     
     st.title(f"📞 Calling {target_name}")
     
@@ -438,12 +539,11 @@ def show_active_call():
     
     participants = call['participants']
     other_user = [p for p in participants if p != st.session_state.user['email']][0]
-    students = db.load_data("students.json")
-    other_name = students.get(other_user, {}).get('name', 'User') if other_user != "MES.edu" else "Administrator"
+    other_name = resolve_names([other_user])[other_user] if other_user != "MES.edu" else "Administrator"
     
     st.write(f"**In call with:** {other_name}")
     st.write(f"**Call type:** {call['type'].title()} Call")
-    st.write("**Status:** 🔴 Live")
+    show_call_heartbeat(call['id'])
     
     # Call controls
     col1, col2, col3 = st.columns(3)
@@ -463,6 +563,21 @@ def show_active_call():
             st.success("Call ended")
             st.rerun()
 
+@st.fragment(run_every=CALL_HEARTBEAT_SECONDS)
+def show_call_heartbeat(call_id):
+    """Call status; each rerun tells the reaper this call is still open"""
+    # Fragment reruns skip display_current_page; count their storage traffic here too
+    with instrumentation.track_page(st.session_state.current_page):
+        if heartbeat_call(call_id):
+            st.write("**Status:** 🔴 Live")
+        else:
+            st.warning("This call has ended.")
+            if st.button("Back to Calls"):
+                st.session_state.active_call = None
+                st.rerun()
+
+CONFESSION_PAGE_SIZE = 20
+
 def show_confessions():
     st.title("🗣️ Campus Confessions")
     
@@ -487,7 +602,6 @@ def show_confessions():
                         "user_email": st.session_state.user['email'],
                         "created_date": datetime.now().isoformat(),
                         "is_approved": st.session_state.role == 'admin',  # Auto-approve for admin
-                        "likes": [],
                         "comments": []
                     }
                     
@@ -500,7 +614,10 @@ def show_confessions():
     
     with tab2:
         st.subheader("Campus Confessions")
-        confessions = get_confessions_for_students()
+        # Cursors of the pages above the current one; the feed is newest first
+        if 'confession_cursors' not in st.session_state:
+            st.session_state.confession_cursors = [None]
+        confessions, next_cursor = get_confession_feed(st.session_state.confession_cursors[-1], CONFESSION_PAGE_SIZE)
         
         if confessions:
             for confession in confessions:
@@ -509,13 +626,14 @@ def show_confessions():
                     st.write(confession['text'])
                     
                     # Likes and comments
-                    likes_count = len(confession.get('likes', []))
+                    likes_count = get_likes_count(confession)
                     comments_count = len(confession.get('comments', []))
                     
                     col1, col2, col3 = st.columns([1, 1, 2])
                     
                     with col1:
-                        if st.button(f"❤️ {likes_count}", key=f"like_{confession['id']}"):
+                        liked = has_liked(confession['id'], st.session_state.user['email'])
+                        if st.button(f"❤️ {likes_count}", key=f"like_{confession['id']}", disabled=liked):
                             if like_confession(confession['id'], st.session_state.user['email']):
                                 st.success("Liked!")
                                 st.rerun()
@@ -557,6 +675,16 @@ def show_confessions():
                                         st.rerun()
                     
                     st.divider()
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                if len(st.session_state.confession_cursors) > 1 and st.button("⬅️ Newer"):
+                    st.session_state.confession_cursors.pop()
+                    st.rerun()
+            with col2:
+                if next_cursor and st.button("Older ➡️"):
+                    st.session_state.confession_cursors.append(next_cursor)
+                    st.rerun()
         else:
             st.info("No confessions yet. Be the first to share!")
 
@@ -565,24 +693,32 @@ def show_admin_dashboard():
     st.title("📊 Admin Dashboard")
     
     # Statistics
-    col1, col2, col3, col4 = st.columns(4)
+    stats = get_stats()
+    col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        students = db.load_data("students.json")
-        st.metric("Total Students", len(students))
+        st.metric("Total Students", stats['students'])
     
     with col2:
-        clubs = get_clubs()
-        st.metric("Active Clubs", len(clubs))
+        st.metric("Active Clubs", stats['clubs'])
     
     with col3:
-        announcements = db.load_data("announcements.json")
-        st.metric("Announcements", len(announcements))
+        st.metric("Announcements", stats['announcements'])
     
     with col4:
-        confessions = get_confessions_for_admin()
-        pending_confessions = len([c for c in confessions if not c.get('is_approved', False)])
-        st.metric("Pending Confessions", pending_confessions)
+        st.metric("Pending Confessions", stats['pending_confessions'])
+    
+    with col5:
+        st.metric("Messages Today", stats['messages_today'])
+    
+    with st.expander("🔐 Password Hashing"):
+        hash_metrics = get_hash_metrics()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Workers", f"{hash_metrics['running']}/{hash_metrics['workers']} busy")
+        col2.metric("Queue Depth", hash_metrics['queue_depth'], help=f"Peak: {hash_metrics['max_queue_depth']}")
+        col3.metric("Avg Wait", f"{hash_metrics['avg_wait_ms']} ms")
+        col4.metric("Hash Time (p95)", f"{hash_metrics['p95_hash_ms']} ms")
+        st.caption(f"bcrypt cost {hash_metrics['rounds']} · {hash_metrics['completed']} hashes since start")
     
     st.divider()
     
@@ -611,22 +747,20 @@ def show_admin_dashboard():
     st.subheader("Recent Activity")
     
     # Pending club requests
-    requests = db.load_data("club_requests.json")
-    pending_requests = [r for r in requests if r.get('status') == 'pending']
-    
-    if pending_requests:
-        st.write(f"**Pending Club Join Requests:** {len(pending_requests)}")
-        for request in pending_requests[:3]:
-            student_email = request['student_email']
-            student = students.get(student_email, {})
-            st.write(f"• {student.get('name', student_email)} wants to join a club")
+    if stats['pending_club_requests']:
+        st.write(f"**Pending Club Join Requests:** {stats['pending_club_requests']}")
+        # Only the first few are shown, so stop scanning once they are found
+        pending_requests = get_club_requests(status='pending', limit=3)
+        names = resolve_names([request['student_email'] for request in pending_requests])
+        for request in pending_requests:
+            st.write(f"• {names[request['student_email']]} wants to join a club")
     else:
         st.write("No pending club requests")
 
 def show_user_management():
     st.title("👥 User Management")
     
-    students = db.load_data("students.json")
+    students = get_students()
     
     if students:
         st.subheader(f"Registered Students ({len(students)})")
@@ -644,10 +778,7 @@ def show_user_management():
                     st.write(f"Year: {student.get('year', 'Not specified')}")
                 
                 with col3:
-                    # Count clubs joined
-                    clubs = get_clubs()
-                    clubs_joined = sum(1 for club in clubs.values() if email in club.get('members', []))
-                    st.write(f"Clubs: {clubs_joined}")
+                    st.write(f"Clubs: {count_clubs_for_user(email)}")
                 
                 st.divider()
     else:
@@ -662,6 +793,7 @@ def show_announcement_management():
             title = st.text_input("Announcement Title")
             message = st.text_area("Announcement Message", height=100)
             priority = st.selectbox("Priority Level", ["low", "medium", "high"])
+            expires_on = st.date_input("Expires on (optional)", value=None, min_value=datetime.now().date())
             
             if st.form_submit_button("Publish Announcement"):
                 if title and message:
@@ -673,7 +805,8 @@ def show_announcement_management():
                         "priority": priority,
                         "author": st.session_state.user['name'],
                         "created_date": datetime.now().isoformat(),
-                        "expiry_date": None
+                        # Shown through the end of the chosen day, then archived
+                        "expiry_date": datetime.combine(expires_on, time.max).isoformat() if expires_on else None
                     }
                     if create_announcement(announcement_data):
                         st.success("Announcement published successfully!")
@@ -685,7 +818,7 @@ def show_announcement_management():
     
     # Existing announcements
     st.subheader("Existing Announcements")
-    announcements = db.load_data("announcements.json")
+    announcements = get_announcements()
     
     if announcements:
         for announcement in announcements:
@@ -694,7 +827,7 @@ def show_announcement_management():
                 emoji = "🔴" if priority == "high" else "🟡" if priority == "medium" else "🟢"
                 st.write(f"{emoji} **{announcement['title']}**")
                 st.write(announcement['message'])
-                st.caption(f"By {announcement.get('author', 'Admin')} • {announcement['created_date'][:10]}")
+                st.caption(announcement_caption(announcement))
                 st.divider()
     else:
         st.info("No announcements created yet.")
@@ -703,19 +836,18 @@ def show_club_management():
     st.title("👥 Club Management")
     
     clubs = get_clubs()
-    requests = db.load_data("club_requests.json")
-    pending_requests = [r for r in requests if r.get('status') == 'pending']
+    pending_requests = get_club_requests(status='pending')
     
     # Pending requests
     if pending_requests:
         st.subheader("📥 Pending Join Requests")
+        students = get_students()
         for request in pending_requests:
             with st.container():
                 student_email = request['student_email']
                 club_id = request['club_id']
                 club = clubs.get(club_id, {})
                 
-                students = db.load_data("students.json")
                 student = students.get(student_email, {})
                 
                 col1, col2, col3 = st.columns([3, 2, 1])
@@ -733,6 +865,10 @@ def show_club_management():
                         if approve_club_request(request['id'], club_id, student_email):
                             st.success("Request approved!")
                             st.rerun()
+                    if st.button("Reject", key=f"reject_{request['id']}"):
+                        if reject_club_request(request['id']):
+                            st.success("Request rejected.")
+                            st.rerun()
                 
                 st.divider()
     else:
@@ -746,79 +882,191 @@ def show_club_management():
             st.write(f"**Schedule:** {club.get('meeting_schedule', 'Not set')}")
             st.write(f"**Location:** {club.get('location', 'Not set')}")
             
+            with st.form(f"edit_club_{club_id}"):
+                name = st.text_input("Name", value=club['name'])
+                description = st.text_area("Description", value=club['description'])
+                meeting_schedule = st.text_input("Schedule", value=club.get('meeting_schedule', ''))
+                location = st.text_input("Location", value=club.get('location', ''))
+                if st.form_submit_button("Save Changes"):
+                    if update_club(club_id, {"name": name, "description": description,
+                                             "meeting_schedule": meeting_schedule, "location": location}):
+                        st.success("Club updated!")
+                        st.rerun()
+            
             members = club.get('members', [])
             if members:
                 st.write("**Members:**")
+                names = resolve_names(members)
                 for member_email in members:
-                    students = db.load_data("students.json")
-                    student = students.get(member_email, {})
-                    st.write(f"• {student.get('name', member_email)}")
+                    st.write(f"• {names[member_email]}")
             else:
                 st.write("No members yet")
 
+MODERATION_PAGE_SIZE = 25
+
 def show_confession_management():
     st.title("🗣️ Confession Management")
     
-    confessions = get_confessions_for_admin()
-    pending_confessions = [c for c in confessions if not c.get('is_approved', False)]
+    # Pending approval, oldest first; pages hold only pending confessions
+    st.subheader(f"⏳ Pending Approval ({get_stats()['pending_confessions']})")
+    if 'moderation_cursors' not in st.session_state:
+        st.session_state.moderation_cursors = [None]
+    pending_confessions, next_cursor = get_moderation_queue(st.session_state.moderation_cursors[-1],
+                                                            MODERATION_PAGE_SIZE)
     
-    # Pending approval
     if pending_confessions:
-        st.subheader("⏳ Pending Approval")
-        for confession in pending_confessions:
-            with st.container():
-                st.write(f"**{confession['category']}**")
+        with st.form("moderation_queue"):
+            selected = []
+            for confession in pending_confessions:
+                if st.checkbox(f"**{confession['category']}** · {confession['created_date'][:10]}",
+                               key=f"moderate_{confession['id']}"):
+                    selected.append(confession['id'])
                 st.write(confession['text'])
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Approve", key=f"approve_{confession['id']}"):
-                        # Approve confession
-                        confessions_data = db.load_data("confessions.json")
-                        for conf in confessions_data:
-                            if conf['id'] == confession['id']:
-                                conf['is_approved'] = True
-                                break
-                        db.save_data("confessions.json", confessions_data)
-                        st.success("Confession approved!")
-                        st.rerun()
-                
-                with col2:
-                    if st.button("Delete", key=f"delete_{confession['id']}"):
-                        # Delete confession
-                        confessions_data = [c for c in db.load_data("confessions.json") if c['id'] != confession['id']]
-                        db.save_data("confessions.json", confessions_data)
-                        st.success("Confession deleted!")
-                        st.rerun()
-                
                 st.divider()
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                approve = st.form_submit_button("✅ Approve selected")
+            with col2:
+                reject = st.form_submit_button("🚫 Reject selected")
+            with col3:
+                approve_page = st.form_submit_button("✅ Approve whole page")
+        
+        if approve_page:
+            selected = [confession['id'] for confession in pending_confessions]
+        if (approve or reject or approve_page) and not selected:
+            st.warning("Select at least one confession.")
+        elif approve or approve_page:
+            count = moderate_confessions(selected, "approve")
+            st.session_state.moderation_cursors = [None]
+            st.success(f"Approved {count} confessions!")
+            st.rerun()
+        elif reject:
+            count = moderate_confessions(selected, "reject")
+            st.session_state.moderation_cursors = [None]
+            st.success(f"Rejected {count} confessions!")
+            st.rerun()
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(st.session_state.moderation_cursors) > 1 and st.button("⬅️ Previous", key="moderation_previous"):
+                st.session_state.moderation_cursors.pop()
+                st.rerun()
+        with col2:
+            if next_cursor and st.button("Next ➡️", key="moderation_next"):
+                st.session_state.moderation_cursors.append(next_cursor)
+                st.rerun()
     else:
         st.info("No confessions pending approval.")
     
-    # Approved confessions
+    # Approved confessions, newest first, a page at a time
     st.subheader("✅ Approved Confessions")
-    approved_confessions = [c for c in confessions if c.get('is_approved', False)]
+    if 'admin_confession_cursors' not in st.session_state:
+        st.session_state.admin_confession_cursors = [None]
+    approved_confessions, next_cursor = get_confession_feed(st.session_state.admin_confession_cursors[-1],
+                                                            MODERATION_PAGE_SIZE)
     
     if approved_confessions:
-        for confession in approved_confessions:
-            with st.container():
-                st.write(f"**{confession['category']}**")
+        with st.form("approved_confessions"):
+            selected = []
+            for confession in approved_confessions:
+                if st.checkbox(f"**{confession['category']}**", key=f"approved_{confession['id']}"):
+                    selected.append(confession['id'])
                 st.write(confession['text'])
                 
-                likes_count = len(confession.get('likes', []))
+                likes_count = get_likes_count(confession)
                 comments_count = len(confession.get('comments', []))
                 
                 st.caption(f"❤️ {likes_count} likes • 💬 {comments_count} comments • Posted on {confession['created_date'][:10]}")
-                
-                if st.button("Delete", key=f"del_{confession['id']}"):
-                    confessions_data = [c for c in db.load_data("confessions.json") if c['id'] != confession['id']]
-                    db.save_data("confessions.json", confessions_data)
-                    st.success("Confession deleted!")
-                    st.rerun()
-                
                 st.divider()
+            
+            delete = st.form_submit_button("🗑️ Delete selected")
+        
+        if delete:
+            if selected:
+                count = moderate_confessions(selected, "delete")
+                st.session_state.admin_confession_cursors = [None]
+                st.success(f"Deleted {count} confessions!")
+                st.rerun()
+            else:
+                st.warning("Select at least one confession.")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(st.session_state.admin_confession_cursors) > 1 and st.button("⬅️ Newer", key="approved_newer"):
+                st.session_state.admin_confession_cursors.pop()
+                st.rerun()
+        with col2:
+            if next_cursor and st.button("Older ➡️", key="approved_older"):
+                st.session_state.admin_confession_cursors.append(next_cursor)
+                st.rerun()
     else:
         st.info("No approved confessions yet.")
 
+def show_performance():
+    st.title("⚡ Performance")
+    st.caption("Storage activity in this server process since it started or was last reset.")
+    
+    metrics = instrumentation.snapshot()
+    # SQLite traffic is counted per statement and table: no byte counts or cache hits
+    sqlite = get_setting("storage", "backend", "json") == "sqlite"
+    reads, heaviest = ("Queries", 'loads') if sqlite else ("File reads", 'bytes_read')
+    
+    st.subheader("Pages")
+    if metrics['pages']:
+        st.dataframe([
+            dict({
+                "Page": page,
+                "Reruns": stats['reruns'],
+                "Avg ms": round(stats['total_ms'] / stats['reruns'], 1),
+                f"{reads} / rerun": round(stats['loads'] / stats['reruns'], 2),
+                "Writes / rerun": round(stats['saves'] / stats['reruns'], 2)
+            }, **({} if sqlite else {
+                "Cache hits / rerun": round(stats['cache_hits'] / stats['reruns'], 2),
+                "KiB read / rerun": round(stats['bytes_read'] / stats['reruns'] / 1024, 1),
+                "KiB written / rerun": round(stats['bytes_written'] / stats['reruns'] / 1024, 1)
+            }))
+            for page, stats in sorted(metrics['pages'].items(), key=lambda item: -item[1][heaviest])
+        ], use_container_width=True, hide_index=True)
+    else:
+        st.info("No page views recorded yet.")
+    
+    st.subheader("Operations")
+    buckets = [f"≤{bound} ms" for bound in instrumentation.BUCKETS_MS] + [f">{instrumentation.BUCKETS_MS[-1]} ms"]
+    st.dataframe([
+        dict({
+            "Operation": name,
+            "Calls": stats['calls'],
+            "Avg ms": round(stats['total_ms'] / stats['calls'], 2),
+            "Max ms": round(stats['max_ms'], 1),
+            "Total ms": round(stats['total_ms'], 1)
+        }, **dict(zip(buckets, stats['histogram'])))
+        for name, stats in sorted(metrics['operations'].items(), key=lambda item: -item[1]['total_ms'])
+    ], use_container_width=True, hide_index=True)
+    
+    st.subheader("Tables" if sqlite else "Collections")
+    st.dataframe([
+        dict({
+            "Table" if sqlite else "Collection": filename,
+            reads: stats['loads'],
+            "Writes": stats['saves']
+        }, **({} if sqlite else {
+            "Cache hits": stats['cache_hits'],
+            "KiB read": round(stats['bytes_read'] / 1024, 1),
+            "KiB written": round(stats['bytes_written'] / 1024, 1)
+        }))
+        for filename, stats in sorted(metrics['collections'].items(), key=lambda item: -item[1][heaviest])
+    ], use_container_width=True, hide_index=True)
+    
+    st.subheader(f"Slow Operations (≥ {instrumentation.SLOW_MS:g} ms)")
+    if metrics['slow']:
+        st.dataframe(metrics['slow'], use_container_width=True, hide_index=True)
+    else:
+        st.write("No slow operations recorded.")
+    
+    if st.button("🔄 Reset Counters"):
+        instrumentation.reset()
+        st.rerun()
+
 if __name__ == "__main__":
     main()
@@ -1,8 +1,8 @@
 import streamlit as st
-import bcrypt
 import uuid
 from datetime import datetime
-from database import get_user_by_email, create_student, db, verify_password
+from database import get_user_by_email, create_student, update_student_password, verify_password
+from passwords import hash_password, needs_rehash
 
 def login_page():
     st.title("🎓 Campus Connect")
@@ -35,7 +35,10 @@ def student_login():
         if st.form_submit_button("Student Login", use_container_width=True):
             user = get_user_by_email(email)
             if user and verify_password(password, user.get('password', '')) and user.get('role') == 'student':
-                st.session_state.user = user
+                # Upgrade hashes made with an older bcrypt cost while we have the password
+                if needs_rehash(user['password']):
+                    update_student_password(email, hash_password(password))
+                st.session_state.user = dict(user)
                 st.session_state.user['email'] = email
                 st.session_state.role = 'student'
                 st.success("Welcome back! 🎉")
@@ -92,9 +95,9 @@ def student_signup():
                     "email": email,
                     "year": year,
                     "major": major,
-                    "password": bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode(),
+                    "password": hash_password(password),
                     "security_question": security_question,
-                    "security_answer": bcrypt.hashpw(security_answer.encode(), bcrypt.gensalt()).decode(),
+                    "security_answer": hash_password(security_answer),
                     "role": "student",
                     "joined_date": datetime.now().isoformat()
                 }
@@ -133,10 +136,8 @@ def forgot_password():
         if st.button("Reset Password"):
             if verify_password(answer, user.get('security_answer', '')):
                 if new_password == confirm_password:
-                    students = db.load_data("students.json")
-                    if st.session_state.reset_email in students:
-                        students[st.session_state.reset_email]['password'] = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
-                        db.save_data("students.json", students)
+                    hashed = hash_password(new_password)
+                    if update_student_password(st.session_state.reset_email, hashed):
                         st.success("Password reset successfully! You can now login.")
                         st.session_state.show_security_question = False
                         st.session_state.reset_email = None
@@ -0,0 +1 @@
+"""Performance measurements for Campus Connect; run the modules with python -m benchmarks.<name>."""
@@ -0,0 +1,264 @@
+"""Synthetic campus data for benchmarks.
+
+generate() fills a scratch data directory with collections shaped exactly
+like the ones the app writes. At scale 1 that is 20k students, 200 clubs,
+2M chat messages and 100k confessions with likes and comments. Chat logs,
+their offset files and the like log are streamed straight to disk, so even
+the full size fits in memory. benchmark_manifest.json lists sample ids for
+the benchmark suite to call the API with.
+
+    python -m benchmarks.datagen /tmp/campus-data --scale 0.1
+"""
+import argparse
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from chat_store import ChatStore, chat_id_for
+from database import SimpleDB
+
+# Collection sizes at scale 1
+FULL_SIZE = {
+    "students": 20000,
+    "clubs": 200,
+    "club_members": 50,
+    "pending_requests": 2000,
+    "announcements": 500,
+    "chats": 20000,
+    "messages": 2000000,
+    "calls": 50000,
+    "confessions": 100000,
+    "likes_per_confession": 5,
+    "comments_per_confession": 2
+}
+
+MANIFEST_FILE = "benchmark_manifest.json"
+SAMPLE_SIZE = 200
+# Generated at any scale: approve_club_request uses one per call, cold plus the
+# suite's default 10 warm calls
+MIN_PENDING_REQUESTS = 11
+
+WORDS = ("exam library canteen hostel fest club lecture project deadline lab semester "
+         "placement hackathon music debate football assignment friend notes quiz").split()
+MAJORS = ["Computer Science", "Physics", "History", "Music", "Economics", "Biology"]
+CATEGORIES = ["technology", "debate", "arts", "sports", "science", "social"]
+START = datetime(2024, 1, 1)
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def timestamp(rng, days=365):
+    return (START + timedelta(seconds=rng.randrange(days * 86400))).isoformat()
+
+def new_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def sizes_for(scale):
+    """Collection sizes at `scale`; per-item averages are not scaled"""
+    sizes = {}
+    for name, count in FULL_SIZE.items():
+        per_item = name.endswith("_per_confession") or name == "club_members"
+        sizes[name] = count if per_item else max(1, int(count * scale))
+    return sizes
+
+def build_collections(scale=1.0, seed=7):
+    """The JSON collections (everything except chat and like logs): filename -> data"""
+    rng = random.Random(seed)
+    sizes = sizes_for(scale)
+    emails = [f"student{i}@college.edu" for i in range(sizes["students"])]
+
+    students = {
+        email: {
+            "name": f"Student {i}",
+            "email": email,
+            "year": rng.choice(["Junior", "Senior"]),
+            "major": rng.choice(MAJORS),
+            # Benchmarks never log in, so any well-formed bcrypt string will do
+            "password": "$2b$12$" + rng.randbytes(26).hex()[:53],
+            "security_question": "What is your favorite color?",
+            "security_answer": "$2b$12$" + rng.randbytes(26).hex()[:53],
+            "role": "student",
+            "joined_date": timestamp(rng)
+        }
+        for i, email in enumerate(emails)
+    }
+
+    clubs = {}
+    club_requests = []
+    for i in range(sizes["clubs"]):
+        club_id = f"club_{i}"
+        # Half the students at most, so even tiny scales have room for join requests
+        members = rng.sample(emails, min(max(1, len(emails) // 2), rng.randint(1, 2 * sizes["club_members"])))
+        clubs[club_id] = {
+            "id": club_id,
+            "name": f"{text(rng, 2)} Club {i}",
+            "category": rng.choice(CATEGORIES),
+            "description": text(rng, 20),
+            "members": members,
+            "pending_requests": [],
+            "admins": ["MES.edu"],
+            "meeting_schedule": "Wednesdays 6-8 PM",
+            "location": f"Building {i % 12} Room {100 + i}",
+            "created_date": timestamp(rng, days=30)
+        }
+        for email in members:
+            club_requests.append({
+                "id": new_id(rng), "student_email": email, "club_id": club_id,
+                "status": "approved", "request_date": timestamp(rng), "processed_date": timestamp(rng)
+            })
+    club_ids = list(clubs)
+
+    def request_to_join(email, club_id):
+        clubs[club_id]["pending_requests"].append(email)
+        club_requests.append({
+            "id": new_id(rng), "student_email": email, "club_id": club_id,
+            "status": "pending", "request_date": timestamp(rng)
+        })
+
+    pending = 0
+    for _ in range(sizes["pending_requests"]):
+        email, club_id = rng.choice(emails), rng.choice(club_ids)
+        if email in clubs[club_id]["members"] or email in clubs[club_id]["pending_requests"]:
+            continue
+        request_to_join(email, club_id)
+        pending += 1
+    if pending < MIN_PENDING_REQUESTS:
+        # Small scales mostly draw students who already belong to the club
+        free = [(email, club_id) for club_id in club_ids for email in emails
+                if email not in clubs[club_id]["members"] and email not in clubs[club_id]["pending_requests"]]
+        for email, club_id in rng.sample(free, min(len(free), MIN_PENDING_REQUESTS - pending)):
+            request_to_join(email, club_id)
+    rng.shuffle(club_requests)
+
+    announcements = [
+        {
+            "id": new_id(rng), "title": text(rng, 5), "message": text(rng, 40),
+            "category": "general", "priority": rng.choice(["low", "medium", "high"]),
+            "author": "Admin User", "created_date": timestamp(rng),
+            # Some lapsed, some still live; the first read archives the lapsed ones
+            "expiry_date": rng.choice([None, None, timestamp(rng), "2099-12-31T23:59:59"])
+        }
+        for _ in range(sizes["announcements"])
+    ]
+
+    calls = []
+    for _ in range(sizes["calls"]):
+        caller, callee = rng.sample(emails, 2) if len(emails) > 1 else (emails[0], emails[0])
+        call = {
+            "id": new_id(rng), "participants": [caller, callee],
+            "type": rng.choice(["voice", "video"]), "start_time": timestamp(rng),
+            "status": rng.choice(["ended", "ended", "ended", "active"]), "initiator": caller
+        }
+        if call["status"] == "ended":
+            call["end_time"] = call["start_time"]
+        calls.append(call)
+    calls.sort(key=lambda call: call["start_time"])
+
+    confessions = []
+    for _ in range(sizes["confessions"]):
+        confessions.append({
+            "id": new_id(rng), "text": text(rng, 30), "category": rng.choice(CATEGORIES),
+            "created_date": timestamp(rng), "is_approved": rng.random() < 0.9,
+            "comments": [
+                {"id": new_id(rng), "text": text(rng, 10), "created_date": timestamp(rng),
+                 "anonymous_id": f"anon_{rng.randbytes(4).hex()}", "user_email": rng.choice(emails)}
+                for _ in range(rng.randint(0, 2 * sizes["comments_per_confession"]))
+            ],
+            "anonymous_id": f"anon_{rng.randbytes(4).hex()}",
+            "user_email": rng.choice(emails)
+        })
+    confessions.sort(key=lambda confession: confession["created_date"])
+
+    return {
+        "students.json": students,
+        "clubs.json": clubs,
+        "club_requests.json": club_requests,
+        "announcements.json": announcements,
+        "calls.json": calls,
+        "confessions.json": confessions
+    }
+
+def _write_chats(db, rng, emails, sizes):
+    """Chat index plus one log and offset file per chat; returns the chat ids"""
+    store = ChatStore(db)
+    index = {}
+    per_chat = max(1, sizes["messages"] // sizes["chats"])
+    for _ in range(sizes["chats"]):
+        pair = rng.sample(emails, 2) if len(emails) > 1 else [emails[0], emails[0]]
+        chat_id = chat_id_for(*pair)
+        if chat_id in index:
+            continue
+        log = store._log_name(chat_id)
+        index[chat_id] = {"participants": pair, "created_date": timestamp(rng), "log": log}
+        log_path = store._log_path(log)
+        sent = START + timedelta(seconds=rng.randrange(180 * 86400))
+        lines, entries, offset = [], [], 0
+        for _ in range(rng.randint(1, 2 * per_chat - 1)):
+            sent += timedelta(seconds=rng.randrange(1, 3600))
+            message = {"id": new_id(rng), "sender": rng.choice(pair),
+                       "message": text(rng, rng.randint(2, 15)), "timestamp": sent.isoformat()}
+            line = (json.dumps(message, separators=(',', ':')) + "\n").encode()
+            entries.append(store.OFFSET_ENTRY.pack(offset, store._id_key(message["id"])))
+            lines.append(line)
+            offset += len(line)
+        with open(log_path, 'wb') as f:
+            f.write(b"".join(lines))
+        with open(log_path + ".idx", 'wb') as f:
+            f.write(b"".join(entries))
+    db.save_data(store.INDEX_FILE, index)
+    return list(index)
+
+def _write_likes(db, rng, emails, confessions, sizes):
+    with open(db.path("confession_likes.jsonl"), 'w') as f:
+        for confession in confessions:
+            count = min(len(emails), rng.randint(0, 2 * sizes["likes_per_confession"]))
+            for email in rng.sample(emails, count):
+                f.write(json.dumps({"confession_id": confession["id"], "user_email": email}) + "\n")
+
+def generate(data_dir, scale=1.0, seed=7):
+    """Populate data_dir; returns the manifest of sample ids"""
+    rng = random.Random(seed + 1)
+    sizes = sizes_for(scale)
+    db = SimpleDB(data_dir, write_behind=False)
+    collections = build_collections(scale, seed)
+    for filename, data in collections.items():
+        db.save_data(filename, data)
+
+    emails = list(collections["students.json"])
+    confessions = collections["confessions.json"]
+    chat_ids = _write_chats(db, rng, emails, sizes)
+    _write_likes(db, rng, emails, confessions, sizes)
+
+    def sample(values):
+        return rng.sample(values, min(SAMPLE_SIZE, len(values)))
+
+    manifest = {
+        "scale": scale,
+        "sizes": sizes,
+        "emails": sample(emails),
+        "club_ids": sample(list(collections["clubs.json"])),
+        "pending_requests": sample([[r["id"], r["club_id"], r["student_email"]]
+                                    for r in collections["club_requests.json"] if r["status"] == "pending"]),
+        "chat_ids": sample(chat_ids),
+        "call_ids": sample([call["id"] for call in collections["calls.json"]]),
+        "confession_ids": sample([c["id"] for c in confessions if c["is_approved"]]),
+        "pending_confession_ids": sample([c["id"] for c in confessions if not c["is_approved"]])
+    }
+    with open(os.path.join(data_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data_dir")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full-size dataset")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    manifest = generate(args.data_dir, args.scale, args.seed)
+    for name, count in manifest["sizes"].items():
+        print(f"{name}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Save/load time and size on disk of each SimpleDB serializer.
+
+Collections come from benchmarks.datagen (scale 0.1 is a busy term) and are
+written through SimpleDB.save_data, then read back uncached by a fresh
+SimpleDB, once per available serializer.
+
+    python -m benchmarks.serializers --scale 0.1 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import serializers
+from benchmarks.datagen import build_collections
+from database import SimpleDB
+
+def measure(name, collections, repeat):
+    """Median save/load milliseconds and bytes per collection for one serializer"""
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        db = SimpleDB(data_dir, serializer=name, write_behind=False, defaults=False)
+        for filename, data in collections.items():
+            saves, loads = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                db.save_data(filename, data)
+                saves.append((time.perf_counter() - start) * 1000)
+                # A new instance has nothing cached, so this parses the file
+                reader = SimpleDB(data_dir, write_behind=False, defaults=False)
+                start = time.perf_counter()
+                reader.load_data(filename)
+                loads.append((time.perf_counter() - start) * 1000)
+            results[filename] = {
+                "save_ms": statistics.median(saves),
+                "load_ms": statistics.median(loads),
+                "bytes": os.path.getsize(db.path(filename))
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.1, help="fraction of the full-size dataset")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    collections = build_collections(args.scale)
+    print(f"{'serializer':<12} {'collection':<20} {'save ms':>9} {'load ms':>9} {'KiB':>9}")
+    for name in serializers.SERIALIZERS:
+        totals = {"save_ms": 0.0, "load_ms": 0.0, "bytes": 0}
+        for filename, result in measure(name, collections, args.repeat).items():
+            for key in totals:
+                totals[key] += result[key]
+            print(f"{name:<12} {filename:<20} {result['save_ms']:>9.1f} {result['load_ms']:>9.1f} "
+                  f"{result['bytes'] / 1024:>9.1f}")
+        print(f"{name:<12} {'total':<20} {totals['save_ms']:>9.1f} {totals['load_ms']:>9.1f} "
+              f"{totals['bytes'] / 1024:>9.1f}")
+
+if __name__ == "__main__":
+    main()
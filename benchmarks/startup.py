@@ -0,0 +1,74 @@
+"""Cold-start budget for a Streamlit worker loading app.py.
+
+Each run starts a fresh interpreter against an already-populated data
+directory (the normal case after the first deploy), imports streamlit, then
+runs app.py the way a new worker does. The time spent after the streamlit
+import is the part this repo controls and is checked against the budget.
+
+    python -m benchmarks.startup --runs 5 --budget-ms 300
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+import bcrypt
+hashes = []
+_hashpw = bcrypt.hashpw
+bcrypt.hashpw = lambda *args: hashes.append(1) or _hashpw(*args)
+import streamlit
+t1 = time.perf_counter()
+import database
+t2 = time.perf_counter()
+import runpy
+runpy.run_path("app.py", run_name="__main__")
+t3 = time.perf_counter()
+print(json.dumps({
+    "streamlit_ms": (t1 - t0) * 1000,
+    "database_ms": (t2 - t1) * 1000,
+    "app_ms": (t3 - t1) * 1000,
+    "bcrypt_hashes": len(hashes),
+}))
+"""
+
+def run_once(data_dir):
+    env = dict(os.environ, CAMPUS_STORAGE_DATA_DIR=data_dir)
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=REPO_ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=300.0,
+                        help="maximum median time spent after importing streamlit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Populate the data directory once, then measure warm-disk cold starts
+        import_env = dict(os.environ, CAMPUS_STORAGE_DATA_DIR=data_dir)
+        subprocess.run([sys.executable, "-c", "import database; database.get_stats()"],
+                       cwd=REPO_ROOT, env=import_env, check=True, capture_output=True)
+        runs = [run_once(data_dir) for _ in range(args.runs)]
+
+    report = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("streamlit_ms", "database_ms", "app_ms", "bcrypt_hashes")
+    }
+    report["budget_ms"] = args.budget_ms
+    report["within_budget"] = report["app_ms"] <= args.budget_ms and report["bcrypt_hashes"] == 0
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["within_budget"] else 1)
+
+if __name__ == "__main__":
+    main()
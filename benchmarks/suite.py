@@ -0,0 +1,277 @@
+"""Time every public database.py operation at several dataset sizes.
+
+For each size a scratch data directory is filled by benchmarks.datagen and a
+fresh interpreter imports database against it (so the configured backend
+and serializer apply, with CAMPUS_* overrides). Each operation is timed
+once cold, right after the process starts, and then --repeat times warm.
+The JSON report records the environment next to the timings, and
+--compare prints the ratio against an earlier report.
+
+    python -m benchmarks.suite --sizes 0.01,0.1 --output report.json
+    CAMPUS_STORAGE_BACKEND=sqlite python -m benchmarks.suite --compare report.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks import datagen
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class EmptySample(Exception):
+    """An operation drew its argument from a sample the dataset has none of"""
+
+def _operations(manifest, rng):
+    """name -> callable taking no arguments, drawing its arguments from the manifest"""
+    import database
+
+    emails = manifest["emails"]
+    pending_requests = list(manifest["pending_requests"])
+    pending_confessions = list(manifest["pending_confession_ids"])
+    deletable = list(manifest["confession_ids"][len(manifest["confession_ids"]) // 2:])
+    confession_ids = manifest["confession_ids"][:len(manifest["confession_ids"]) // 2] or deletable
+
+    def pick(values):
+        # Small scales can leave a sample empty (no pending requests); such operations are skipped
+        if not values:
+            raise EmptySample()
+        return rng.choice(values)
+
+    def take(values):
+        # One-shot arguments (approvals, deletes); None once the sample is used up
+        return values.pop() if values else None
+
+    def new_student():
+        email = f"bench_{uuid.uuid4().hex[:12]}@college.edu"
+        return {"name": "Bench Student", "email": email, "year": "Junior", "major": "Physics",
+                "password": "$2b$12$" + "x" * 53, "security_question": "What is your favorite color?",
+                "security_answer": "$2b$12$" + "x" * 53, "role": "student",
+                "joined_date": datetime.now().isoformat()}
+
+    def approve_request():
+        request = take(pending_requests)
+        return request and database.approve_club_request(*request)
+
+    def approve_confession():
+        confession_id = take(pending_confessions)
+        return confession_id and database.approve_confession(confession_id)
+
+    def moderate_confessions():
+        batch = [take(pending_confessions) for _ in range(min(20, len(pending_confessions)))]
+        return database.moderate_confessions([i for i in batch if i], "approve")
+
+    def delete_confession():
+        confession_id = take(deletable)
+        return confession_id and database.delete_confession(confession_id)
+
+    def create_call():
+        return database.create_call({
+            "id": str(uuid.uuid4()), "participants": rng.sample(emails, 2), "type": "voice",
+            "start_time": datetime.now().isoformat(), "status": "active", "initiator": emails[0]
+        })
+
+    def create_confession():
+        return database.create_confession({
+            "id": str(uuid.uuid4()), "text": "Benchmark confession", "category": "general",
+            "user_email": pick(emails), "created_date": datetime.now().isoformat(),
+            "is_approved": False, "comments": []
+        })
+
+    def add_comment():
+        return database.add_comment(pick(confession_ids), {
+            "id": str(uuid.uuid4()), "text": "Benchmark comment", "created_date": datetime.now().isoformat()
+        }, pick(emails))
+
+    def create_announcement():
+        return database.create_announcement({
+            "id": str(uuid.uuid4()), "title": "Benchmark", "message": "Benchmark announcement",
+            "category": "general", "priority": "low", "author": "Admin User",
+            "created_date": datetime.now().isoformat(), "expiry_date": rng.choice([None, "2099-12-31T23:59:59"])
+        })
+
+    def get_messages_since():
+        chat_id = pick(manifest["chat_ids"])
+        messages = database.get_chat_messages(chat_id, limit=5)
+        return database.get_messages_since(chat_id, messages[0]["id"] if messages else None)
+
+    # Reads come first so their cold time includes loading the collection
+    return {
+        "get_user_by_email": lambda: database.get_user_by_email(pick(emails)),
+        "get_students": database.get_students,
+        "find_students": lambda: database.find_students(rng.choice(["stu", "student 1", "phys", "comp sci"])),
+        "resolve_names": lambda: database.resolve_names(rng.sample(emails, min(20, len(emails)))),
+        "get_announcements": database.get_announcements,
+        "get_recent_announcements": lambda: database.get_announcements(limit=3),
+        "get_clubs": database.get_clubs,
+        "get_clubs_for_user": lambda: database.get_clubs_for_user(pick(emails)),
+        "count_clubs_for_user": lambda: database.count_clubs_for_user(pick(emails)),
+        "get_club_requests": database.get_club_requests,
+        "get_pending_club_requests": lambda: database.get_club_requests(status="pending"),
+        "get_club_request": lambda: database.get_club_request(pick(manifest["pending_requests"])[0]),
+        "iter_club_requests": lambda: sum(1 for _ in database.iter_club_requests(status="pending")),
+        "get_chat_messages": lambda: database.get_chat_messages(pick(manifest["chat_ids"])),
+        "get_messages_since": get_messages_since,
+        "get_inbox": lambda: database.get_inbox(pick(emails)),
+        "get_chat_version": lambda: database.get_chat_version(pick(manifest["chat_ids"])),
+        "get_calls": database.get_calls,
+        "get_user_calls": lambda: database.get_user_calls(pick(emails)),
+        "get_recent_user_calls": lambda: database.get_user_calls(pick(emails), limit=5),
+        "get_call": lambda: database.get_call(pick(manifest["call_ids"])),
+        "iter_calls": lambda: sum(1 for _ in database.iter_calls(pick(emails))),
+        "get_confessions_for_students": database.get_confessions_for_students,
+        "get_confession_feed": lambda: database.get_confession_feed(limit=20),
+        "get_confessions_for_admin": database.get_confessions_for_admin,
+        "get_moderation_queue": lambda: database.get_moderation_queue(limit=25),
+        "iter_confessions": lambda: next(database.iter_confessions(approved=False), None),
+        "has_liked": lambda: database.has_liked(pick(confession_ids), pick(emails)),
+        "get_likes_count": lambda: database.get_likes_count({"id": pick(confession_ids)}),
+        "get_stats": database.get_stats,
+        "search": lambda: database.search(" ".join(rng.sample(datagen.WORDS, 2))[:rng.randint(3, 12)]),
+        "create_student": lambda: database.create_student(new_student()),
+        "update_student_password": lambda: database.update_student_password(pick(emails), "$2b$12$" + "y" * 53),
+        "create_announcement": create_announcement,
+        "update_club": lambda: database.update_club(pick(manifest["club_ids"]), {"description": "Benchmark club"}),
+        "join_club_request": lambda: database.join_club_request(pick(emails), pick(manifest["club_ids"])),
+        "approve_club_request": approve_request,
+        "create_chat": lambda: database.create_chat(*rng.sample(emails, 2)),
+        "send_message": lambda: database.send_message(pick(manifest["chat_ids"]), emails[0], "Benchmark message"),
+        "mark_chat_read": lambda: database.mark_chat_read(pick(manifest["chat_ids"]), pick(emails)),
+        "create_call": create_call,
+        "heartbeat_call": lambda: database.heartbeat_call(pick(manifest["call_ids"])),
+        "reap_stale_calls": database.reap_stale_calls,
+        "update_call_status": lambda: database.update_call_status(pick(manifest["call_ids"]), "ended"),
+        "create_confession": create_confession,
+        "approve_confession": approve_confession,
+        "moderate_confessions": moderate_confessions,
+        "like_confession": lambda: database.like_confession(pick(confession_ids), pick(emails)),
+        "add_comment": add_comment,
+        "delete_confession": delete_confession,
+        "rebuild_stats": database.rebuild_stats,
+        "archive_expired_announcements": database.archive_expired_announcements,
+        "archive_calls": database.archive_calls,
+        "archive_club_requests": database.archive_club_requests
+    }
+
+def _time(operation):
+    start = time.perf_counter()
+    operation()
+    return (time.perf_counter() - start) * 1000
+
+def run_operations(data_dir, repeat, only=None):
+    """Child process: time the operations against data_dir and print the results as JSON"""
+    with open(os.path.join(data_dir, datagen.MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    from settings import get_setting
+    setup_ms = 0.0
+    if get_setting("storage", "backend", "json") == "sqlite":
+        import sqlite_db
+        start = time.perf_counter()
+        sqlite_db.import_json_data(data_dir)
+        setup_ms = (time.perf_counter() - start) * 1000
+
+    results = {}
+    for name, operation in _operations(manifest, random.Random(11)).items():
+        if only and name not in only:
+            continue
+        try:
+            cold = _time(operation)
+        except EmptySample:
+            continue
+        warm = sorted(_time(operation) for _ in range(repeat))
+        results[name] = {
+            "cold_ms": round(cold, 3),
+            "median_ms": round(statistics.median(warm), 3) if warm else None,
+            "p95_ms": round(warm[min(len(warm) - 1, int(len(warm) * 0.95))], 3) if warm else None,
+            "min_ms": round(warm[0], 3) if warm else None
+        }
+    print(json.dumps({"setup_ms": round(setup_ms, 1), "operations": results}))
+
+def run_size(scale, repeat, only=None):
+    """Generate a dataset at `scale` and time it in a fresh interpreter"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        manifest = datagen.generate(data_dir, scale)
+        generate_ms = (time.perf_counter() - start) * 1000
+        env = dict(os.environ, CAMPUS_STORAGE_DATA_DIR=data_dir,
+                   CAMPUS_STORAGE_SQLITE_PATH=os.path.join(data_dir, "campus.db"))
+        command = [sys.executable, "-m", "benchmarks.suite", "--child", data_dir, "--repeat", str(repeat)]
+        if only:
+            command += ["--only", ",".join(only)]
+        result = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["sizes"] = manifest["sizes"]
+    report["generate_ms"] = round(generate_ms, 1)
+    return report
+
+def _environment():
+    from settings import get_setting
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "backend": get_setting("storage", "backend", "json"),
+        "serializer": get_setting("storage", "serializer", "json"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": datetime.now().isoformat(timespec="seconds")
+    }
+
+def compare(report, baseline):
+    """Print median ratios (current / baseline) for sizes and operations in both reports"""
+    print(f"{'scale':>7} {'operation':<30} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for scale, current in report["results"].items():
+        previous = baseline["results"].get(scale)
+        if not previous:
+            continue
+        for name, timing in current["operations"].items():
+            before = previous["operations"].get(name, {}).get("median_ms")
+            after = timing["median_ms"]
+            if not before or after is None:
+                continue
+            print(f"{scale:>7} {name:<30} {before:>10.3f} {after:>10.3f} {after / before:>6.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="0.01,0.1",
+                        help="comma-separated dataset scales; 1 is 20k students and 2M messages")
+    parser.add_argument("--repeat", type=int, default=10, help="warm calls per operation")
+    parser.add_argument("--only", help="comma-separated operation names to time")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier report to compare medians against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    only = set(args.only.split(",")) if args.only else None
+
+    if args.child:
+        run_operations(args.child, args.repeat, only)
+        return
+
+    report = {"environment": _environment(), "repeat": args.repeat, "results": {}}
+    for scale in args.sizes.split(","):
+        print(f"scale {scale}...", file=sys.stderr)
+        report["results"][scale] = run_size(float(scale), args.repeat, only)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
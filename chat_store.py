@@ -0,0 +1,586 @@
+import hashlib
+import json
+import lzma
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date
+import instrumentation
+import serializers
+from settings import get_setting
+
+# Messages from the last HOT_MONTHS calendar months stay in each chat's log; roll()
+# moves older ones into one compressed segment per month
+HOT_MONTHS = get_setting("chats", "hot_months", 1)
+SEGMENT_COMPRESSION = get_setting("chats", "segment_compression", "lzma")
+# Segment file extension -> codec; segments are read by extension, whatever the setting
+CODECS = {".xz": lzma, ".zz": zlib}
+COMPRESSION_EXTENSIONS = {"lzma": ".xz", "zlib": ".zz"}
+# Decompressed segments kept in memory per process
+SEGMENT_CACHE_SIZE = 32
+
+def chat_id_for(user1, user2):
+    """Canonical chat id for a pair of users, whichever of them starts the chat"""
+    first, second = sorted((user1, user2))
+    return f"chat_{first}_{second}"
+
+def legacy_chat_id_for(user1, user2):
+    """The other ordering, used by chats started before ids were canonical"""
+    first, second = sorted((user1, user2))
+    return f"chat_{second}_{first}"
+
+def read_chat_dir(data_dir, dirname="chats"):
+    """(chat_id, metadata, messages) of every chat in a JSON data directory, for exports.
+
+    Reads the index, rolled segments and logs exactly as they are on disk: no
+    offset files are written and a legacy chats.json is read, not migrated.
+    """
+    index = serializers.load_file(os.path.join(data_dir, ChatStore.INDEX_FILE), {})
+    for chat_id, chat in index.items():
+        messages, seen = [], set()
+        paths = [os.path.join(data_dir, dirname, segment["file"]) for segment in chat.get("segments", [])]
+        paths.append(os.path.join(data_dir, dirname, chat["log"]))
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            codec = CODECS.get(os.path.splitext(path)[1])
+            for line in (codec.decompress(data) if codec else data).splitlines():
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                # An interrupted roll can leave messages in a segment and the log
+                if message.get("id") not in seen:
+                    seen.add(message.get("id"))
+                    messages.append(message)
+        yield chat_id, chat, messages
+    legacy = serializers.load_file(os.path.join(data_dir, ChatStore.LEGACY_FILE), {})
+    for chat_id, chat in legacy.items():
+        if chat_id not in index:
+            yield chat_id, chat, chat.get("messages", [])
+
+class ChatStore:
+    """Append-only message logs, one file per conversation.
+
+    Chat metadata (participants, created date, log file name) lives in a small
+    index collection managed by SimpleDB. Messages are appended as one JSON line
+    each to data/chats/<log>, so sending costs one short write no matter how much
+    chat history the campus has. A fixed-width offset file next to each log lets
+    readers seek straight to a window of messages.
+
+    roll() keeps the log to recent months: older messages move to compressed
+    monthly segments under data/chats/<log>/, listed in the chat's index entry,
+    which are only decompressed when a reader scrolls back past the log.
+    """
+
+    INDEX_FILE = "chat_index.json"
+    # inboxes/<user>.json: chat_id -> peer, last message preview and unread count
+    INBOX_DIR = "inboxes"
+    PREVIEW_LENGTH = 80
+    LEGACY_FILE = "chats.json"
+    # <log>.idx holds one entry per message: byte offset in the log + message id
+    OFFSET_ENTRY = struct.Struct("<Q36s")
+    # All logs are reported as one collection in the storage instrumentation
+    LOG_COLLECTION = "chats/*.jsonl"
+    SEGMENT_COLLECTION = "chats/*/<month>.jsonl.*"
+
+    def __init__(self, db, dirname="chats"):
+        self.db = db
+        self.dirname = dirname
+        self._dir_ready = False
+        self._inbox_dir_ready = False
+        # Reentrant: rebuilding an inbox reads chats while a write holds the lock
+        self._lock = threading.RLock()
+        self._roll_lock = threading.Lock()
+        self._migrated = False
+        # segment path -> decompressed messages, least recently used first
+        self._segments = OrderedDict()
+
+    def list_chats(self):
+        """Chat index: chat_id -> metadata"""
+        self._migrate_legacy()
+        return self.db.load_data(self.INDEX_FILE)
+
+    def get_chat(self, chat_id):
+        """Chat metadata, or None if the chat does not exist"""
+        self._migrate_legacy()
+        return self.db.load_data(self.INDEX_FILE).get(chat_id)
+
+    def create_chat(self, chat_id, participants, created_date):
+        """Register a chat in the index; returns False if it already exists"""
+        self._migrate_legacy()
+        with self._lock:
+            index = self.db.load_data(self.INDEX_FILE, for_update=True)
+            if chat_id in index:
+                return False
+            index[chat_id] = {
+                "participants": participants,
+                "created_date": created_date,
+                "log": self._log_name(chat_id)
+            }
+            self.db.save_data(self.INDEX_FILE, index)
+            for email, peer in self._pairs(participants):
+                inbox = self._load_inbox(email, for_update=True)
+                inbox.setdefault(chat_id, self._inbox_entry(peer, created_date))
+                self.db.save_data(self._inbox_name(email), inbox)
+        return True
+
+    def append_message(self, chat_id, message):
+        """Append one message record to the chat's log"""
+        chat = self.get_chat(chat_id)
+        if not chat:
+            return False
+        line = (json.dumps(message, separators=(',', ':')) + "\n").encode()
+        log_path = self._log_path(chat["log"])
+        with self._lock:
+            self._sync_offsets(log_path)
+            with open(log_path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+            instrumentation.record_write(self.LOG_COLLECTION, len(line))
+            with open(log_path + ".idx", 'ab') as f:
+                f.write(self.OFFSET_ENTRY.pack(offset, self._id_key(message.get("id"))))
+            self._update_inboxes(chat_id, chat, message)
+        return True
+
+    def inbox(self, email):
+        """The user's conversations: chat_id -> peer, last message and unread count"""
+        return self._load_inbox(email)
+
+    def mark_read(self, chat_id, email):
+        """Reset the user's unread count for a chat; returns False if it was already zero"""
+        with self._lock:
+            inbox = self._load_inbox(email, for_update=True)
+            entry = inbox.get(chat_id)
+            if not entry or not entry["unread"]:
+                return False
+            entry["unread"] = 0
+            self.db.save_data(self._inbox_name(email), inbox)
+        return True
+
+    def read_messages(self, chat_id, before=None, limit=None, archived=True):
+        """Messages of one chat, oldest first.
+
+        Only the `limit` messages preceding message id `before` (or the end of
+        the chat) are read; limit=None reads the whole conversation. Rolled
+        segments are only opened when the window reaches past the log, and not
+        at all with archived=False.
+        """
+        chat = self.get_chat(chat_id)
+        if not chat:
+            return []
+        log, idx, count = self._open_log(chat["log"])
+        with log, idx:
+            end = count
+            if before is not None:
+                end = self._find_position(idx, count, before)
+                if end is None:
+                    return self._read_segments(chat, before, limit) if archived else []
+            start = 0 if limit is None else max(0, end - limit)
+            messages = self._read_range(log, idx, count, start, end)
+        if start > 0 or not archived or not chat.get("segments"):
+            return messages
+        older = self._read_segments(chat, None, None if limit is None else limit - len(messages))
+        if older and messages:
+            # A roll interrupted between listing its segments and trimming the log
+            # leaves the moved messages in both places until the next roll
+            recent = {message.get("id") for message in messages}
+            older = [message for message in older if message.get("id") not in recent]
+        return older + messages
+
+    def read_messages_since(self, chat_id, last_id, limit=50):
+        """Messages sent after message id `last_id`.
+
+        Falls back to the latest `limit` messages when `last_id` is unknown.
+        """
+        chat = self.get_chat(chat_id)
+        if not chat:
+            return []
+        log, idx, count = self._open_log(chat["log"])
+        with log, idx:
+            position = self._find_position(idx, count, last_id) if last_id is not None else None
+            if position is not None:
+                return self._read_range(log, idx, count, position + 1, count)
+            rolled = self._read_segments_after(chat, last_id) if last_id is not None else None
+            if rolled is None:
+                return self._read_range(log, idx, count, max(0, count - limit), count)
+            # last_id was rolled out of the log since the reader saw it: everything
+            # after it in the segments, then the whole log
+            messages = self._read_range(log, idx, count, 0, count)
+        recent = {message.get("id") for message in messages}
+        return [message for message in rolled if message.get("id") not in recent] + messages
+
+    def version(self, chat_id):
+        """Opaque change counter for a chat: the size of its log, so one stat call"""
+        chat = self.get_chat(chat_id)
+        if not chat:
+            return 0
+        try:
+            return os.path.getsize(self._log_path(chat["log"]))
+        except FileNotFoundError:
+            return 0
+
+    def roll(self, hot_months=None, today=None):
+        """Move messages older than the last `hot_months` calendar months out of
+        every chat log into compressed monthly segments; returns how many moved.
+
+        Segments are written and listed in the chat index before the logs are
+        trimmed, so an interrupted roll loses nothing and the next one finishes it.
+        """
+        cutoff = self._cutoff_month(HOT_MONTHS if hot_months is None else hot_months, today or date.today())
+        extension = COMPRESSION_EXTENSIONS.get(SEGMENT_COMPRESSION)
+        if extension is None:
+            raise ValueError(f"Unknown segment compression {SEGMENT_COMPRESSION!r}; "
+                             f"choose from {', '.join(sorted(COMPRESSION_EXTENSIONS))}")
+        with self._roll_lock:
+            self._migrate_legacy()
+            # chat_id -> log, bytes to trim, segment list and month of the first message kept
+            rolled = {}
+            moved = 0
+            for chat_id, chat in self.list_chats().items():
+                if chat.get("hot_since", "") >= cutoff:
+                    continue
+                prefix, months, hot_since = self._split_log(chat["log"], cutoff)
+                listed = {segment["month"]: segment for segment in chat.get("segments", [])}
+                for month, messages in months.items():
+                    name = f"{chat['log'][:-len('.jsonl')]}/{month}.jsonl{extension}"
+                    existing = ()
+                    if month in listed:
+                        # Rolled before (or by an interrupted roll): add to that segment
+                        name = listed[month]["file"]
+                        existing = self._load_segment(name)
+                        known = {message.get("id") for message in existing}
+                        messages = [message for message in messages if message.get("id") not in known]
+                    listed[month] = self._write_segment(name, month, list(existing) + messages)
+                    moved += len(messages)
+                rolled[chat_id] = {"log": chat["log"], "prefix": prefix, "hot_since": hot_since,
+                                   "segments": sorted(listed.values(), key=lambda segment: segment["month"])}
+            if not rolled:
+                return 0
+            self._update_index(rolled, "segments")
+            for entry in rolled.values():
+                if entry["prefix"]:
+                    self._trim_log(entry["log"], entry["prefix"])
+            self._update_index(rolled, "hot_since")
+        return moved
+
+    def _cutoff_month(self, hot_months, today):
+        """First month (YYYY-MM) whose messages stay in the log"""
+        months = today.year * 12 + today.month - 1 - (max(1, hot_months) - 1)
+        return f"{months // 12:04d}-{months % 12 + 1:02d}"
+
+    def _split_log(self, log, cutoff):
+        """(bytes, month -> messages, month of the first message kept) of the log's
+        messages from before `cutoff`, which are a prefix since logs only grow in time"""
+        prefix, months, hot_since = 0, {}, cutoff
+        try:
+            with open(self._log_path(log), 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        message = json.loads(line)
+                    except json.JSONDecodeError:
+                        prefix += len(line)
+                        continue
+                    month = str(message.get("timestamp") or "")[:7]
+                    if not month or month >= cutoff:
+                        hot_since = month or cutoff
+                        break
+                    months.setdefault(month, []).append(message)
+                    prefix += len(line)
+        except FileNotFoundError:
+            pass
+        return prefix, months, hot_since
+
+    def _update_index(self, rolled, field):
+        with self._lock:
+            index = self.db.load_data(self.INDEX_FILE, for_update=True)
+            for chat_id, entry in rolled.items():
+                if chat_id in index:
+                    index[chat_id][field] = entry[field]
+            self.db.save_data(self.INDEX_FILE, index)
+
+    def _trim_log(self, log, prefix):
+        """Drop the first `prefix` bytes of a log and rebuild its offset file"""
+        log_path = self._log_path(log)
+        with self._lock:
+            with open(log_path, 'rb') as f:
+                f.seek(prefix)
+                rest = f.read()
+            tmp_path = f"{log_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(rest)
+            instrumentation.record_write(self.LOG_COLLECTION, len(rest))
+            try:
+                os.remove(log_path + ".idx")
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, log_path)
+            self._sync_offsets(log_path)
+
+    def _write_segment(self, name, month, messages):
+        """Write one month of a chat as a compressed segment; returns its index entry"""
+        path = self._log_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        codec = CODECS[os.path.splitext(name)[1]]
+        payload = codec.compress("".join(json.dumps(message, separators=(',', ':')) + "\n"
+                                         for message in messages).encode())
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        instrumentation.record_write(self.SEGMENT_COLLECTION, len(payload))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._segments.pop(path, None)
+        return {"month": month, "file": name, "count": len(messages)}
+
+    def _load_segment(self, name):
+        """Messages of one rolled segment, decompressed once and kept in a small cache"""
+        path = self._log_path(name)
+        with self._lock:
+            messages = self._segments.get(path)
+            if messages is not None:
+                self._segments.move_to_end(path)
+                return messages
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return ()
+        instrumentation.record_read(self.SEGMENT_COLLECTION, len(raw))
+        data = CODECS[os.path.splitext(name)[1]].decompress(raw)
+        messages = tuple(json.loads(line) for line in data.splitlines())
+        with self._lock:
+            self._segments[path] = messages
+            while len(self._segments) > SEGMENT_CACHE_SIZE:
+                self._segments.popitem(last=False)
+        return messages
+
+    def _read_segments(self, chat, before, limit):
+        """The `limit` rolled messages preceding message id `before` (or the last
+        rolled message), decompressing segments newest first only as far as needed"""
+        parts = []
+        found = before is None
+        for segment in reversed(chat.get("segments", [])):
+            if limit is not None and limit <= 0:
+                break
+            messages = self._load_segment(segment["file"])
+            if not found:
+                position = next((i for i in range(len(messages) - 1, -1, -1)
+                                 if messages[i].get("id") == before), None)
+                if position is None:
+                    continue
+                messages = messages[:position]
+                found = True
+            if limit is not None:
+                messages = messages[max(0, len(messages) - limit):]
+                limit -= len(messages)
+            parts.append(messages)
+        if not found:
+            return []
+        return [message for part in reversed(parts) for message in part]
+
+    def _read_segments_after(self, chat, message_id):
+        """Rolled messages after message id `message_id`, or None if no segment has it"""
+        later = []
+        for segment in reversed(chat.get("segments", [])):
+            messages = self._load_segment(segment["file"])
+            for position in range(len(messages) - 1, -1, -1):
+                if messages[position].get("id") == message_id:
+                    return list(messages[position + 1:]) + [m for part in reversed(later) for m in part]
+            later.append(messages)
+        return None
+
+    def _id_key(self, message_id):
+        return str(message_id).encode()[:36]
+
+    def _entry(self, idx, position):
+        idx.seek(position * self.OFFSET_ENTRY.size)
+        return self.OFFSET_ENTRY.unpack(idx.read(self.OFFSET_ENTRY.size))
+
+    def _find_position(self, idx, count, message_id):
+        """Index of a message in the chat, scanning the offset index backwards"""
+        key = self._id_key(message_id).ljust(36, b"\0")
+        size = self.OFFSET_ENTRY.size
+        block = 256
+        end = count
+        while end > 0:
+            start = max(0, end - block)
+            idx.seek(start * size)
+            data = idx.read((end - start) * size)
+            for position in range(end - 1, start - 1, -1):
+                offset = (position - start) * size
+                if data[offset + 8:offset + size] == key:
+                    return position
+            end = start
+        return None
+
+    def _open_log(self, log):
+        """(log file, offset file, message count) of a chat, opened together.
+
+        Both are opened under the lock, so a concurrent roll replacing the log
+        cannot pair the offsets of one version with the bytes of another.
+        """
+        log_path = self._log_path(log)
+        with self._lock:
+            count = self._sync_offsets(log_path)
+            # 'a+b' creates the log of a chat without messages yet, like the offset file
+            return open(log_path, 'a+b'), open(log_path + ".idx", 'rb'), count
+
+    def _read_range(self, log, idx, count, start, end):
+        """Parse messages [start, end) using their byte offsets in the log"""
+        if start >= end:
+            return []
+        begin = self._entry(idx, start)[0]
+        stop = self._entry(idx, end)[0] if end < count else None
+        messages = []
+        log.seek(begin)
+        data = log.read(stop - begin) if stop is not None else log.read()
+        instrumentation.record_read(self.LOG_COLLECTION, len(data))
+        for line in data.splitlines():
+            try:
+                messages.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Torn write from a crash; the rest of the log is still good
+                continue
+        return messages[:end - start]
+
+    def _sync_offsets(self, log_path):
+        """Bring the .idx offset file up to date with the log; returns the message count.
+
+        Normally this only re-reads the last message. Logs written before the
+        offset index existed (or after a crash between the two writes) are
+        indexed from the last known offset onwards.
+        """
+        idx_path = log_path + ".idx"
+        size = self.OFFSET_ENTRY.size
+        try:
+            idx_size = os.path.getsize(idx_path)
+        except FileNotFoundError:
+            idx_size = 0
+        count = idx_size // size
+        if idx_size % size:
+            with open(idx_path, 'r+b') as idx:
+                idx.truncate(count * size)
+        start = 0
+        if count:
+            with open(idx_path, 'rb') as idx:
+                start = self._entry(idx, count - 1)[0]
+        new_entries = []
+        try:
+            with open(log_path, 'rb') as f:
+                f.seek(start)
+                if count:
+                    f.readline()  # already indexed
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        message = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    new_entries.append(self.OFFSET_ENTRY.pack(offset, self._id_key(message.get("id"))))
+        except FileNotFoundError:
+            pass
+        with open(idx_path, 'ab') as idx:
+            idx.write(b"".join(new_entries))
+        return count + len(new_entries)
+
+    def _log_path(self, log):
+        log_dir = self.db.path(self.dirname)
+        if not self._dir_ready:
+            os.makedirs(log_dir, exist_ok=True)
+            self._dir_ready = True
+        return os.path.join(log_dir, log)
+
+    def _pairs(self, participants):
+        """(user, peer) for each side of a two-person chat"""
+        if len(participants) != 2:
+            return []
+        first, second = participants
+        return [(first, second)] if first == second else [(first, second), (second, first)]
+
+    def _inbox_entry(self, peer, created_date):
+        return {"peer": peer, "created_date": created_date, "last_message": None,
+                "last_sender": None, "last_timestamp": None, "unread": 0}
+
+    def _update_inboxes(self, chat_id, chat, message):
+        """Record a new message in both participants' inboxes"""
+        preview = str(message.get("message", ""))[:self.PREVIEW_LENGTH]
+        for email, peer in self._pairs(chat.get("participants", [])):
+            inbox = self._load_inbox(email, for_update=True)
+            entry = inbox.setdefault(chat_id, self._inbox_entry(peer, chat.get("created_date")))
+            entry["last_message"] = preview
+            entry["last_sender"] = message.get("sender")
+            entry["last_timestamp"] = message.get("timestamp")
+            # Replying implies the sender has read the conversation
+            entry["unread"] = 0 if message.get("sender") == email else entry["unread"] + 1
+            self.db.save_data(self._inbox_name(email), inbox)
+
+    def _load_inbox(self, email, for_update=False):
+        name = self._inbox_name(email)
+        if not self.db.exists(name):
+            self._rebuild_inbox(email)
+        return self.db.load_data(name, for_update=for_update)
+
+    def _rebuild_inbox(self, email):
+        """Build a user's inbox from the chat index, for chats created before inboxes existed"""
+        inbox = {}
+        for chat_id, chat in self.list_chats().items():
+            for user, peer in self._pairs(chat.get("participants", [])):
+                if user != email:
+                    continue
+                entry = inbox[chat_id] = self._inbox_entry(peer, chat.get("created_date"))
+                last = self.read_messages(chat_id, limit=1)
+                if last:
+                    entry["last_message"] = str(last[0].get("message", ""))[:self.PREVIEW_LENGTH]
+                    entry["last_sender"] = last[0].get("sender")
+                    entry["last_timestamp"] = last[0].get("timestamp")
+        self.db.save_data(self._inbox_name(email), inbox)
+
+    def _inbox_name(self, email):
+        if not self._inbox_dir_ready:
+            os.makedirs(self.db.path(self.INBOX_DIR), exist_ok=True)
+            self._inbox_dir_ready = True
+        return f"{self.INBOX_DIR}/{self._log_name(email)[:-len('.jsonl')]}.json"
+
+    def _log_name(self, chat_id):
+        safe = re.sub(r'[^A-Za-z0-9@._-]', '_', chat_id)[:100]
+        digest = hashlib.sha1(chat_id.encode()).hexdigest()[:8]
+        return f"{safe}-{digest}.jsonl"
+
+    def _migrate_legacy(self):
+        """Import conversations from the old single-file chats.json, once"""
+        if self._migrated:
+            return
+        legacy_path = self.db.path(self.LEGACY_FILE)
+        with self._lock:
+            if self._migrated:
+                return
+            if os.path.exists(legacy_path):
+                legacy = self.db.load_data(self.LEGACY_FILE)
+                index = self.db.load_data(self.INDEX_FILE, for_update=True)
+                for chat_id, chat in legacy.items():
+                    if chat_id in index:
+                        continue
+                    log = self._log_name(chat_id)
+                    with open(self._log_path(log), 'w') as f:
+                        for message in chat.get("messages", []):
+                            f.write(json.dumps(message, separators=(',', ':')) + "\n")
+                    index[chat_id] = {
+                        "participants": chat.get("participants", []),
+                        "created_date": chat.get("created_date"),
+                        "log": log
+                    }
+                self.db.save_data(self.INDEX_FILE, index)
+                os.replace(legacy_path, legacy_path + ".migrated")
+            self._migrated = True
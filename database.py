@@ -1,27 +1,93 @@
-import json
+import atexit
+import bisect
+import inspect
+import logging
 import os
-import bcrypt
+import threading
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import islice
+from types import FunctionType, MappingProxyType
+from chat_store import ChatStore, chat_id_for, legacy_chat_id_for
+from like_store import LikeStore
+import journal
+from passwords import hash_password, check_password
+import instrumentation
+import serializers
+from search import (
+    InvertedIndex, announcement_document, club_document, confession_document, document_key, search_result,
+    student_document
+)
+from settings import get_setting
 
 class SimpleDB:
-    def __init__(self):
-        self.data_dir = "data"
-        os.makedirs(self.data_dir, exist_ok=True)
-        self.init_default_data()
+    def __init__(self, data_dir=None, serializer=None, write_behind=None, defaults=True):
+        # Nothing touches the disk until the first read or write
+        self.data_dir = data_dir or get_setting("storage", "data_dir", "data")
+        # defaults=False leaves missing collections missing instead of creating the sample data
+        self.defaults = defaults
+        # Format for writes; reads detect the format of each file
+        self.serializer = serializers.get_serializer(serializer or get_setting("storage", "serializer", "json"))
+        # Write-behind: saves update the cache and append to a journal, and a background
+        # flusher writes each changed collection once per flush_seconds or flush_after saves
+        self.write_behind = get_setting("storage", "write_behind", False) if write_behind is None else write_behind
+        self.flush_seconds = get_setting("storage", "flush_seconds", 1.0)
+        self.flush_after = get_setting("storage", "flush_after", 100)
+        self._journal = journal.Journal(self.data_dir, fsync=get_setting("storage", "journal_fsync", False))
+        # filename -> saves not yet written to the collection file
+        self._dirty = {}
+        self._flush_lock = threading.Lock()
+        self._flush_wanted = threading.Event()
+        self._flusher = None
+        self._ready = False
+        self._initializing = False
+        # One parsed copy of each collection, shared by every session in the process:
+        # filename -> ((mtime_ns, size), read-only data). Saves store a copy of the
+        # caller's data, so nothing outside SimpleDB holds a reference into it.
+        self._cache = {}
+        # Bumped whenever a collection's cached copy is replaced
+        self._versions = {}
+        # (filename, name) -> (version, derived lookup structure)
+        self._indexes = {}
+        self._lock = threading.RLock()
+    
+    def default_collections(self):
+        """filename -> function building the data a new installation starts with"""
+        return {
+            "users.json": self._default_admin,
+            "students.json": dict,
+            "announcements.json": self._sample_announcements,
+            "clubs.json": self._sample_clubs,
+            "club_requests.json": list,
+            "chat_index.json": dict,
+            "calls.json": list,
+            "confessions.json": list
+        }
     
     def init_default_data(self):
-        """Initialize with default admin and sample data"""
-        # Admin account
+        """Initialize with default admin and sample data.
+        
+        Only collections whose file is missing are built, so the admin password
+        is hashed once when users.json is first created, not on every start.
+        """
+        for filename, build in self.default_collections().items():
+            if not os.path.exists(os.path.join(self.data_dir, filename)):
+                self.save_data(filename, build())
+    
+    def _default_admin(self):
+        """Admin account"""
         admin_data = {
             "MES.edu": {
-                "password": bcrypt.hashpw("education".encode(), bcrypt.gensalt()).decode(),
+                "password": hash_password("education"),
                 "role": "admin",
                 "name": "Admin User"
             }
         }
-        
-        # Sample clubs
+        return admin_data
+    
+    def _sample_clubs(self):
+        """Sample clubs"""
         sample_clubs = {
             "club_cs": {
                 "id": "club_cs",
@@ -60,8 +126,10 @@ class SimpleDB:
                 "created_date": datetime.now().isoformat()
             }
         }
-        
-        # Sample announcements
+        return sample_clubs
+    
+    def _sample_announcements(self):
+        """Sample announcements"""
         sample_announcements = [
             {
                 "id": str(uuid.uuid4()),
@@ -84,220 +152,1045 @@ class SimpleDB:
                 "expiry_date": None
             }
         ]
+        return sample_announcements
+    
+    def _ensure_initialized(self):
+        """Create the data directory and missing default collections on first use"""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready or self._initializing:
+                return
+            self._initializing = True
+            try:
+                os.makedirs(self.data_dir, exist_ok=True)
+                self._replay_journal()
+                if self.defaults:
+                    self.init_default_data()
+                self._ready = True
+            finally:
+                self._initializing = False
+    
+    def path(self, filename):
+        """Absolute location of a file in the data directory"""
+        self._ensure_initialized()
+        return os.path.join(self.data_dir, filename)
+    
+    def default_data(self, filename):
+        """Empty value returned for a missing or unreadable collection"""
+        return {} if filename.endswith('.json') and not filename.endswith('announcements.json') else []
+    
+    def load_data(self, filename, for_update=False):
+        """Load a collection file.
         
-        # Ensure files exist with default data
-        default_data = {
-            "users.json": admin_data,
-            "students.json": {},
-            "announcements.json": sample_announcements,
-            "clubs.json": sample_clubs,
-            "club_requests.json": [],
-            "chats.json": {},
-            "calls.json": [],
-            "confessions.json": []
-        }
+        Returns the process-wide cached copy, which must be treated as read-only.
+        Pass for_update=True to get a private copy of it that can be modified and saved.
+        """
+        path = self.path(filename)
+        if filename in self._dirty:
+            with self._lock:
+                cached = self._cache.get(filename)
+                if filename in self._dirty:
+                    instrumentation.record_cache_hit(filename)
+                    return journal.thaw(cached[1]) if for_update else cached[1]
         
-        for filename, data in default_data.items():
-            if not os.path.exists(os.path.join(self.data_dir, filename)):
-                self.save_data(filename, data)
-    
-    def load_data(self, filename):
-        """Load data from JSON file"""
         try:
-            with open(os.path.join(self.data_dir, filename), 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {} if filename.endswith('.json') and not filename.endswith('announcements.json') else []
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return self.default_data(filename)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        
+        with self._lock:
+            cached = self._cache.get(filename)
+            if cached and cached[0] == stamp:
+                instrumentation.record_cache_hit(filename)
+                return journal.thaw(cached[1]) if for_update else cached[1]
+        
+        data = self._read_file(path, filename)
+        if for_update:
+            # Freshly parsed: cache a copy and hand this one to the writer
+            self._store(filename, stamp, journal.thaw(data))
+            return data
+        self._store(filename, stamp, data)
+        return self._cache[filename][1]
+    
+    def iter_data(self, filename):
+        """Records of a list collection, one at a time.
+        
+        Walks the cached copy when it is current. Otherwise the file is streamed
+        without being cached, so a caller that stops early or keeps only a few
+        records never holds the whole collection (see serializers.iter_records).
+        """
+        path = self.path(filename)
+        with self._lock:
+            cached = self._cache.get(filename)
+            if cached and filename in self._dirty:
+                records = cached[1]
+            else:
+                records = None
+        if records is None:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return
+            if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+                records = cached[1]
+        if records is not None:
+            instrumentation.record_cache_hit(filename)
+            yield from records
+            return
+        instrumentation.record_read(filename, stat.st_size)
+        yield from serializers.iter_records(path)
     
     def save_data(self, filename, data):
-        """Save data to JSON file"""
-        with open(os.path.join(self.data_dir, filename), 'w') as f:
-            json.dump(data, f, indent=2)
+        """Save data in the configured serializer's format"""
+        path = self.path(filename)
+        if self.write_behind and self._ready:
+            self._save_behind(filename, data)
+            return
+        stamp = self._write_file(path, filename, data)
+        self._store(filename, stamp, journal.thaw(data))
+    
+    def exists(self, filename):
+        """Whether a collection file has been written yet"""
+        return filename in self._dirty or os.path.exists(self.path(filename))
+    
+    def flush(self):
+        """Write every collection saved since the last flush; returns how many.
+        
+        The journal moves to a new segment first, so saves made while the files
+        are written land in it and the older segments can go once all succeed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                pending = {filename: (self._versions[filename], self._cache[filename][1], saves)
+                           for filename, saves in self._dirty.items()}
+                flushed_segment = self._journal.rotate()
+            failed = None
+            for filename, (version, data, saves) in pending.items():
+                try:
+                    stamp = self._write_file(os.path.join(self.data_dir, filename), filename, data)
+                except Exception as e:
+                    logger.exception("write-behind flush of %s failed", filename)
+                    failed = e
+                    continue
+                with self._lock:
+                    if self._versions.get(filename) == version:
+                        self._cache[filename] = (stamp, data)
+                        del self._dirty[filename]
+                    else:
+                        # Saved again meanwhile: the newer copy stays dirty for the next flush
+                        self._dirty[filename] -= saves
+            if failed:
+                raise failed
+            self._journal.discard(flushed_segment)
+            return len(pending)
+    
+    def index(self, filename, name, build):
+        """Lookup structure derived from a collection, rebuilt only after it changes"""
+        data = self.load_data(filename)
+        version = self._versions.get(filename, 0)
+        with self._lock:
+            cached = self._indexes.get((filename, name))
+            if cached and cached[0] == version:
+                return cached[1]
+        built = build(data)
+        with self._lock:
+            self._indexes[(filename, name)] = (version, built)
+        return built
+    
+    def patch_index(self, filename, name, update):
+        """Apply one write's change to a derived index instead of rebuilding it.
+        
+        Call right after save_data. If the index was not current before that
+        write it is left alone and rebuilt on the next read.
+        """
+        with self._lock:
+            cached = self._indexes.get((filename, name))
+            version = self._versions.get(filename, 0)
+            if cached and cached[0] == version - 1:
+                update(cached[1])
+                self._indexes[(filename, name)] = (version, cached[1])
+    
+    def version(self, filename):
+        """In-process write counter for a collection"""
+        self.load_data(filename)
+        return self._versions.get(filename, 0)
+    
+    def _save_behind(self, filename, data):
+        with self._lock:
+            previous = self.load_data(filename)
+            nbytes = self._journal.append(filename, journal.diff(previous, data))
+            self._store(filename, None, journal.thaw(data))
+            self._dirty[filename] = self._dirty.get(filename, 0) + 1
+            pending = sum(self._dirty.values())
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="campus-flusher", daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+        instrumentation.record_write("journal", nbytes)
+        if pending >= self.flush_after:
+            self._flush_wanted.set()
+    
+    def _run_flusher(self):
+        while True:
+            self._flush_wanted.wait(self.flush_seconds)
+            self._flush_wanted.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Already logged; the journal keeps the changes until a flush succeeds
+                pass
+    
+    def _replay_journal(self):
+        """Apply journal segments left by an unflushed shutdown to the collection files"""
+        segments = self._journal.segments()
+        if not segments:
+            return
+        replayed = {}
+        for filename, operation in self._journal.replay():
+            if filename not in replayed:
+                replayed[filename] = self._read_file(os.path.join(self.data_dir, filename), filename)
+            replayed[filename] = journal.apply(replayed[filename], operation)
+        for filename, data in replayed.items():
+            path = os.path.join(self.data_dir, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_file(path, filename, data)
+        self._journal.discard(segments[-1][0])
+        logger.info("replayed %d journal segment(s) into %d collection(s)", len(segments), len(replayed))
+    
+    def _write_file(self, path, filename, data):
+        """Atomically replace a collection file; returns its new (mtime_ns, size)"""
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        # Cached copies are frozen at the top level only
+        if isinstance(data, MappingProxyType):
+            data = dict(data)
+        elif isinstance(data, tuple):
+            data = list(data)
+        payload = serializers.dumps(data, self.serializer)
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        instrumentation.record_write(filename, len(payload))
+        os.replace(tmp_path, path)
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def _read_file(self, path, filename):
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            instrumentation.record_read(filename, len(raw))
+            return serializers.loads(raw)
+        except (FileNotFoundError, ValueError, EOFError):
+            return self.default_data(filename)
+    
+    def _store(self, filename, stamp, data):
+        # Freeze the top level so accidental writes to the shared copy fail loudly
+        if isinstance(data, dict):
+            data = MappingProxyType(data)
+        elif isinstance(data, list):
+            data = tuple(data)
+        with self._lock:
+            self._cache[filename] = (stamp, data)
+            self._versions[filename] = self._versions.get(filename, 0) + 1
+
+logger = logging.getLogger("campus.storage")
 
 # Global database instance
 db = SimpleDB()
+chat_store = ChatStore(db)
+
+def _legacy_likes():
+    # Likes used to be stored inside each confession; they seed the like log once
+    for confession in db.iter_data("confessions.json"):
+        for like in confession.get('likes', []):
+            yield confession.get('id'), like.get('user_email')
+
+like_store = LikeStore(db, seed=_legacy_likes)
 
 # User Management Functions
+_students_lock = threading.Lock()
+
 def get_user_by_email(email):
     users = db.load_data("users.json")
     students = db.load_data("students.json")
     return users.get(email) or students.get(email)
 
+def get_students():
+    return db.load_data("students.json")
+
 def create_student(student_data):
-    students = db.load_data("students.json")
-    students[student_data['email']] = student_data
-    db.save_data("students.json", students)
+    name = student_data.get('name', student_data['email'])
+    with _students_lock:
+        students = db.load_data("students.json", for_update=True)
+        is_new = student_data['email'] not in students
+        students[student_data['email']] = student_data
+        db.save_data("students.json", students)
+        db.patch_index("students.json", "names", lambda names: names.__setitem__(student_data['email'], name))
+        db.patch_index("students.json", "directory",
+                       lambda directory: directory.add(student_data['email'], student_document(student_data)))
+    if is_new:
+        _bump_stats(students=1)
+    return True
+
+def update_student_password(email, hashed_password):
+    with _students_lock:
+        students = db.load_data("students.json", for_update=True)
+        if email not in students:
+            return False
+        students[email]['password'] = hashed_password
+        db.save_data("students.json", students)
+        # Names are unchanged; keep the lookup table instead of rebuilding it
+        db.patch_index("students.json", "names", lambda names: None)
+        db.patch_index("students.json", "directory", lambda directory: None)
     return True
 
+def _build_display_names(students):
+    return {email: student.get('name', email) for email, student in students.items()}
+
+def resolve_names(emails):
+    """Map emails to display names; unknown emails map to themselves"""
+    names = db.index("students.json", "names", _build_display_names)
+    users = db.load_data("users.json")
+    resolved = {}
+    for email in emails:
+        name = names.get(email)
+        if name is None:
+            name = users.get(email, {}).get('name', email)
+        resolved[email] = name
+    return resolved
+
+# Every prefix of a word matches, down to one letter, so the pickers narrow as you type
+DIRECTORY_EXPANSIONS = 2000
+
+def _build_student_directory(students):
+    directory = InvertedIndex(min_prefix=1, max_expansions=DIRECTORY_EXPANSIONS, stopwords=())
+    for email, student in students.items():
+        directory.add(email, student_document(dict(student, email=email)))
+    return directory
+
+def find_students(query, limit=10, exclude=()):
+    """Students whose name, email or major words start with every word of the query,
+    best matches first"""
+    exclude = set(exclude)
+    directory = db.index("students.json", "directory", _build_student_directory)
+    matches = directory.search(query, limit + len(exclude))
+    return [{"email": document['id'], "name": document['title'], "major": document['major'],
+             "year": document['year']}
+            for document, _ in matches if document['id'] not in exclude][:limit]
+
 def verify_password(password, hashed):
-    try:
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-    except:
-        return False
+    return check_password(password, hashed)
 
 # Announcement Functions
+# announcements.json only holds live announcements. The derived feed keeps them in
+# display order and the expiry list tells a read whether anything has lapsed since
+# the last one, in which case the lapsed ones are archived before answering.
+ANNOUNCEMENT_ARCHIVE_DIR = "announcement_archive"
+PRIORITY_WEIGHTS = {"high": 2, "medium": 1, "low": 0}
+_announcements_lock = threading.Lock()
+
+def _announcement_order(announcement):
+    # Ascending; the feed is read from the end for highest priority, newest first
+    return PRIORITY_WEIGHTS.get(announcement.get('priority'), 1), announcement.get('created_date') or ''
+
+def _build_announcement_index(announcements):
+    return {
+        "feed": sorted(announcements, key=_announcement_order),
+        "expiries": sorted((a['expiry_date'], a.get('id')) for a in announcements if a.get('expiry_date'))
+    }
+
+def _index_announcement(index, announcement):
+    bisect.insort(index["feed"], announcement, key=_announcement_order)
+    if announcement.get('expiry_date'):
+        bisect.insort(index["expiries"], (announcement['expiry_date'], announcement.get('id')))
+
 def create_announcement(announcement_data):
-    announcements = db.load_data("announcements.json")
-    announcements.append(announcement_data)
-    db.save_data("announcements.json", announcements)
+    with _announcements_lock:
+        announcements = db.load_data("announcements.json", for_update=True)
+        announcements.append(announcement_data)
+        db.save_data("announcements.json", announcements)
+        # The feed holds the cached records, not the caller's
+        stored = db.load_data("announcements.json")[-1]
+        db.patch_index("announcements.json", "live", lambda index: _index_announcement(index, stored))
+    _bump_stats(announcements=1)
+    _update_search_index(added=[announcement_document(announcement_data)])
     return True
 
-def get_announcements():
-    return db.load_data("announcements.json")
+def get_announcements(limit=None):
+    """Live announcements, highest priority first and newest first within a priority"""
+    index = db.index("announcements.json", "live", _build_announcement_index)
+    if index["expiries"] and index["expiries"][0][0] <= datetime.now().isoformat():
+        archive_expired_announcements()
+        index = db.index("announcements.json", "live", _build_announcement_index)
+    feed = index["feed"]
+    return feed[::-1] if limit is None else feed[:-limit - 1:-1] if limit else []
+
+def archive_expired_announcements():
+    """Move announcements past their expiry_date to announcement_archive/<YYYY-MM>.json;
+    returns how many were moved"""
+    now = datetime.now().isoformat()
+    with _announcements_lock:
+        announcements = db.load_data("announcements.json", for_update=True)
+        live, months = [], {}
+        for announcement in announcements:
+            expiry = announcement.get('expiry_date')
+            if expiry and expiry <= now:
+                months.setdefault(expiry[:7], []).append(announcement)
+            else:
+                live.append(announcement)
+        if not months:
+            return 0
+        _append_to_archive(ANNOUNCEMENT_ARCHIVE_DIR, months)
+        # The feed and expiry list are rebuilt on the next read
+        db.save_data("announcements.json", live)
+    expired = [a for month in months.values() for a in month]
+    _bump_stats(announcements=-len(expired))
+    _update_search_index(removed=[document_key(announcement_document(a)) for a in expired])
+    return len(expired)
+
+def _append_to_archive(directory, months):
+    """Append records to the monthly segments <directory>/<YYYY-MM>.json"""
+    os.makedirs(db.path(directory), exist_ok=True)
+    for month, records in months.items():
+        filename = f"{directory}/{month}.json"
+        segment = db.load_data(filename, for_update=True) if db.exists(filename) else []
+        db.save_data(filename, segment + records)
 
 # Club Functions
 def get_clubs():
     return db.load_data("clubs.json")
 
+CLUB_FIELDS = ("name", "category", "description", "meeting_schedule", "location")
+# Held around every clubs.json read-modify-write; taken before _club_requests_lock
+_clubs_lock = threading.Lock()
+
+def update_club(club_id, updates):
+    """Edit a club's details; members and requests are not touched"""
+    with _clubs_lock:
+        clubs = db.load_data("clubs.json", for_update=True)
+        if club_id not in clubs:
+            return False
+        clubs[club_id].update({field: value for field, value in updates.items() if field in CLUB_FIELDS})
+        db.save_data("clubs.json", clubs)
+        # Membership is unchanged; keep the reverse index instead of rebuilding it
+        db.patch_index("clubs.json", "memberships", lambda memberships: None)
+    _update_search_index(added=[club_document(clubs[club_id])])
+    return True
+
+def _build_club_memberships(clubs):
+    # Club ids are kept as dict keys: O(1) updates, and clubs stay in joining order
+    memberships = {}
+    for club_id, club in clubs.items():
+        for email in club.get('members', []):
+            memberships.setdefault(email, {"members": {}, "pending": {}})["members"][club_id] = True
+        for email in club.get('pending_requests', []):
+            memberships.setdefault(email, {"members": {}, "pending": {}})["pending"][club_id] = True
+    return memberships
+
+def _club_memberships():
+    """Reverse membership index: email -> {"members": club ids, "pending": club ids}"""
+    return db.index("clubs.json", "memberships", _build_club_memberships)
+
+def _patch_club_memberships(email, club_id, status):
+    """Mirror a join request ("pending"), an approval ("members") or a rejection (None)
+    after a clubs.json write"""
+    def update(memberships):
+        entry = memberships.setdefault(email, {"members": {}, "pending": {}})
+        if status != "pending":
+            entry["pending"].pop(club_id, None)
+        if status:
+            entry[status][club_id] = True
+    db.patch_index("clubs.json", "memberships", update)
+
+def get_clubs_for_user(email, pending=False):
+    """Clubs the user belongs to (or has a pending request for)"""
+    with _clubs_lock:
+        # Writers patch the index in place; copy the ids out before iterating them
+        clubs = get_clubs()
+        club_ids = list(_club_memberships().get(email, {}).get("pending" if pending else "members", ()))
+    return [clubs[club_id] for club_id in club_ids if club_id in clubs]
+
+def count_clubs_for_user(email):
+    return len(_club_memberships().get(email, {}).get("members", ()))
+
+# club_requests.json holds pending requests and recently processed ones; processed
+# requests are moved to monthly archive files. A derived index gives each request's
+# position and the request ids per status and per club and status, oldest first.
+CLUB_REQUEST_ARCHIVE_DIR = "club_request_archive"
+CLUB_REQUEST_ARCHIVE_DAYS = get_setting("clubs", "archive_after_days", 7)
+_club_requests_lock = threading.Lock()
+
+def _build_club_request_index(requests):
+    index = {"positions": {}, "by_status": {}, "by_club": {}}
+    for position, request in enumerate(requests):
+        _index_club_request(index, position, request)
+    return index
+
+def _index_club_request(index, position, request):
+    request_id, status = request.get('id'), request.get('status')
+    index["positions"][request_id] = position
+    index["by_status"].setdefault(status, {})[request_id] = True
+    index["by_club"].setdefault(request.get('club_id'), {}).setdefault(status, {})[request_id] = True
+
+def _club_request_index():
+    return db.index("club_requests.json", "lookup", _build_club_request_index)
+
 def join_club_request(student_email, club_id):
-    clubs = db.load_data("clubs.json")
-    if club_id in clubs:
-        if student_email not in clubs[club_id]["pending_requests"]:
-            clubs[club_id]["pending_requests"].append(student_email)
-            db.save_data("clubs.json", clubs)
-            
-            requests = db.load_data("club_requests.json")
-            requests.append({
-                "id": str(uuid.uuid4()),
-                "student_email": student_email,
-                "club_id": club_id,
-                "status": "pending",
-                "request_date": datetime.now().isoformat()
-            })
+    with _clubs_lock:
+        clubs = db.load_data("clubs.json", for_update=True)
+        if club_id not in clubs or student_email in clubs[club_id]["pending_requests"]:
+            return False
+        clubs[club_id]["pending_requests"].append(student_email)
+        db.save_data("clubs.json", clubs)
+        _patch_club_memberships(student_email, club_id, "pending")
+        
+        request = {
+            "id": str(uuid.uuid4()),
+            "student_email": student_email,
+            "club_id": club_id,
+            "status": "pending",
+            "request_date": datetime.now().isoformat()
+        }
+        with _club_requests_lock:
+            requests = db.load_data("club_requests.json", for_update=True)
+            requests.append(request)
             db.save_data("club_requests.json", requests)
-            return True
-    return False
+            db.patch_index("club_requests.json", "lookup",
+                           lambda index: _index_club_request(index, len(requests) - 1, request))
+    _bump_stats(pending_club_requests=1)
+    return True
+
+def get_club_requests(status=None, club_id=None, limit=None):
+    """Requests not yet archived, oldest first, optionally only those with a status
+    and/or for one club"""
+    if status is None and club_id is None:
+        requests = db.load_data("club_requests.json")
+        return requests[:limit] if limit is not None else requests
+    # Writers patch the index in place: read it and the requests it points into
+    # under their lock so both come from the same save
+    with _club_requests_lock:
+        requests = db.load_data("club_requests.json")
+        index = _club_request_index()
+        if club_id is None:
+            ids = index["by_status"].get(status, {})
+        elif status is not None:
+            ids = index["by_club"].get(club_id, {}).get(status, {})
+        else:
+            ids = sorted((i for ids in index["by_club"].get(club_id, {}).values() for i in ids),
+                         key=index["positions"].get)
+        positions = index["positions"]
+        return [requests[positions[request_id]] for request_id in islice(ids, limit)]
+
+def get_club_request(request_id):
+    with _club_requests_lock:
+        position = _club_request_index()["positions"].get(request_id)
+        return db.load_data("club_requests.json")[position] if position is not None else None
+
+def iter_club_requests(status=None, club_id=None):
+    """Like get_club_requests, but streamed one request at a time"""
+    for request in db.iter_data("club_requests.json"):
+        if status is not None and request.get('status') != status:
+            continue
+        if club_id is None or request.get('club_id') == club_id:
+            yield request
+
+def _process_club_request(request_id, status):
+    """Mark a request approved or rejected; returns whether it was pending"""
+    with _club_requests_lock:
+        position = _club_request_index()["positions"].get(request_id)
+        if position is None:
+            return False
+        requests = db.load_data("club_requests.json", for_update=True)
+        request = requests[position]
+        previous = request.get("status")
+        request["status"] = status
+        request["processed_date"] = datetime.now().isoformat()
+        db.save_data("club_requests.json", requests)
+        
+        def update(index):
+            index["by_status"].get(previous, {}).pop(request_id, None)
+            index["by_status"].setdefault(status, {})[request_id] = True
+            by_club = index["by_club"].setdefault(request.get('club_id'), {})
+            by_club.get(previous, {}).pop(request_id, None)
+            by_club.setdefault(status, {})[request_id] = True
+        db.patch_index("club_requests.json", "lookup", update)
+    if previous == "pending":
+        _bump_stats(pending_club_requests=-1)
+    return previous == "pending"
 
 def approve_club_request(request_id, club_id, student_email):
-    clubs = db.load_data("clubs.json")
-    if club_id in clubs:
+    with _clubs_lock:
+        clubs = db.load_data("clubs.json", for_update=True)
+        if club_id not in clubs:
+            return False
         if student_email in clubs[club_id]["pending_requests"]:
             clubs[club_id]["pending_requests"].remove(student_email)
         if student_email not in clubs[club_id]["members"]:
             clubs[club_id]["members"].append(student_email)
         db.save_data("clubs.json", clubs)
-        
-        requests = db.load_data("club_requests.json")
+        _patch_club_memberships(student_email, club_id, "members")
+        _process_club_request(request_id, "approved")
+    return True
+
+def reject_club_request(request_id):
+    """Turn down a pending join request; False if it is unknown or already processed"""
+    with _clubs_lock:
+        request = get_club_request(request_id)
+        if request is None or request.get("status") != "pending":
+            return False
+        clubs = db.load_data("clubs.json", for_update=True)
+        club = clubs.get(request["club_id"])
+        if club and request["student_email"] in club["pending_requests"]:
+            club["pending_requests"].remove(request["student_email"])
+            db.save_data("clubs.json", clubs)
+            _patch_club_memberships(request["student_email"], request["club_id"], None)
+        return _process_club_request(request_id, "rejected")
+
+def archive_club_requests(older_than_days=None):
+    """Move approved and rejected requests processed more than older_than_days ago
+    to club_request_archive/<YYYY-MM>.json; returns how many were moved"""
+    days = CLUB_REQUEST_ARCHIVE_DAYS if older_than_days is None else older_than_days
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    with _club_requests_lock:
+        requests = db.load_data("club_requests.json", for_update=True)
+        keep, months = [], {}
         for request in requests:
-            if request.get("id") == request_id:
-                request["status"] = "approved"
-                request["processed_date"] = datetime.now().isoformat()
-                break
-        db.save_data("club_requests.json", requests)
-        return True
-    return False
+            processed = request.get("processed_date")
+            if request.get("status") == "pending" or not processed or processed >= cutoff:
+                keep.append(request)
+            else:
+                months.setdefault(processed[:7], []).append(request)
+        if not months:
+            return 0
+        _append_to_archive(CLUB_REQUEST_ARCHIVE_DIR, months)
+        # Positions shift, so the request index is rebuilt on the next read
+        db.save_data("club_requests.json", keep)
+    return len(requests) - len(keep)
 
 # Chat Functions
 def create_chat(user1, user2):
-    chats = db.load_data("chats.json")
-    chat_id = f"chat_{user1}_{user2}"
-    if chat_id not in chats:
-        chats[chat_id] = {
-            "participants": [user1, user2],
-            "messages": [],
-            "created_date": datetime.now().isoformat()
-        }
-        db.save_data("chats.json", chats)
+    chat_id = chat_id_for(user1, user2)
+    # Chats used to be keyed in the order they were started; keep using such a chat
+    legacy_id = legacy_chat_id_for(user1, user2)
+    if not chat_store.get_chat(chat_id) and chat_store.get_chat(legacy_id):
+        return legacy_id
+    chat_store.create_chat(chat_id, [user1, user2], datetime.now().isoformat())
     return chat_id
 
 def send_message(chat_id, sender, message):
-    chats = db.load_data("chats.json")
-    if chat_id in chats:
-        chats[chat_id]["messages"].append({
-            "id": str(uuid.uuid4()),
-            "sender": sender,
-            "message": message,
-            "timestamp": datetime.now().isoformat()
-        })
-        db.save_data("chats.json", chats)
+    if chat_store.append_message(chat_id, {
+        "id": str(uuid.uuid4()),
+        "sender": sender,
+        "message": message,
+        "timestamp": datetime.now().isoformat()
+    }):
+        _bump_stats(messages_today=1)
         return True
     return False
 
-def get_chat_messages(chat_id):
-    chats = db.load_data("chats.json")
-    return chats.get(chat_id, {}).get("messages", [])
+def get_chat_messages(chat_id, before=None, limit=50):
+    """The latest `limit` messages of a chat, or those preceding message id `before`"""
+    return chat_store.read_messages(chat_id, before=before, limit=limit)
+
+def get_messages_since(chat_id, last_id, limit=50):
+    """Messages sent after message id `last_id`, oldest first"""
+    return chat_store.read_messages_since(chat_id, last_id, limit=limit)
+
+def get_inbox(email):
+    """The user's conversations, most recent first: chat_id, peer, last_message,
+    last_sender, last_timestamp and unread"""
+    inbox = chat_store.inbox(email)
+    conversations = [dict(entry, chat_id=chat_id) for chat_id, entry in inbox.items()]
+    conversations.sort(key=lambda entry: entry['last_timestamp'] or entry['created_date'] or '', reverse=True)
+    return conversations
+
+def mark_chat_read(chat_id, email):
+    return chat_store.mark_read(chat_id, email)
+
+def get_chat_version(chat_id):
+    """Cheap value that changes whenever a message is sent to the chat"""
+    return chat_store.version(chat_id)
+
+def roll_chat_segments(hot_months=None):
+    """Move chat messages older than the last hot_months calendar months into
+    compressed monthly segments; returns how many messages moved"""
+    return chat_store.roll(hot_months)
 
 # Call Functions
+# calls.json is in start order. A derived index gives each call's position, each
+# user's positions (oldest first) and the active calls, and is patched by every
+# write. Heartbeats go to the small call_heartbeats.json instead of calls.json, at
+# most about twice per heartbeat interval per call, so every process (other
+# Streamlit workers, manage.py reap-calls) sees when a call was last alive.
+CALL_HEARTBEAT_SECONDS = get_setting("calls", "heartbeat_seconds", 10)
+CALL_TIMEOUT_SECONDS = get_setting("calls", "timeout_seconds", 60)
+CALL_REAPER_SECONDS = get_setting("calls", "reaper_seconds", 30)
+CALL_ARCHIVE_DAYS = get_setting("calls", "archive_after_days", 30)
+CALL_ARCHIVE_DIR = "call_archive"
+CALL_HEARTBEAT_FILE = "call_heartbeats.json"
+_calls_lock = threading.Lock()
+
+def _build_call_index(calls):
+    index = {"positions": {}, "by_user": {}, "active": set()}
+    for position, call in enumerate(calls):
+        _index_call(index, position, call)
+    return index
+
+def _index_call(index, position, call):
+    index["positions"][call.get('id')] = position
+    for email in call.get('participants', []):
+        index["by_user"].setdefault(email, []).append(position)
+    if call.get('status') == 'active':
+        index["active"].add(call.get('id'))
+
+def _call_index():
+    return db.index("calls.json", "lookup", _build_call_index)
+
 def create_call(call_data):
-    calls = db.load_data("calls.json")
-    calls.append(call_data)
-    db.save_data("calls.json", calls)
+    with _calls_lock:
+        calls = db.load_data("calls.json", for_update=True)
+        calls.append(call_data)
+        db.save_data("calls.json", calls)
+        db.patch_index("calls.json", "lookup", lambda index: _index_call(index, len(calls) - 1, call_data))
     return True
 
 def get_calls():
+    """Calls still in calls.json; archived calls are in the monthly archive files"""
     return db.load_data("calls.json")
 
-def get_user_calls(user_email):
+def get_call(call_id):
     calls = db.load_data("calls.json")
-    user_calls = []
-    for call in calls:
-        if user_email in call.get('participants', []):
-            user_calls.append(call)
-    return user_calls
+    position = _call_index()["positions"].get(call_id)
+    return calls[position] if position is not None else None
 
-def update_call_status(call_id, status):
+def get_user_calls(user_email, limit=None):
+    """The user's calls, oldest first; with a limit, only the most recent ones"""
     calls = db.load_data("calls.json")
-    for call in calls:
-        if call.get('id') == call_id:
-            call['status'] = status
-            if status == 'ended':
-                call['end_time'] = datetime.now().isoformat()
-            db.save_data("calls.json", calls)
-            return True
-    return False
+    positions = _call_index()["by_user"].get(user_email, [])
+    if limit is not None:
+        positions = positions[-limit:] if limit else []
+    return [calls[position] for position in positions]
+
+def iter_calls(user=None):
+    """Calls oldest first, streamed one at a time; only the user's if `user` is given"""
+    for call in db.iter_data("calls.json"):
+        if user is None or user in call.get('participants', ()):
+            yield call
+
+def update_call_status(call_id, status):
+    with _calls_lock:
+        position = _call_index()["positions"].get(call_id)
+        if position is None:
+            return False
+        calls = db.load_data("calls.json", for_update=True)
+        call = calls[position]
+        call['status'] = status
+        if status == 'ended':
+            call['end_time'] = datetime.now().isoformat()
+        db.save_data("calls.json", calls)
+        
+        def update(index):
+            if status == 'active':
+                index["active"].add(call_id)
+            else:
+                index["active"].discard(call_id)
+        db.patch_index("calls.json", "lookup", update)
+        if status != 'active':
+            _forget_heartbeats([call_id])
+    return True
+
+def heartbeat_call(call_id):
+    """Record that a participant still has the call open; False once it is no longer active"""
+    if call_id not in _call_index()["active"]:
+        return False
+    now = datetime.now()
+    last_seen = _parse_time(db.load_data(CALL_HEARTBEAT_FILE).get(call_id))
+    # Both participants send heartbeats; one write per half interval is plenty
+    if last_seen is None or (now - last_seen).total_seconds() >= CALL_HEARTBEAT_SECONDS / 2:
+        with _calls_lock:
+            heartbeats = db.load_data(CALL_HEARTBEAT_FILE, for_update=True)
+            heartbeats[call_id] = now.isoformat()
+            db.save_data(CALL_HEARTBEAT_FILE, heartbeats)
+    return True
+
+def _forget_heartbeats(call_ids):
+    """Drop the heartbeats of calls that are no longer active; call with _calls_lock held"""
+    heartbeats = db.load_data(CALL_HEARTBEAT_FILE)
+    if any(call_id in heartbeats for call_id in call_ids):
+        heartbeats = db.load_data(CALL_HEARTBEAT_FILE, for_update=True)
+        for call_id in call_ids:
+            heartbeats.pop(call_id, None)
+        db.save_data(CALL_HEARTBEAT_FILE, heartbeats)
+
+def reap_stale_calls(timeout_seconds=None):
+    """End active calls without a heartbeat for timeout_seconds as 'timed_out'"""
+    timeout = CALL_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+    cutoff = datetime.now().timestamp() - timeout
+    with _calls_lock:
+        # Scanned under the lock, so a heartbeat that lands first keeps its call alive
+        stale = {}
+        calls = db.load_data("calls.json")
+        heartbeats = db.load_data(CALL_HEARTBEAT_FILE)
+        index = _call_index()
+        for call_id in index["active"]:
+            call = calls[index["positions"][call_id]]
+            last_seen = _parse_time(heartbeats.get(call_id)) or _parse_time(call.get('start_time'))
+            if last_seen is None or last_seen.timestamp() < cutoff:
+                stale[call_id] = (last_seen or datetime.now()).isoformat()
+        if not stale:
+            return 0
+        calls = db.load_data("calls.json", for_update=True)
+        reaped = 0
+        for call in calls:
+            if call.get('id') in stale and call.get('status') == 'active':
+                call['status'] = 'timed_out'
+                call['end_time'] = stale[call.get('id')]
+                reaped += 1
+        db.save_data("calls.json", calls)
+        db.patch_index("calls.json", "lookup", lambda index: index["active"].difference_update(stale))
+        _forget_heartbeats(stale)
+    return reaped
+
+def archive_calls(older_than_days=None):
+    """Move finished calls started more than older_than_days ago out of calls.json
+    into call_archive/<YYYY-MM>.json; returns how many were moved"""
+    days = CALL_ARCHIVE_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now().timestamp() - days * 86400
+    with _calls_lock:
+        calls = db.load_data("calls.json", for_update=True)
+        keep, months = [], {}
+        for call in calls:
+            started = _parse_time(call.get('start_time'))
+            if call.get('status') == 'active' or started is None or started.timestamp() >= cutoff:
+                keep.append(call)
+            else:
+                months.setdefault(started.strftime("%Y-%m"), []).append(call)
+        if not months:
+            return 0
+        _append_to_archive(CALL_ARCHIVE_DIR, months)
+        # Positions shift, so the call index is rebuilt on the next read
+        db.save_data("calls.json", keep)
+    return len(calls) - len(keep)
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
 
 # Confession Functions
+# confession_feed.json is the student-facing projection of approved confessions:
+# sanitized, sorted oldest-first by (created_date, id), and kept in step by every
+# confession write so reading a feed page never touches confessions.json.
+CONFESSION_FEED = "confession_feed.json"
+# Writes look confessions up by position, so lookup and load/modify/save run under it
+_confessions_lock = threading.Lock()
+
+def _feed_key(confession):
+    return (confession.get('created_date') or '', confession.get('id') or '')
+
+def _student_projection(confession):
+    projection = {key: value for key, value in confession.items()
+                  if key not in ('user_email', 'likes', 'likes_count')}
+    projection['comments'] = get_comments_for_students(confession)
+    return projection
+
+def rebuild_confession_feed():
+    """Rebuild the student feed projection from confessions.json"""
+    feed = [_student_projection(c) for c in iter_confessions(approved=True)]
+    feed.sort(key=_feed_key)
+    db.save_data(CONFESSION_FEED, feed)
+
+def _load_confession_feed(for_update=False):
+    if not db.exists(CONFESSION_FEED):
+        rebuild_confession_feed()
+    return db.load_data(CONFESSION_FEED, for_update=for_update)
+
+def _update_confession_feed(confessions, remove=False):
+    """Insert, replace or remove confessions in the feed projection with one write"""
+    feed = _load_confession_feed(for_update=True)
+    changed = False
+    for confession in confessions:
+        key = _feed_key(confession)
+        position = bisect.bisect_left(feed, key, key=_feed_key)
+        found = position < len(feed) and _feed_key(feed[position]) == key
+        if remove:
+            if not found:
+                continue
+            del feed[position]
+        elif found:
+            feed[position] = _student_projection(confession)
+        elif confession.get('is_approved', False):
+            feed.insert(position, _student_projection(confession))
+        else:
+            continue
+        changed = True
+    if changed:
+        db.save_data(CONFESSION_FEED, feed)
+
 def create_confession(confession_data):
-    confessions = db.load_data("confessions.json")
-    confession_data['anonymous_id'] = f"anon_{str(uuid.uuid4())[:8]}"
-    confession_data['user_email'] = confession_data.pop('user_email', None)
-    confessions.append(confession_data)
-    db.save_data("confessions.json", confessions)
+    with _confessions_lock:
+        confessions = db.load_data("confessions.json", for_update=True)
+        confession_data['anonymous_id'] = f"anon_{str(uuid.uuid4())[:8]}"
+        confession_data['user_email'] = confession_data.pop('user_email', None)
+        confessions.append(confession_data)
+        db.save_data("confessions.json", confessions)
+        db.patch_index("confessions.json", "by_id",
+                       lambda positions: positions.__setitem__(confession_data.get('id'), len(confessions) - 1))
+        db.patch_index("confessions.json", "pending", lambda queue: _queue_confession(queue, confession_data))
+        if confession_data.get('is_approved', False):
+            _update_confession_feed([confession_data])
+            _update_search_index(added=[confession_document(confession_data)])
+            _bump_stats(approved_confessions=1)
+        else:
+            _bump_stats(pending_confessions=1)
     return True
 
 def get_confessions_for_students():
-    confessions = db.load_data("confessions.json")
-    student_view = []
-    for confession in confessions:
-        student_confession = confession.copy()
-        student_confession.pop('user_email', None)
-        student_view.append(student_confession)
-    return student_view
+    """All approved confessions as students see them, oldest first"""
+    return _load_confession_feed()
+
+def get_confession_feed(cursor=None, limit=20):
+    """One page of the student feed, newest first.
+
+    Returns (confessions, next_cursor); pass next_cursor back to get the
+    following page. next_cursor is None on the last page.
+    """
+    feed = _load_confession_feed()
+    end = len(feed)
+    if cursor:
+        created_date, _, confession_id = cursor.partition('|')
+        end = bisect.bisect_left(feed, (created_date, confession_id), key=_feed_key)
+    start = max(0, end - limit)
+    page = list(reversed(feed[start:end]))
+    next_cursor = '|'.join(_feed_key(feed[start])) if start > 0 else None
+    return page, next_cursor
 
 def get_confessions_for_admin():
     return db.load_data("confessions.json")
 
+def iter_confessions(approved=None):
+    """Confessions oldest first, streamed one at a time; approved=True/False picks one side"""
+    for confession in db.iter_data("confessions.json"):
+        if approved is None or confession.get('is_approved', False) == approved:
+            yield confession
+
+# The moderation queue: (created_date, id) of every pending confession, oldest first
+def _build_moderation_queue(confessions):
+    return sorted(_feed_key(c) for c in confessions if not c.get('is_approved', False))
+
+def _queue_confession(queue, confession):
+    if not confession.get('is_approved', False):
+        bisect.insort(queue, _feed_key(confession))
+
+def get_moderation_queue(cursor=None, limit=20):
+    """One page of pending confessions, oldest first, and the cursor for the next page"""
+    # The queue, the confessions and their positions must all come from the same save
+    with _confessions_lock:
+        queue = db.index("confessions.json", "pending", _build_moderation_queue)
+        start = 0
+        if cursor:
+            created_date, _, confession_id = cursor.partition('|')
+            start = bisect.bisect_right(queue, (created_date, confession_id))
+        keys = queue[start:start + limit]
+        confessions = db.load_data("confessions.json")
+        positions = _confessions_by_id()
+        page = [confessions[positions[confession_id]] for _, confession_id in keys]
+        next_cursor = '|'.join(keys[-1]) if start + limit < len(queue) else None
+    return page, next_cursor
+
+MODERATION_ACTIONS = ("approve", "reject", "delete")
+
+def moderate_confessions(confession_ids, action):
+    """Approve, reject or delete many confessions with a single write.
+
+    "reject" removes pending confessions and leaves approved ones alone;
+    "delete" removes any. Returns how many confessions the action applied to.
+    """
+    if action not in MODERATION_ACTIONS:
+        raise ValueError(f"unknown moderation action: {action}")
+    with _confessions_lock:
+        positions = _confessions_by_id()
+        confessions = db.load_data("confessions.json", for_update=True)
+        targets = [confessions[positions[i]] for i in dict.fromkeys(confession_ids) if i in positions]
+        if action == "reject":
+            targets = [c for c in targets if not c.get('is_approved', False)]
+        if not targets:
+            return 0
+        approved = [c for c in targets if c.get('is_approved', False)]
+        pending = [c for c in targets if not c.get('is_approved', False)]
+    
+        if action == "approve":
+            for confession in pending:
+                confession['is_approved'] = True
+            if pending:
+                db.save_data("confessions.json", confessions)
+                # Positions are unchanged; approved confessions leave the queue
+                db.patch_index("confessions.json", "by_id", lambda positions: None)
+                def dequeue(queue):
+                    for key in map(_feed_key, pending):
+                        position = bisect.bisect_left(queue, key)
+                        if position < len(queue) and queue[position] == key:
+                            del queue[position]
+                db.patch_index("confessions.json", "pending", dequeue)
+                _update_confession_feed(pending)
+                _update_search_index(added=[confession_document(c) for c in pending])
+        else:
+            removed = {c.get('id') for c in targets}
+            db.save_data("confessions.json", [c for c in confessions if c.get('id') not in removed])
+            if approved:
+                _update_confession_feed(approved, remove=True)
+                _update_search_index(removed=[document_key(confession_document(c)) for c in approved])
+        # Approving turns pending into approved; deleting removes approved ones too
+        if action == "approve":
+            _bump_stats(pending_confessions=-len(pending), approved_confessions=len(pending))
+        elif pending or approved:
+            _bump_stats(pending_confessions=-len(pending), approved_confessions=-len(approved))
+    return len(targets)
+
+def approve_confession(confession_id):
+    return moderate_confessions([confession_id], "approve") > 0
+
+def delete_confession(confession_id):
+    return moderate_confessions([confession_id], "delete") > 0
+
+def _confessions_by_id():
+    return db.index("confessions.json", "by_id",
+                    lambda confessions: {c.get('id'): position for position, c in enumerate(confessions)})
+
 def like_confession(confession_id, student_email):
-    confessions = db.load_data("confessions.json")
-    for confession in confessions:
-        if confession.get('id') == confession_id:
-            if 'likes' not in confession:
-                confession['likes'] = []
-            like_data = {
-                'anonymous_id': f"anon_{str(uuid.uuid4())[:8]}",
-                'user_email': student_email
-            }
-            confession['likes'].append(like_data)
-            db.save_data("confessions.json", confessions)
-            return True
-    return False
+    """Like a confession once per student; returns False for unknown or repeat likes"""
+    if confession_id not in _confessions_by_id():
+        return False
+    return like_store.add(confession_id, student_email)
+
+def has_liked(confession_id, student_email):
+    return like_store.has_liked(confession_id, student_email)
 
 def get_likes_count(confession):
-    likes = confession.get('likes', [])
-    return len(likes)
+    return like_store.count(confession.get('id'))
 
 def add_comment(confession_id, comment_data, user_email):
-    confessions = db.load_data("confessions.json")
-    for confession in confessions:
-        if confession.get('id') == confession_id:
-            if 'comments' not in confession:
-                confession['comments'] = []
-            comment_data['anonymous_id'] = f"anon_{str(uuid.uuid4())[:8]}"
-            comment_data['user_email'] = user_email
-            confession['comments'].append(comment_data)
-            db.save_data("confessions.json", confessions)
-            return True
-    return False
+    with _confessions_lock:
+        position = _confessions_by_id().get(confession_id)
+        if position is None:
+            return False
+        confessions = db.load_data("confessions.json", for_update=True)
+        confession = confessions[position]
+        if 'comments' not in confession:
+            confession['comments'] = []
+        comment_data['anonymous_id'] = f"anon_{str(uuid.uuid4())[:8]}"
+        comment_data['user_email'] = user_email
+        confession['comments'].append(comment_data)
+        db.save_data("confessions.json", confessions)
+        # Comments change neither positions nor the moderation queue
+        db.patch_index("confessions.json", "by_id", lambda positions: None)
+        db.patch_index("confessions.json", "pending", lambda queue: None)
+        _update_confession_feed([confession])
+    return True
 
 def get_comments_for_students(confession):
     comments = confession.get('comments', [])
@@ -307,3 +1200,170 @@ def get_comments_for_students(confession):
         student_comment.pop('user_email', None)
         student_comments.append(student_comment)
     return student_comments
+
+# Search Functions
+# search_index.json holds one search document per announcement, club and approved
+# confession. The inverted index over it is built in memory once per process and
+# patched by every write above, so a query never opens the source collections.
+SEARCH_FILE = "search_index.json"
+_search_lock = threading.Lock()
+
+def rebuild_search_index():
+    """Recreate the search documents from announcements, clubs and approved confessions"""
+    documents = [announcement_document(a) for a in db.load_data("announcements.json")]
+    documents += [club_document(club) for club in db.load_data("clubs.json").values()]
+    documents += [confession_document(c) for c in iter_confessions(approved=True)]
+    with _search_lock:
+        db.save_data(SEARCH_FILE, {document_key(document): document for document in documents})
+    return len(documents)
+
+def _build_search_index(documents):
+    index = InvertedIndex()
+    for key, document in documents.items():
+        index.add(key, document)
+    return index
+
+def _update_search_index(added=(), removed=()):
+    """Store changed search documents and patch the in-memory index to match"""
+    if not db.exists(SEARCH_FILE):
+        # Built from the collections, which already include this write
+        rebuild_search_index()
+        return
+    with _search_lock:
+        documents = db.load_data(SEARCH_FILE, for_update=True)
+        for document in added:
+            documents[document_key(document)] = document
+        for key in removed:
+            documents.pop(key, None)
+        db.save_data(SEARCH_FILE, documents)
+        
+        def update(index):
+            for document in added:
+                index.add(document_key(document), document)
+            for key in removed:
+                index.remove(key)
+        db.patch_index(SEARCH_FILE, "inverted", update)
+
+def search(query, limit=20):
+    """Announcements, clubs and approved confessions matching every word of the query,
+    best first. Words of two or more letters also match as prefixes."""
+    if not db.exists(SEARCH_FILE):
+        rebuild_search_index()
+    index = db.index(SEARCH_FILE, "inverted", _build_search_index)
+    return [search_result(document, score) for document, score in index.search(query, limit)]
+
+# Stats Functions
+# stats.json holds the admin dashboard counters. Every write above adjusts them, so
+# the dashboard reads one small file; rebuild_stats() recomputes them from scratch.
+STATS_FILE = "stats.json"
+STAT_NAMES = ("students", "clubs", "announcements", "pending_confessions", "approved_confessions",
+              "pending_club_requests", "messages_today")
+_stats_lock = threading.Lock()
+
+def _stats_current():
+    """Whether stats.json exists and has every counter (older files lack newer ones)"""
+    return db.exists(STATS_FILE) and all(name in db.load_data(STATS_FILE) for name in STAT_NAMES)
+
+def rebuild_stats():
+    """Recount every dashboard counter from the underlying collections"""
+    today = datetime.now().date().isoformat()
+    messages_today = 0
+    for chat_id in chat_store.list_chats():
+        messages_today += sum(1 for message in chat_store.read_messages(chat_id, archived=False)
+                              if message.get('timestamp', '').startswith(today))
+    stats = {
+        "students": len(db.load_data("students.json")),
+        "clubs": len(db.load_data("clubs.json")),
+        "announcements": len(db.load_data("announcements.json")),
+        "pending_confessions": sum(1 for _ in iter_confessions(approved=False)),
+        "approved_confessions": sum(1 for _ in iter_confessions(approved=True)),
+        "pending_club_requests": sum(1 for _ in iter_club_requests(status='pending')),
+        "messages_date": today,
+        "messages_today": messages_today
+    }
+    with _stats_lock:
+        db.save_data(STATS_FILE, stats)
+    return {name: value for name, value in stats.items() if name != "messages_date"}
+
+def _bump_stats(**deltas):
+    if not _stats_current():
+        rebuild_stats()
+        return
+    with _stats_lock:
+        stats = db.load_data(STATS_FILE, for_update=True)
+        today = datetime.now().date().isoformat()
+        if stats.get("messages_date") != today:
+            stats["messages_date"] = today
+            stats["messages_today"] = 0
+        for key, delta in deltas.items():
+            stats[key] = max(0, stats.get(key, 0) + delta)
+        db.save_data(STATS_FILE, stats)
+
+def get_stats():
+    """Dashboard counters: students, clubs, announcements, pending_confessions,
+    approved_confessions, pending_club_requests and messages_today"""
+    if not _stats_current():
+        rebuild_stats()
+    stats = dict(db.load_data(STATS_FILE))
+    if stats.pop("messages_date", None) != datetime.now().date().isoformat():
+        stats["messages_today"] = 0
+    return stats
+
+# Maintenance Functions
+# One background thread per process times out abandoned calls every reaper_seconds
+# and, once an hour, moves old calls, processed club requests and expired
+# announcements into their archives and rolls old chat messages into segments.
+MAINTENANCE_ARCHIVE_SECONDS = 3600
+_maintenance_lock = threading.Lock()
+_maintenance = None
+
+def start_maintenance():
+    """Start the background maintenance thread unless it is already running"""
+    global _maintenance
+    with _maintenance_lock:
+        if _maintenance is None:
+            _maintenance = threading.Thread(target=_run_maintenance, name="campus-maintenance", daemon=True)
+            _maintenance.start()
+    return True
+
+def _run_maintenance():
+    last_archive = 0.0
+    while True:
+        time.sleep(CALL_REAPER_SECONDS)
+        jobs = ["reap_stale_calls"]
+        if time.monotonic() - last_archive >= MAINTENANCE_ARCHIVE_SECONDS:
+            jobs += ["archive_calls", "archive_club_requests", "archive_expired_announcements",
+                     "roll_chat_segments"]
+            last_archive = time.monotonic()
+        for job in jobs:
+            # Looked up on every pass so the configured backend's functions are used
+            try:
+                globals()[job]()
+            except Exception:
+                logger.exception("maintenance job %s failed", job)
+
+# Storage backend selection: the SQLite backend replaces the JSON-file functions above
+if get_setting("storage", "backend", "json") == "sqlite":
+    from sqlite_db import (
+        get_user_by_email, get_students, create_student, update_student_password, resolve_names, find_students,
+        create_announcement, get_announcements, archive_expired_announcements,
+        get_clubs, update_club, get_clubs_for_user, count_clubs_for_user,
+        join_club_request, get_club_requests, get_club_request, iter_club_requests,
+        approve_club_request, reject_club_request, archive_club_requests,
+        create_chat, send_message, get_chat_messages, get_messages_since, get_chat_version,
+        get_inbox, mark_chat_read, roll_chat_segments,
+        create_call, get_calls, get_call, get_user_calls, iter_calls, update_call_status, heartbeat_call,
+        reap_stale_calls, archive_calls,
+        create_confession, get_confessions_for_students, get_confession_feed, get_confessions_for_admin,
+        iter_confessions, get_moderation_queue, moderate_confessions, approve_confession, delete_confession,
+        like_confession, has_liked, get_likes_count,
+        add_comment, rebuild_search_index, search, rebuild_stats, get_stats
+    )
+
+# Instrumentation: time every public storage function, whichever backend provides it.
+# Streaming readers are left out: their calls return at once and the work happens
+# as the caller iterates, which shows up in the collection read counters instead.
+for _name, _function in list(globals().items()):
+    if (isinstance(_function, FunctionType) and not _name.startswith('_')
+            and _function.__module__ in (__name__, "sqlite_db") and not inspect.isgeneratorfunction(_function)):
+        globals()[_name] = instrumentation.timed(_name)(_function)
@@ -0,0 +1,136 @@
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from settings import get_setting
+
+# In-process storage instrumentation. Counters are plain dicts behind one lock,
+# so recording a call costs a perf_counter pair and a few additions.
+ENABLED = get_setting("metrics", "enabled", True)
+SLOW_MS = get_setting("metrics", "slow_ms", 250.0)
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (1, 5, 25, 100, 500, 2500)
+
+logger = logging.getLogger("campus.storage")
+
+_lock = threading.Lock()
+_operations = {}
+_collections = {}
+_pages = {}
+_slow = deque(maxlen=get_setting("metrics", "slow_log_size", 200))
+_current = threading.local()
+
+def _bucket(elapsed_ms):
+    for position, bound in enumerate(BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return position
+    return len(BUCKETS_MS)
+
+def record_operation(name, elapsed_ms):
+    with _lock:
+        stats = _operations.get(name)
+        if stats is None:
+            stats = _operations[name] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                         "histogram": [0] * (len(BUCKETS_MS) + 1)}
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["histogram"][_bucket(elapsed_ms)] += 1
+        if elapsed_ms >= SLOW_MS:
+            _slow.append({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "operation": name,
+                "ms": round(elapsed_ms, 1),
+                "page": getattr(_current, "page", None)
+            })
+    if elapsed_ms >= SLOW_MS:
+        logger.warning("slow storage operation %s took %.1f ms", name, elapsed_ms)
+
+def _record_io(filename, field, amount=1, nbytes=0, bytes_field=None):
+    if not ENABLED:
+        return
+    with _lock:
+        stats = _collections.setdefault(filename, {"loads": 0, "cache_hits": 0, "bytes_read": 0,
+                                                   "saves": 0, "bytes_written": 0})
+        stats[field] += amount
+        if bytes_field:
+            stats[bytes_field] += nbytes
+    page = getattr(_current, "counters", None)
+    if page is not None:
+        page[field] += amount
+        if bytes_field:
+            page[bytes_field] += nbytes
+
+def record_read(filename, nbytes):
+    """A collection file was read and parsed"""
+    _record_io(filename, "loads", nbytes=nbytes, bytes_field="bytes_read")
+
+def record_cache_hit(filename):
+    """A collection was served from the in-process cache"""
+    _record_io(filename, "cache_hits")
+
+def record_write(filename, nbytes):
+    """A collection file was written"""
+    _record_io(filename, "saves", nbytes=nbytes, bytes_field="bytes_written")
+
+def timed(name):
+    """Decorator recording call count and latency of a storage function"""
+    def decorate(function):
+        if not ENABLED:
+            return function
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_operation(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
+
+@contextmanager
+def track_page(page):
+    """Attribute the storage traffic of one script rerun to `page`.
+
+    Nested calls (a fragment drawn as part of a full rerun) count toward the
+    outer rerun; only a fragment rerunning on its own is recorded by itself.
+    """
+    if not ENABLED or getattr(_current, "counters", None) is not None:
+        yield
+        return
+    counters = {"loads": 0, "cache_hits": 0, "bytes_read": 0, "saves": 0, "bytes_written": 0}
+    _current.page, _current.counters = page, counters
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _current.page = _current.counters = None
+        with _lock:
+            stats = _pages.setdefault(page, {"reruns": 0, "total_ms": 0.0, "loads": 0, "cache_hits": 0,
+                                             "bytes_read": 0, "saves": 0, "bytes_written": 0})
+            stats["reruns"] += 1
+            stats["total_ms"] += elapsed_ms
+            for field, value in counters.items():
+                stats[field] += value
+
+def snapshot():
+    """Copies of all counters: operations, collections, pages and the slow log (newest first)"""
+    with _lock:
+        return {
+            "operations": {name: dict(stats, histogram=list(stats["histogram"]))
+                           for name, stats in _operations.items()},
+            "collections": {filename: dict(stats) for filename, stats in _collections.items()},
+            "pages": {page: dict(stats) for page, stats in _pages.items()},
+            "slow": list(reversed(_slow))
+        }
+
+def reset():
+    with _lock:
+        _operations.clear()
+        _collections.clear()
+        _pages.clear()
+        _slow.clear()
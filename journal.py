@@ -0,0 +1,135 @@
+import json
+import marshal
+import os
+import re
+from collections.abc import Mapping
+
+# Equal-length list saves that change more items than this are journaled as a splice
+MAX_ITEM_CHANGES = 64
+
+def diff(previous, current):
+    """Journal operation that turns `previous` into `current`.
+
+    Every operation is absolute (set these keys, set these positions, keep the
+    first n items and append the rest), so replaying one onto a snapshot that
+    already includes it, or later changes, still ends in the latest state.
+    """
+    if isinstance(previous, Mapping) and isinstance(current, Mapping):
+        changed = {key: value for key, value in current.items() if key not in previous or previous[key] != value}
+        removed = [key for key in previous if key not in current]
+        return {"op": "dict", "set": changed, "delete": removed}
+    if isinstance(previous, (list, tuple)) and isinstance(current, (list, tuple)):
+        if len(previous) == len(current):
+            changed = {position: value for position, (old, value) in enumerate(zip(previous, current)) if old != value}
+            if len(changed) <= MAX_ITEM_CHANGES:
+                return {"op": "items", "items": changed}
+        keep = 0
+        shortest = min(len(previous), len(current))
+        while keep < shortest and previous[keep] == current[keep]:
+            keep += 1
+        return {"op": "splice", "keep": keep, "tail": list(current[keep:])}
+    return {"op": "value", "value": current}
+
+def apply(data, operation):
+    """Result of replaying one journal operation onto `data`"""
+    op = operation["op"]
+    if op == "value":
+        return operation["value"]
+    if op == "dict":
+        data = dict(data) if isinstance(data, Mapping) else {}
+        data.update(operation["set"])
+        for key in operation["delete"]:
+            data.pop(key, None)
+        return data
+    data = list(data) if isinstance(data, (list, tuple)) else []
+    if op == "items":
+        for position, value in operation["items"].items():
+            # JSON object keys are strings. A position past the end was cut off by a
+            # later splice in the journal, which rewrites it anyway.
+            position = int(position)
+            if position < len(data):
+                data[position] = value
+        return data
+    if op == "splice":
+        return data[:operation["keep"]] + operation["tail"]
+    raise ValueError(f"unknown journal operation: {op}")
+
+def thaw(data):
+    """Private, mutable deep copy of a cached collection"""
+    if isinstance(data, Mapping):
+        data = dict(data)
+    elif isinstance(data, tuple):
+        data = list(data)
+    # Collections hold only JSON types, which marshal copies far faster than deepcopy
+    return marshal.loads(marshal.dumps(data))
+
+class Journal:
+    """Append-only log of collection changes for SimpleDB's write-behind mode.
+
+    Changes go to the newest journal-<n>.jsonl segment. A flush rotates to a new
+    segment, writes the collections changed so far and only then discards the
+    older segments, so whatever a crash leaves behind replays onto the files.
+    """
+
+    PATTERN = re.compile(r"journal-(\d+)\.jsonl$")
+
+    def __init__(self, data_dir, fsync=False):
+        self.data_dir = data_dir
+        self.fsync = fsync
+        self._file = None
+        self._number = None
+
+    def segments(self):
+        """(number, path) of every segment on disk, oldest first"""
+        try:
+            names = os.listdir(self.data_dir)
+        except FileNotFoundError:
+            return []
+        numbered = [(int(match.group(1)), name) for name in names for match in [self.PATTERN.match(name)] if match]
+        return [(number, os.path.join(self.data_dir, name)) for number, name in sorted(numbered)]
+
+    def append(self, filename, operation):
+        """Record one change; returns the bytes written"""
+        if self._file is None:
+            self._open(max((number for number, _ in self.segments()), default=0) + 1)
+        line = (json.dumps(dict(operation, file=filename), separators=(',', ':')) + "\n").encode()
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        return len(line)
+
+    def rotate(self):
+        """Start a new segment; returns the number of the last one before it"""
+        last = self._number if self._file is not None else max((n for n, _ in self.segments()), default=0)
+        if self._file is not None:
+            self._file.close()
+        self._open(last + 1)
+        return last
+
+    def discard(self, through):
+        """Delete segments up to and including number `through`"""
+        for number, path in self.segments():
+            if number <= through:
+                os.remove(path)
+
+    def replay(self):
+        """(filename, operation) for every complete record, oldest first"""
+        for _, path in self.segments():
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-append
+                        break
+                    yield record.pop("file"), record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self, number):
+        self._number = number
+        self._file = open(os.path.join(self.data_dir, f"journal-{number}.jsonl"), 'ab')
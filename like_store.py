@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import instrumentation
+
+def read_like_log(path):
+    """(confession_id, user_email) of every complete line of a like log, read-only"""
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    like = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield like["confession_id"], like["user_email"]
+    except FileNotFoundError:
+        return
+
+class LikeStore:
+    """Confession likes as an append-only log with in-memory sets.
+
+    Each like is one JSON line in data/confession_likes.jsonl. The log is read
+    once into confession_id -> set of likers and then followed from the last
+    read offset, so liking, counting and "did I like this?" are all O(1) and a
+    like never rewrites confessions.json.
+    """
+
+    FILENAME = "confession_likes.jsonl"
+
+    def __init__(self, db, seed=None):
+        self.db = db
+        # Called once when the log does not exist yet; yields (confession_id, user_email)
+        self.seed = seed
+        self._likers = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def add(self, confession_id, user_email):
+        """Record a like; returns False if this user already liked the confession"""
+        with self._lock:
+            self._refresh()
+            likers = self._likers.setdefault(confession_id, set())
+            if user_email in likers:
+                return False
+            likers.add(user_email)
+            line = json.dumps({"confession_id": confession_id, "user_email": user_email}) + "\n"
+            # The line is read back by the next refresh, which is a no-op for the set
+            with open(self.path, 'a') as f:
+                f.write(line)
+            instrumentation.record_write(self.FILENAME, len(line))
+        return True
+
+    def count(self, confession_id):
+        with self._lock:
+            self._refresh()
+            return len(self._likers.get(confession_id, ()))
+
+    def has_liked(self, confession_id, user_email):
+        with self._lock:
+            self._refresh()
+            return user_email in self._likers.get(confession_id, ())
+
+    def all_likes(self):
+        """confession_id -> set of likers, for exports"""
+        with self._lock:
+            self._refresh()
+            return {confession_id: set(likers) for confession_id, likers in self._likers.items()}
+
+    @property
+    def path(self):
+        return self.db.path(self.FILENAME)
+
+    def _refresh(self):
+        """Pick up likes appended since the last read (including by other processes)"""
+        if not os.path.exists(self.path):
+            self._seed()
+        if os.path.getsize(self.path) == self._offset:
+            return
+        start = self._offset
+        with open(self.path, 'r') as f:
+            f.seek(self._offset)
+            while True:
+                line = f.readline()
+                if not line.endswith("\n"):
+                    break
+                self._offset = f.tell()
+                try:
+                    like = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._likers.setdefault(like["confession_id"], set()).add(like["user_email"])
+        instrumentation.record_read(self.FILENAME, self._offset - start)
+
+    def _seed(self):
+        seen = set()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for confession_id, user_email in (self.seed() if self.seed else ()):
+                if (confession_id, user_email) in seen:
+                    continue
+                seen.add((confession_id, user_email))
+                f.write(json.dumps({"confession_id": confession_id, "user_email": user_email}) + "\n")
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,39 @@
+import argparse
+from database import (
+    archive_calls, archive_club_requests, archive_expired_announcements, reap_stale_calls,
+    rebuild_search_index, rebuild_stats, roll_chat_segments
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Campus Connect maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-stats", help="Recompute the admin dashboard counters from scratch")
+    commands.add_parser("rebuild-search", help="Recreate the search index from announcements, clubs and confessions")
+    commands.add_parser("reap-calls", help="End active calls that stopped sending heartbeats")
+    archive = commands.add_parser("archive-calls", help="Move old finished calls out of the hot call list")
+    archive.add_argument("--days", type=int, help="archive calls started more than this many days ago")
+    commands.add_parser("archive-announcements", help="Move expired announcements to the archive")
+    club_archive = commands.add_parser("archive-club-requests", help="Move processed club join requests to the archive")
+    club_archive.add_argument("--days", type=int, help="archive requests processed more than this many days ago")
+    roll = commands.add_parser("roll-chats", help="Move old chat messages into compressed monthly segments")
+    roll.add_argument("--hot-months", type=int, help="calendar months of messages to keep uncompressed")
+    args = parser.parse_args()
+
+    if args.command == "rebuild-stats":
+        for name, value in rebuild_stats().items():
+            print(f"{name}: {value}")
+    elif args.command == "rebuild-search":
+        print(f"indexed {rebuild_search_index()} documents")
+    elif args.command == "reap-calls":
+        print(f"timed out {reap_stale_calls()} calls")
+    elif args.command == "archive-calls":
+        print(f"archived {archive_calls(args.days)} calls")
+    elif args.command == "archive-announcements":
+        print(f"archived {archive_expired_announcements()} announcements")
+    elif args.command == "archive-club-requests":
+        print(f"archived {archive_club_requests(args.days)} club requests")
+    elif args.command == "roll-chats":
+        print(f"rolled {roll_chat_segments(args.hot_months)} messages into segments")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from settings import get_setting
+
+class HashPool:
+    """Bounded worker pool for bcrypt.
+
+    bcrypt releases the GIL while it works, so a few threads hash in parallel
+    without stalling the script threads of other sessions. At most
+    `queue_limit` jobs wait for a worker; further callers block until a slot
+    frees up instead of piling more CPU work onto a saturated process.
+    """
+
+    def __init__(self, workers=None, queue_limit=None, rounds=None):
+        self.workers = workers or get_setting("security", "hash_workers", 0) or os.cpu_count() or 2
+        self.queue_limit = queue_limit or get_setting("security", "hash_queue_limit", 64)
+        self.rounds = rounds or get_setting("security", "bcrypt_rounds", 12)
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_limit)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._max_queued = 0
+        self._completed = 0
+        # (wait_ms, hash_ms) of the most recent jobs
+        self._timings = deque(maxlen=500)
+
+    def hash(self, secret):
+        """bcrypt hash of `secret` at the configured cost"""
+        return self._run(lambda: bcrypt.hashpw(secret.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode())
+
+    def check(self, secret, hashed):
+        """True if `secret` matches the bcrypt hash"""
+        def check():
+            try:
+                return bcrypt.checkpw(secret.encode('utf-8'), hashed.encode('utf-8'))
+            except (ValueError, TypeError, AttributeError):
+                return False
+        return self._run(check)
+
+    def needs_rehash(self, hashed):
+        """True if the hash was made with a different cost than configured"""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def metrics(self):
+        """Queue depth (callers not yet hashing) and latency figures for sizing the pool"""
+        with self._lock:
+            timings = list(self._timings)
+            metrics = {
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "queue_depth": self._queued,
+                "max_queue_depth": self._max_queued,
+                "running": self._running,
+                "completed": self._completed
+            }
+        waits = sorted(wait for wait, _ in timings)
+        hashes = sorted(hash_ms for _, hash_ms in timings)
+        metrics["avg_wait_ms"] = round(sum(waits) / len(waits), 1) if waits else 0.0
+        metrics["avg_hash_ms"] = round(sum(hashes) / len(hashes), 1) if hashes else 0.0
+        metrics["p95_hash_ms"] = round(hashes[int(len(hashes) * 0.95)], 1) if hashes else 0.0
+        return metrics
+
+    def _run(self, job):
+        submitted = time.perf_counter()
+        # Counted before waiting for a slot: callers blocked here are the queue under load
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        self._slots.acquire()
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._executor.submit(self._timed, job, submitted).result()
+        finally:
+            self._slots.release()
+
+    def _timed(self, job, submitted):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return job()
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._timings.append(((started - submitted) * 1000, (finished - started) * 1000))
+
+pool = HashPool()
+
+# Password Functions
+def hash_password(password):
+    """Hash a password (or security answer) on the bcrypt pool"""
+    return pool.hash(password)
+
+def check_password(password, hashed):
+    """Check a password against its stored hash on the bcrypt pool"""
+    return pool.check(password, hashed)
+
+def needs_rehash(hashed):
+    """True if a stored hash should be upgraded to the configured cost"""
+    return pool.needs_rehash(hashed)
+
+def get_hash_metrics():
+    return pool.metrics()
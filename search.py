@@ -0,0 +1,154 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from operator import itemgetter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+# Shorter query words only match whole tokens; longer ones also match as prefixes
+MIN_PREFIX = 2
+MAX_EXPANSIONS = 50
+SNIPPET_LENGTH = 160
+
+def tokenize(text, stopwords=STOPWORDS):
+    """Lowercase alphanumeric words of `text`, without stopwords"""
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in stopwords]
+
+# Search documents: kind, id, title, body and date of one searchable item
+def announcement_document(announcement):
+    return {"kind": "announcement", "id": announcement.get('id'), "title": announcement.get('title', ''),
+            "body": announcement.get('message', ''), "date": announcement.get('created_date')}
+
+def club_document(club):
+    return {"kind": "club", "id": club.get('id'), "title": club.get('name', ''),
+            "body": f"{club.get('description', '')} {club.get('category', '')}".strip(),
+            "date": club.get('created_date')}
+
+def confession_document(confession):
+    return {"kind": "confession", "id": confession.get('id'), "title": confession.get('category', ''),
+            "body": confession.get('text', ''), "date": confession.get('created_date')}
+
+def student_document(student):
+    """Directory entry for one student: found by name, email or major"""
+    return {"kind": "student", "id": student.get('email'), "title": student.get('name', ''),
+            "body": f"{student.get('email', '')} {student.get('major', '')}",
+            "date": student.get('joined_date'), "major": student.get('major'), "year": student.get('year')}
+
+def document_key(document):
+    return f"{document['kind']}:{document['id']}"
+
+def search_result(document, score):
+    """The public shape of a search hit"""
+    return {"kind": document['kind'], "id": document['id'], "title": document['title'] or '',
+            "snippet": (document['body'] or '')[:SNIPPET_LENGTH], "date": document['date'], "score": round(score, 4)}
+
+class InvertedIndex:
+    """Token -> postings index with BM25 ranking and prefix matching.
+
+    Documents are added and removed one at a time, so the index can be kept in
+    step with writes instead of being rebuilt. Title words count double.
+    """
+
+    FIELD_WEIGHTS = {"title": 2.0, "body": 1.0}
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, min_prefix=MIN_PREFIX, max_expansions=MAX_EXPANSIONS, stopwords=STOPWORDS):
+        self.min_prefix = min_prefix
+        self.stopwords = stopwords
+        self.max_expansions = max_expansions
+        # token -> {document key: weighted term frequency}
+        self.postings = {}
+        # document key -> ({token: weighted term frequency}, length, document)
+        self.documents = {}
+        # Sorted vocabulary for prefix lookups
+        self.vocabulary = []
+        self.total_length = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, key, document):
+        with self._lock:
+            self._remove(key)
+            frequencies = {}
+            for field, weight in self.FIELD_WEIGHTS.items():
+                for token in tokenize(document.get(field), self.stopwords):
+                    frequencies[token] = frequencies.get(token, 0.0) + weight
+            length = sum(frequencies.values())
+            self.total_length += length
+            # BM25 term weight without idf, normalised by the average length at
+            # insert time, so a query only multiplies precomputed impacts
+            average_length = self.total_length / (len(self.documents) + 1) or 1.0
+            norm = self.K1 * (1 - self.B + self.B * length / average_length)
+            for token, frequency in frequencies.items():
+                postings = self.postings.get(token)
+                if postings is None:
+                    postings = self.postings[token] = {}
+                    bisect.insort(self.vocabulary, token)
+                postings[key] = frequency * (self.K1 + 1) / (frequency + norm)
+            self.documents[key] = (frequencies, length, document)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def search(self, query, limit=20):
+        """(document, score) pairs matching every query word, best first"""
+        words = tokenize(query, self.stopwords)
+        if not words:
+            return []
+        with self._lock:
+            terms = [(word, self._expand(word)) for word in words]
+            # Rarest word first: later words only look at documents that are still candidates
+            terms.sort(key=lambda term: sum(len(self.postings[token]) for token in term[1]))
+            scores = None
+            for word, tokens in terms:
+                word_scores = {}
+                for token in tokens:
+                    postings = self.postings[token]
+                    weight = self._idf(postings) * (1.0 if token == word else 0.5)  # prefixes rank lower
+                    if scores is None:
+                        impacts = postings.items()
+                    else:
+                        impacts = ((key, postings[key]) for key in scores if key in postings)
+                    for key, impact in impacts:
+                        score = weight * impact
+                        if score > word_scores.get(key, 0.0):
+                            word_scores[key] = score
+                if scores is not None:
+                    word_scores = {key: scores[key] + score for key, score in word_scores.items()}
+                scores = word_scores
+                if not scores:
+                    return []
+            ranked = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+            return [(self.documents[key][2], score) for key, score in ranked]
+
+    def _idf(self, postings):
+        return math.log(1 + (len(self.documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+
+    def _expand(self, word):
+        """Vocabulary tokens matching a query word"""
+        if len(word) < self.min_prefix:
+            return [word] if word in self.postings else []
+        tokens = []
+        position = bisect.bisect_left(self.vocabulary, word)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(word):
+            tokens.append(self.vocabulary[position])
+            if len(tokens) == self.max_expansions:
+                break
+            position += 1
+        return tokens
+
+    def _remove(self, key):
+        entry = self.documents.pop(key, None)
+        if entry is None:
+            return
+        frequencies, length, _ = entry
+        self.total_length -= length
+        for token in frequencies:
+            postings = self.postings[token]
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
@@ -0,0 +1,148 @@
+import json
+import marshal
+import struct
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+# Binary collection files start with MAGIC, a one-byte format name length,
+# the format name and the payload length. Anything else is read as JSON, so
+# files written before the header existed (or by hand) keep loading.
+MAGIC = b"\x00CCDB"
+PAYLOAD_LENGTH = struct.Struct("<Q")
+# Line-delimited files start with a header line beginning with JSONL_HEADER
+JSONL_HEADER = b'{"format":"jsonl"'
+
+class JSONSerializer:
+    """Plain stdlib JSON without a header; `indent` keeps files diff-friendly"""
+
+    binary = False
+
+    def __init__(self, name, indent=None):
+        self.name = name
+        self.indent = indent
+        self.separators = None if indent else (',', ':')
+
+    def dumps(self, data):
+        return json.dumps(data, indent=self.indent, separators=self.separators).encode()
+
+    def loads(self, payload):
+        return json.loads(payload)
+
+class OrjsonSerializer:
+    """Compact JSON through orjson; the output is ordinary JSON"""
+
+    name = "orjson"
+    binary = False
+
+    def dumps(self, data):
+        return orjson.dumps(data)
+
+    def loads(self, payload):
+        return orjson.loads(payload)
+
+class MarshalSerializer:
+    """marshal payload behind the binary header.
+
+    The fastest option, but tied to the Python version that wrote it and only
+    safe for trusted files, so it is meant for a private data directory.
+    """
+
+    name = "marshal"
+    binary = True
+
+    def dumps(self, data):
+        return marshal.dumps(data)
+
+    def loads(self, payload):
+        return marshal.loads(payload)
+
+class JsonLinesSerializer:
+    """A header line, then one compact JSON record per line.
+
+    Only list collections are written this way (mappings stay one JSON
+    document), and iter_records() can read them back one record at a time.
+    """
+
+    name = "jsonl"
+    binary = False
+    _encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def dumps(self, data):
+        if not isinstance(data, (list, tuple)):
+            return json.dumps(data, separators=(',', ':')).encode()
+        header = JSONL_HEADER.decode() + f',"count":{len(data)}}}'
+        return "\n".join([header, *map(self._encoder.encode, data), ""]).encode()
+
+    def loads(self, payload):
+        # Compact JSON never contains a raw newline, so the records become one array
+        # to parse in a single call instead of one call per line
+        _, _, body = payload.partition(b"\n")
+        return (orjson or json).loads(b"[" + body.rstrip(b"\n").replace(b"\n", b",") + b"]")
+
+SERIALIZERS = {
+    "json": JSONSerializer("json"),
+    "json-pretty": JSONSerializer("json-pretty", indent=2),
+    "jsonl": JsonLinesSerializer(),
+    "marshal": MarshalSerializer()
+}
+if orjson:
+    SERIALIZERS["orjson"] = OrjsonSerializer()
+
+def get_serializer(name):
+    """Serializer registered under `name`; orjson falls back to json when it is not installed"""
+    if name == "orjson" and name not in SERIALIZERS:
+        name = "json"
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer {name!r}; choose from {', '.join(sorted(SERIALIZERS))}")
+    return SERIALIZERS[name]
+
+def dumps(data, serializer):
+    """Encode a collection for disk, adding the header for binary formats"""
+    payload = serializer.dumps(data)
+    if not serializer.binary:
+        return payload
+    name = serializer.name.encode()
+    return MAGIC + bytes([len(name)]) + name + PAYLOAD_LENGTH.pack(len(payload)) + payload
+
+def loads(raw):
+    """Decode a collection file in whatever format it was written"""
+    if raw.startswith(JSONL_HEADER):
+        return SERIALIZERS["jsonl"].loads(raw)
+    if not raw.startswith(MAGIC):
+        return (orjson or json).loads(raw)
+    start = len(MAGIC) + 1
+    end = start + raw[len(MAGIC)]
+    name = raw[start:end].decode()
+    if name not in SERIALIZERS:
+        raise ValueError(f"Collection written with unknown serializer {name!r}")
+    (length,) = PAYLOAD_LENGTH.unpack_from(raw, end)
+    payload = raw[end + PAYLOAD_LENGTH.size:]
+    if len(payload) != length:
+        raise ValueError(f"Truncated {name} collection: expected {length} bytes, found {len(payload)}")
+    return SERIALIZERS[name].loads(payload)
+
+def load_file(path, default=None):
+    """Decode a collection file without writing anything; `default` if it is missing or unreadable"""
+    try:
+        with open(path, 'rb') as f:
+            return loads(f.read())
+    except (FileNotFoundError, ValueError, EOFError):
+        return default
+
+def iter_records(path):
+    """Records of a list collection file, parsed one at a time.
+
+    Line-delimited files are streamed, so a caller that stops early never
+    reads the rest; any other format is decoded whole first.
+    """
+    with open(path, 'rb') as f:
+        first = f.readline()
+        if not first.startswith(JSONL_HEADER):
+            yield from loads(first + f.read())
+            return
+        parse = (orjson or json).loads
+        for line in f:
+            yield parse(line)
@@ -0,0 +1,42 @@
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+    import toml
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.toml")
+
+_config = None
+
+def load_config():
+    """Parse config.toml once per process"""
+    global _config
+    if _config is None:
+        try:
+            if tomllib:
+                with open(CONFIG_FILE, 'rb') as f:
+                    _config = tomllib.load(f)
+            else:
+                _config = toml.load(CONFIG_FILE)
+        except FileNotFoundError:
+            _config = {}
+    return _config
+
+def get_setting(section, key, default=None):
+    """Value of [section] key from config.toml.
+
+    CAMPUS_<SECTION>_<KEY> environment variables take precedence, which is
+    handy for pointing a single run at another backend or data directory.
+    """
+    env_value = os.environ.get(f"CAMPUS_{section}_{key}".upper())
+    if env_value is not None:
+        if isinstance(default, bool):
+            return env_value.lower() in ("1", "true", "yes", "on")
+        if isinstance(default, int):
+            return int(env_value)
+        if isinstance(default, float):
+            return float(env_value)
+        return env_value
+    return load_config().get(section, {}).get(key, default)
@@ -0,0 +1,1405 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+import instrumentation
+import serializers
+from chat_store import chat_id_for, legacy_chat_id_for, read_chat_dir
+from like_store import LikeStore, read_like_log
+from search import MIN_PREFIX, search_result, tokenize
+from settings import get_setting
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    password TEXT,
+    role TEXT,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS students (
+    email TEXT PRIMARY KEY,
+    name TEXT,
+    year TEXT,
+    major TEXT,
+    password TEXT,
+    security_question TEXT,
+    security_answer TEXT,
+    role TEXT,
+    joined_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS announcements (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE,
+    title TEXT,
+    message TEXT,
+    category TEXT,
+    priority TEXT,
+    author TEXT,
+    created_date TEXT,
+    expiry_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS clubs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE,
+    name TEXT,
+    category TEXT,
+    description TEXT,
+    meeting_schedule TEXT,
+    location TEXT,
+    created_date TEXT
+);
+
+-- role is 'member', 'pending' or 'admin'
+CREATE TABLE IF NOT EXISTS club_members (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    club_id TEXT REFERENCES clubs(id) ON DELETE CASCADE,
+    email TEXT,
+    role TEXT,
+    UNIQUE (club_id, role, email)
+);
+CREATE INDEX IF NOT EXISTS idx_club_members_email ON club_members(email, role);
+
+CREATE TABLE IF NOT EXISTS club_requests (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE,
+    student_email TEXT,
+    club_id TEXT,
+    status TEXT,
+    request_date TEXT,
+    processed_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_club_requests_status ON club_requests(status);
+CREATE INDEX IF NOT EXISTS idx_club_requests_club ON club_requests(club_id, status);
+CREATE INDEX IF NOT EXISTS idx_club_requests_email ON club_requests(student_email);
+
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    created_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS chat_participants (
+    chat_id TEXT REFERENCES chats(id) ON DELETE CASCADE,
+    position INTEGER,
+    email TEXT,
+    PRIMARY KEY (chat_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_chat_participants_email ON chat_participants(email);
+
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE,
+    chat_id TEXT REFERENCES chats(id) ON DELETE CASCADE,
+    sender TEXT,
+    message TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages(chat_id, seq);
+
+CREATE TABLE IF NOT EXISTS calls (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE,
+    type TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    status TEXT,
+    initiator TEXT
+);
+
+CREATE TABLE IF NOT EXISTS call_participants (
+    call_id TEXT REFERENCES calls(id) ON DELETE CASCADE,
+    position INTEGER,
+    email TEXT,
+    PRIMARY KEY (call_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_call_participants_email ON call_participants(email);
+
+CREATE TABLE IF NOT EXISTS confessions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE,
+    text TEXT,
+    category TEXT,
+    user_email TEXT,
+    anonymous_id TEXT,
+    created_date TEXT,
+    is_approved INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_confessions_approved ON confessions(is_approved);
+CREATE INDEX IF NOT EXISTS idx_confessions_feed ON confessions(is_approved, created_date, id);
+
+CREATE TABLE IF NOT EXISTS confession_likes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    confession_id TEXT REFERENCES confessions(id) ON DELETE CASCADE,
+    anonymous_id TEXT,
+    user_email TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_confession_likes_confession ON confession_likes(confession_id);
+
+CREATE TABLE IF NOT EXISTS confession_comments (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    confession_id TEXT REFERENCES confessions(id) ON DELETE CASCADE,
+    text TEXT,
+    anonymous_id TEXT,
+    user_email TEXT,
+    created_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_confession_comments_confession ON confession_comments(confession_id);
+"""
+
+# Schema changes applied in order on top of SCHEMA; PRAGMA user_version records progress
+# Inbox rows for two-person chats that have none yet, with their latest message
+INBOX_BACKFILL = [
+    """
+    INSERT OR IGNORE INTO inbox (email, chat_id, peer, created_date)
+    SELECT me.email, me.chat_id, peer.email, chats.created_date
+    FROM chat_participants me
+    JOIN chat_participants peer ON peer.chat_id = me.chat_id AND peer.position != me.position
+    JOIN chats ON chats.id = me.chat_id
+    WHERE (SELECT COUNT(*) FROM chat_participants WHERE chat_id = me.chat_id) = 2
+    """,
+    """
+    UPDATE inbox SET (last_message, last_sender, last_timestamp) = (
+        SELECT substr(message, 1, 80), sender, timestamp FROM messages
+        WHERE messages.chat_id = inbox.chat_id ORDER BY seq DESC LIMIT 1
+    ) WHERE last_timestamp IS NULL
+    """
+]
+
+# Search documents for existing announcements, clubs and approved confessions. Rowids
+# are seq * 4 + kind so triggers can find a document without an index on doc_id.
+SEARCH_BACKFILL = [
+    """
+    INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+    SELECT seq * 4 + 1, 'announcement', id, title, message, created_date FROM announcements
+    """,
+    """
+    INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+    SELECT seq * 4 + 2, 'club', id, name, trim(coalesce(description, '') || ' ' || coalesce(category, '')),
+           created_date FROM clubs
+    """,
+    """
+    INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+    SELECT seq * 4 + 3, 'confession', id, category, text, created_date FROM confessions WHERE is_approved
+    """
+]
+
+# Directory entries for existing students, keyed by the students rowid
+DIRECTORY_BACKFILL = [
+    """
+    INSERT INTO student_directory (rowid, email, name, major)
+    SELECT rowid, email, name, major FROM students
+    """
+]
+
+# Feed order of announcements; the same expression is indexed by migration 7
+PRIORITY_WEIGHT = "(CASE priority WHEN 'high' THEN 2 WHEN 'low' THEN 0 ELSE 1 END)"
+
+MIGRATIONS = [
+    # 1: one like per student per confession, with a maintained counter
+    """
+    DELETE FROM confession_likes WHERE seq NOT IN (
+        SELECT MIN(seq) FROM confession_likes GROUP BY confession_id, user_email
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_confession_likes_unique ON confession_likes(confession_id, user_email);
+    ALTER TABLE confessions ADD COLUMN likes_count INTEGER NOT NULL DEFAULT 0;
+    UPDATE confessions SET likes_count = (
+        SELECT COUNT(*) FROM confession_likes WHERE confession_id = confessions.id
+    );
+    """,
+    # 2: dashboard counters maintained by every write
+    """
+    CREATE TABLE IF NOT EXISTS stats (
+        name TEXT PRIMARY KEY,
+        value
+    );
+    """,
+    # 3: per-user inbox with last message and unread count
+    """
+    CREATE TABLE IF NOT EXISTS inbox (
+        email TEXT,
+        chat_id TEXT REFERENCES chats(id) ON DELETE CASCADE,
+        peer TEXT,
+        created_date TEXT,
+        last_message TEXT,
+        last_sender TEXT,
+        last_timestamp TEXT,
+        unread INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (email, chat_id)
+    );
+    """ + ";".join(INBOX_BACKFILL) + ";",
+    # 4: full-text search over announcements, clubs and approved confessions, kept by triggers
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        kind UNINDEXED, doc_id UNINDEXED, title, body, date UNINDEXED
+    );
+    CREATE TRIGGER IF NOT EXISTS search_announcement_insert AFTER INSERT ON announcements BEGIN
+        INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+        VALUES (new.seq * 4 + 1, 'announcement', new.id, new.title, new.message, new.created_date);
+    END;
+    CREATE TRIGGER IF NOT EXISTS search_announcement_delete AFTER DELETE ON announcements BEGIN
+        DELETE FROM search_index WHERE rowid = old.seq * 4 + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS search_club_insert AFTER INSERT ON clubs BEGIN
+        INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+        VALUES (new.seq * 4 + 2, 'club', new.id, new.name,
+                trim(coalesce(new.description, '') || ' ' || coalesce(new.category, '')), new.created_date);
+    END;
+    CREATE TRIGGER IF NOT EXISTS search_club_update AFTER UPDATE OF name, description, category ON clubs BEGIN
+        DELETE FROM search_index WHERE rowid = old.seq * 4 + 2;
+        INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+        VALUES (new.seq * 4 + 2, 'club', new.id, new.name,
+                trim(coalesce(new.description, '') || ' ' || coalesce(new.category, '')), new.created_date);
+    END;
+    CREATE TRIGGER IF NOT EXISTS search_club_delete AFTER DELETE ON clubs BEGIN
+        DELETE FROM search_index WHERE rowid = old.seq * 4 + 2;
+    END;
+    CREATE TRIGGER IF NOT EXISTS search_confession_insert AFTER INSERT ON confessions WHEN new.is_approved BEGIN
+        INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+        VALUES (new.seq * 4 + 3, 'confession', new.id, new.category, new.text, new.created_date);
+    END;
+    CREATE TRIGGER IF NOT EXISTS search_confession_update
+    AFTER UPDATE OF is_approved, text, category ON confessions BEGIN
+        DELETE FROM search_index WHERE rowid = old.seq * 4 + 3;
+        INSERT INTO search_index (rowid, kind, doc_id, title, body, date)
+        SELECT new.seq * 4 + 3, 'confession', new.id, new.category, new.text, new.created_date
+        WHERE new.is_approved;
+    END;
+    CREATE TRIGGER IF NOT EXISTS search_confession_delete AFTER DELETE ON confessions BEGIN
+        DELETE FROM search_index WHERE rowid = old.seq * 4 + 3;
+    END;
+    """ + ";".join(SEARCH_BACKFILL) + ";",
+    # 5: prefix-indexed student directory for the typeahead pickers, kept by triggers
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS student_directory USING fts5(
+        email, name, major, prefix='1 2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS directory_student_insert AFTER INSERT ON students BEGIN
+        INSERT INTO student_directory (rowid, email, name, major) VALUES (new.rowid, new.email, new.name, new.major);
+    END;
+    CREATE TRIGGER IF NOT EXISTS directory_student_update AFTER UPDATE OF email, name, major ON students BEGIN
+        DELETE FROM student_directory WHERE rowid = old.rowid;
+        INSERT INTO student_directory (rowid, email, name, major) VALUES (new.rowid, new.email, new.name, new.major);
+    END;
+    CREATE TRIGGER IF NOT EXISTS directory_student_delete AFTER DELETE ON students BEGIN
+        DELETE FROM student_directory WHERE rowid = old.rowid;
+    END;
+    """ + ";".join(DIRECTORY_BACKFILL) + ";",
+    # 6: call heartbeats for the stale-call reaper, and an archive for old calls
+    """
+    ALTER TABLE calls ADD COLUMN last_heartbeat TEXT;
+    CREATE INDEX IF NOT EXISTS idx_calls_active ON calls(start_time) WHERE status = 'active';
+    CREATE TABLE IF NOT EXISTS call_archive (
+        id TEXT PRIMARY KEY,
+        type TEXT,
+        start_time TEXT,
+        end_time TEXT,
+        status TEXT,
+        initiator TEXT,
+        participants TEXT
+    );
+    """,
+    # 7: live-announcement feed order and expiry lookups, and an archive for expired ones
+    f"""
+    CREATE INDEX IF NOT EXISTS idx_announcements_feed ON announcements({PRIORITY_WEIGHT}, created_date);
+    CREATE INDEX IF NOT EXISTS idx_announcements_expiry ON announcements(expiry_date) WHERE expiry_date IS NOT NULL;
+    CREATE TABLE IF NOT EXISTS announcement_archive (
+        id TEXT PRIMARY KEY,
+        title TEXT,
+        message TEXT,
+        category TEXT,
+        priority TEXT,
+        author TEXT,
+        created_date TEXT,
+        expiry_date TEXT
+    );
+    """,
+    # 8: archive for processed club requests
+    """
+    CREATE TABLE IF NOT EXISTS club_request_archive (
+        id TEXT PRIMARY KEY,
+        student_email TEXT,
+        club_id TEXT,
+        status TEXT,
+        request_date TEXT,
+        processed_date TEXT
+    );
+    """,
+]
+
+# Tables a traced statement writes or reads; anything else (PRAGMA, BEGIN, DDL) is not counted
+_WRITE_STATEMENT = re.compile(r"\s*(?:INSERT|REPLACE|UPDATE|DELETE)\b(?:\s+OR\s+\w+)?(?:\s+INTO|\s+FROM)?\s+(\w+)",
+                              re.IGNORECASE)
+_READ_STATEMENT = re.compile(r"\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
+# Traced SQL has its parameters filled in; a message saying "from home" is not a table
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+def _trace_statement(sql):
+    """Count each executed statement as a read or write of every table it names,
+    for the Performance page"""
+    match = _WRITE_STATEMENT.match(sql)
+    if match:
+        instrumentation.record_write(match.group(1), 0)
+        # Tables an INSERT ... SELECT or a subquery reads from
+        sql = sql[match.end():]
+    elif not _READ_STATEMENT.match(sql):
+        return
+    for table in set(_READ_TABLES.findall(_STRING_LITERAL.sub("''", sql))):
+        instrumentation.record_read(table, 0)
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+def get_connection():
+    """Per-thread connection to the campus database"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        path = get_setting("storage", "sqlite_path", "data/campus.db")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        if instrumentation.ENABLED:
+            conn.set_trace_callback(_trace_statement)
+        _local.conn = conn
+        init_schema(conn)
+    return conn
+
+def init_schema(conn):
+    """Create tables once per process and seed an empty database from the JSON files"""
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        conn.executescript(SCHEMA)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.executescript(f"BEGIN; {migration} PRAGMA user_version = {number}; COMMIT;")
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            import_json_data(get_setting("storage", "data_dir", "data"), conn, defaults=True)
+        _initialized = True
+
+def _placeholders(values):
+    return ", ".join("?" for _ in values)
+
+# Rows fetched per step by the iter_* readers; also bounds their IN (...) lookups
+STREAM_BATCH = 500
+
+def _stream(cursor, build):
+    """Records built from a query's rows a batch at a time, so only one batch is in memory"""
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH)
+        if not rows:
+            return
+        yield from build(rows)
+
+# User Management Functions
+def _student_from_row(row):
+    return dict(row)
+
+def get_user_by_email(email):
+    conn = get_connection()
+    row = conn.execute("SELECT password, role, name FROM users WHERE email = ?", (email,)).fetchone()
+    if row:
+        return dict(row)
+    row = conn.execute("SELECT * FROM students WHERE email = ?", (email,)).fetchone()
+    return _student_from_row(row) if row else None
+
+def get_students():
+    rows = get_connection().execute("SELECT * FROM students ORDER BY rowid")
+    return {row["email"]: _student_from_row(row) for row in rows}
+
+def create_student(student_data):
+    conn = get_connection()
+    columns = ["email", "name", "year", "major", "password", "security_question",
+               "security_answer", "role", "joined_date"]
+    with conn:
+        is_new = conn.execute("SELECT 1 FROM students WHERE email = ?", (student_data['email'],)).fetchone() is None
+        # An upsert keeps the rowid, which the directory triggers key on
+        conn.execute(
+            f"INSERT INTO students ({', '.join(columns)}) VALUES ({_placeholders(columns)}) "
+            f"ON CONFLICT(email) DO UPDATE SET "
+            f"{', '.join(f'{column} = excluded.{column}' for column in columns[1:])}",
+            [student_data.get(column) for column in columns]
+        )
+        if is_new:
+            _bump_stats(conn, students=1)
+    return True
+
+def update_student_password(email, hashed_password):
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("UPDATE students SET password = ? WHERE email = ?", (hashed_password, email))
+    return cursor.rowcount > 0
+
+def resolve_names(emails):
+    """Map emails to display names; unknown emails map to themselves"""
+    conn = get_connection()
+    emails = list(dict.fromkeys(emails))
+    resolved = {email: email for email in emails}
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(emails), 500):
+        chunk = emails[start:start + 500]
+        for table in ("users", "students"):
+            for row in conn.execute(
+                f"SELECT email, name FROM {table} WHERE email IN ({_placeholders(chunk)})", chunk
+            ):
+                resolved[row["email"]] = row["name"] or row["email"]
+    return resolved
+
+def find_students(query, limit=10, exclude=()):
+    """Students whose name, email or major words start with every word of the query,
+    best matches first"""
+    words = tokenize(query, stopwords=())
+    if not words:
+        return []
+    exclude = list(exclude)
+    match = " ".join(f'"{word}"*' for word in words)
+    rows = get_connection().execute(
+        "SELECT students.email, students.name, students.major, students.year "
+        "FROM student_directory JOIN students ON students.rowid = student_directory.rowid "
+        f"WHERE student_directory MATCH ? AND students.email NOT IN ({_placeholders(exclude)}) "
+        "ORDER BY bm25(student_directory, 1.0, 2.0, 0.5) LIMIT ?",
+        [match, *exclude, limit]
+    )
+    return [dict(row) for row in rows]
+
+# Announcement Functions
+ANNOUNCEMENT_COLUMNS = ["id", "title", "message", "category", "priority", "author",
+                        "created_date", "expiry_date"]
+# The JSON backend's monthly archive files, imported into announcement_archive
+ANNOUNCEMENT_ARCHIVE_DIR = "announcement_archive"
+
+def create_announcement(announcement_data):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            f"INSERT INTO announcements ({', '.join(ANNOUNCEMENT_COLUMNS)}) "
+            f"VALUES ({_placeholders(ANNOUNCEMENT_COLUMNS)})",
+            [announcement_data.get(column) for column in ANNOUNCEMENT_COLUMNS]
+        )
+        _bump_stats(conn, announcements=1)
+    return True
+
+def get_announcements(limit=None):
+    """Live announcements, highest priority first and newest first within a priority"""
+    conn = get_connection()
+    now = datetime.now().isoformat()
+    if conn.execute("SELECT 1 FROM announcements WHERE expiry_date IS NOT NULL AND expiry_date <= ? LIMIT 1",
+                    (now,)).fetchone():
+        archive_expired_announcements()
+    rows = conn.execute(
+        f"SELECT {', '.join(ANNOUNCEMENT_COLUMNS)} FROM announcements "
+        f"ORDER BY {PRIORITY_WEIGHT} DESC, created_date DESC LIMIT ?",
+        (-1 if limit is None else limit,)
+    )
+    return [dict(row) for row in rows]
+
+def archive_expired_announcements():
+    """Move announcements past their expiry_date to announcement_archive; returns how many were moved"""
+    conn = get_connection()
+    now = datetime.now().isoformat()
+    with conn:
+        conn.execute(
+            f"INSERT OR IGNORE INTO announcement_archive ({', '.join(ANNOUNCEMENT_COLUMNS)}) "
+            f"SELECT {', '.join(ANNOUNCEMENT_COLUMNS)} FROM announcements "
+            "WHERE expiry_date IS NOT NULL AND expiry_date <= ?",
+            (now,)
+        )
+        # The search trigger drops their search documents
+        cursor = conn.execute("DELETE FROM announcements WHERE expiry_date IS NOT NULL AND expiry_date <= ?", (now,))
+        if cursor.rowcount:
+            _bump_stats(conn, announcements=-cursor.rowcount)
+    return cursor.rowcount
+
+# Club Functions
+def _load_clubs(conn, club_ids=None):
+    """Club dicts with their member, pending and admin lists; all clubs if club_ids is None"""
+    where, params = "", []
+    if club_ids is not None:
+        if not club_ids:
+            return {}
+        where, params = f" WHERE id IN ({_placeholders(club_ids)})", list(club_ids)
+    clubs = {}
+    for row in conn.execute(f"SELECT * FROM clubs{where} ORDER BY seq", params):
+        club = dict(row)
+        del club["seq"]
+        club.update(members=[], pending_requests=[], admins=[])
+        clubs[club["id"]] = club
+    lists = {"member": "members", "pending": "pending_requests", "admin": "admins"}
+    member_where = where.replace("id IN", "club_id IN")
+    for row in conn.execute(f"SELECT club_id, email, role FROM club_members{member_where} ORDER BY seq", params):
+        if row["club_id"] in clubs:
+            clubs[row["club_id"]][lists[row["role"]]].append(row["email"])
+    return clubs
+
+def get_clubs():
+    return _load_clubs(get_connection())
+
+CLUB_FIELDS = ("name", "category", "description", "meeting_schedule", "location")
+
+def update_club(club_id, updates):
+    """Edit a club's details; members and requests are not touched"""
+    fields = [field for field in CLUB_FIELDS if field in updates]
+    conn = get_connection()
+    with conn:
+        if not _club_exists(conn, club_id):
+            return False
+        if fields:
+            conn.execute(
+                f"UPDATE clubs SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                [updates[field] for field in fields] + [club_id]
+            )
+    return True
+
+def get_clubs_for_user(email, pending=False):
+    """Clubs the user belongs to (or has a pending request for)"""
+    conn = get_connection()
+    club_ids = [row["club_id"] for row in conn.execute(
+        "SELECT club_id FROM club_members WHERE email = ? AND role = ? ORDER BY seq",
+        (email, "pending" if pending else "member")
+    )]
+    return list(_load_clubs(conn, club_ids).values())
+
+def count_clubs_for_user(email):
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM club_members WHERE email = ? AND role = 'member'", (email,)
+    ).fetchone()[0]
+
+def _club_exists(conn, club_id):
+    return conn.execute("SELECT 1 FROM clubs WHERE id = ?", (club_id,)).fetchone() is not None
+
+def join_club_request(student_email, club_id):
+    conn = get_connection()
+    with conn:
+        if not _club_exists(conn, club_id):
+            return False
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO club_members (club_id, email, role) VALUES (?, ?, 'pending')",
+            (club_id, student_email)
+        )
+        if cursor.rowcount == 0:
+            return False
+        conn.execute(
+            "INSERT INTO club_requests (id, student_email, club_id, status, request_date) "
+            "VALUES (?, ?, ?, 'pending', ?)",
+            (str(uuid.uuid4()), student_email, club_id, datetime.now().isoformat())
+        )
+        _bump_stats(conn, pending_club_requests=1)
+    return True
+
+CLUB_REQUEST_COLUMNS = ["id", "student_email", "club_id", "status", "request_date", "processed_date"]
+# The JSON backend's monthly archive files, imported into club_request_archive
+CLUB_REQUEST_ARCHIVE_DIR = "club_request_archive"
+
+def _club_request_from_row(row):
+    request = dict(row)
+    if request["processed_date"] is None:
+        del request["processed_date"]
+    return request
+
+def get_club_requests(status=None, club_id=None, limit=None):
+    """Requests not yet archived, oldest first, optionally only those with a status
+    and/or for one club"""
+    conditions, params = [], []
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if club_id is not None:
+        conditions.append("club_id = ?")
+        params.append(club_id)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = get_connection().execute(
+        f"SELECT {', '.join(CLUB_REQUEST_COLUMNS)} FROM club_requests{where} ORDER BY seq LIMIT ?",
+        params + [-1 if limit is None else limit]
+    )
+    return [_club_request_from_row(row) for row in rows]
+
+def iter_club_requests(status=None, club_id=None):
+    """Like get_club_requests, but streamed one request at a time"""
+    conditions, params = [], []
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    if club_id is not None:
+        conditions.append("club_id = ?")
+        params.append(club_id)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor = get_connection().execute(
+        f"SELECT {', '.join(CLUB_REQUEST_COLUMNS)} FROM club_requests{where} ORDER BY seq", params
+    )
+    for row in cursor:
+        yield _club_request_from_row(row)
+
+def get_club_request(request_id):
+    row = get_connection().execute(
+        f"SELECT {', '.join(CLUB_REQUEST_COLUMNS)} FROM club_requests WHERE id = ?", (request_id,)
+    ).fetchone()
+    return _club_request_from_row(row) if row else None
+
+def approve_club_request(request_id, club_id, student_email):
+    conn = get_connection()
+    with conn:
+        if not _club_exists(conn, club_id):
+            return False
+        conn.execute(
+            "DELETE FROM club_members WHERE club_id = ? AND email = ? AND role = 'pending'",
+            (club_id, student_email)
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO club_members (club_id, email, role) VALUES (?, ?, 'member')",
+            (club_id, student_email)
+        )
+        row = conn.execute("SELECT status FROM club_requests WHERE id = ?", (request_id,)).fetchone()
+        if row and row["status"] == "pending":
+            _bump_stats(conn, pending_club_requests=-1)
+        conn.execute(
+            "UPDATE club_requests SET status = 'approved', processed_date = ? WHERE id = ?",
+            (datetime.now().isoformat(), request_id)
+        )
+    return True
+
+def reject_club_request(request_id):
+    """Turn down a pending join request; False if it is unknown or already processed"""
+    conn = get_connection()
+    with conn:
+        row = conn.execute("SELECT club_id, student_email FROM club_requests WHERE id = ? AND status = 'pending'",
+                           (request_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute(
+            "DELETE FROM club_members WHERE club_id = ? AND email = ? AND role = 'pending'",
+            (row["club_id"], row["student_email"])
+        )
+        conn.execute(
+            "UPDATE club_requests SET status = 'rejected', processed_date = ? WHERE id = ?",
+            (datetime.now().isoformat(), request_id)
+        )
+        _bump_stats(conn, pending_club_requests=-1)
+    return True
+
+def archive_club_requests(older_than_days=None):
+    """Move approved and rejected requests processed more than older_than_days ago
+    into club_request_archive; returns how many were moved"""
+    if older_than_days is None:
+        older_than_days = get_setting("clubs", "archive_after_days", 7)
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    columns = ', '.join(CLUB_REQUEST_COLUMNS)
+    conn = get_connection()
+    with conn:
+        where = "status != 'pending' AND processed_date < ?"
+        conn.execute(f"INSERT OR IGNORE INTO club_request_archive ({columns}) "
+                     f"SELECT {columns} FROM club_requests WHERE {where}", (cutoff,))
+        cursor = conn.execute(f"DELETE FROM club_requests WHERE {where}", (cutoff,))
+    return cursor.rowcount
+
+# Chat Functions
+def _insert_chat(conn, chat_id, participants, created_date):
+    cursor = conn.execute("INSERT OR IGNORE INTO chats (id, created_date) VALUES (?, ?)",
+                          (chat_id, created_date))
+    if cursor.rowcount:
+        conn.executemany(
+            "INSERT INTO chat_participants (chat_id, position, email) VALUES (?, ?, ?)",
+            [(chat_id, position, email) for position, email in enumerate(participants)]
+        )
+        if len(participants) == 2:
+            conn.executemany(
+                "INSERT OR IGNORE INTO inbox (email, chat_id, peer, created_date) VALUES (?, ?, ?, ?)",
+                [(participants[0], chat_id, participants[1], created_date),
+                 (participants[1], chat_id, participants[0], created_date)]
+            )
+
+def create_chat(user1, user2):
+    chat_id = chat_id_for(user1, user2)
+    conn = get_connection()
+    # Chats used to be keyed in the order they were started; keep using such a chat
+    legacy_id = legacy_chat_id_for(user1, user2)
+    if conn.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone() is None and \
+            conn.execute("SELECT 1 FROM chats WHERE id = ?", (legacy_id,)).fetchone() is not None:
+        return legacy_id
+    with conn:
+        _insert_chat(conn, chat_id, [user1, user2], datetime.now().isoformat())
+    return chat_id
+
+def send_message(chat_id, sender, message):
+    conn = get_connection()
+    with conn:
+        if conn.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone() is None:
+            return False
+        timestamp = datetime.now().isoformat()
+        conn.execute(
+            "INSERT INTO messages (id, chat_id, sender, message, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), chat_id, sender, message, timestamp)
+        )
+        # Replying implies the sender has read the conversation
+        conn.execute(
+            "UPDATE inbox SET last_message = ?, last_sender = ?, last_timestamp = ?, "
+            "unread = CASE WHEN email = ? THEN 0 ELSE unread + 1 END WHERE chat_id = ?",
+            (message[:80], sender, timestamp, sender, chat_id)
+        )
+        _bump_stats(conn, messages_today=1)
+    return True
+
+def get_chat_messages(chat_id, before=None, limit=50):
+    """The latest `limit` messages of a chat, or those preceding message id `before`"""
+    conn = get_connection()
+    query = "SELECT id, sender, message, timestamp FROM messages WHERE chat_id = ?"
+    params = [chat_id]
+    if before is not None:
+        query += " AND seq < (SELECT seq FROM messages WHERE id = ?)"
+        params.append(before)
+    query += " ORDER BY seq DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    rows = conn.execute(query, params).fetchall()
+    return [dict(row) for row in reversed(rows)]
+
+def get_messages_since(chat_id, last_id, limit=50):
+    """Messages sent after message id `last_id`, oldest first"""
+    conn = get_connection()
+    row = conn.execute("SELECT seq FROM messages WHERE id = ? AND chat_id = ?", (last_id, chat_id)).fetchone()
+    if row is None:
+        return get_chat_messages(chat_id, limit=limit)
+    rows = conn.execute(
+        "SELECT id, sender, message, timestamp FROM messages WHERE chat_id = ? AND seq > ? ORDER BY seq",
+        (chat_id, row["seq"])
+    )
+    return [dict(row) for row in rows]
+
+def get_inbox(email):
+    """The user's conversations, most recent first: chat_id, peer, last_message,
+    last_sender, last_timestamp and unread"""
+    rows = get_connection().execute(
+        "SELECT chat_id, peer, created_date, last_message, last_sender, last_timestamp, unread "
+        "FROM inbox WHERE email = ? ORDER BY COALESCE(last_timestamp, created_date, '') DESC",
+        (email,)
+    )
+    return [dict(row) for row in rows]
+
+def mark_chat_read(chat_id, email):
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("UPDATE inbox SET unread = 0 WHERE email = ? AND chat_id = ? AND unread > 0",
+                              (email, chat_id))
+    return cursor.rowcount > 0
+
+def get_chat_version(chat_id):
+    """Cheap value that changes whenever a message is sent to the chat"""
+    row = get_connection().execute("SELECT MAX(seq) FROM messages WHERE chat_id = ?", (chat_id,)).fetchone()
+    return row[0] or 0
+
+def roll_chat_segments(hot_months=None):
+    """Nothing to roll: messages are read through the (chat_id, seq) index, so a
+    chat's cost does not grow with history. Segments rolled by the JSON backend
+    are imported by import_json_data along with the logs."""
+    return 0
+
+# Call Functions
+def _insert_call(conn, call_data):
+    conn.execute(
+        "INSERT OR IGNORE INTO calls (id, type, start_time, end_time, status, initiator) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (call_data.get("id"), call_data.get("type"), call_data.get("start_time"),
+         call_data.get("end_time"), call_data.get("status"), call_data.get("initiator"))
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO call_participants (call_id, position, email) VALUES (?, ?, ?)",
+        [(call_data.get("id"), position, email)
+         for position, email in enumerate(call_data.get("participants", []))]
+    )
+
+def _calls_from_rows(conn, rows):
+    calls = []
+    for row in rows:
+        call = dict(row)
+        del call["seq"]
+        del call["last_heartbeat"]
+        if call["end_time"] is None:
+            del call["end_time"]
+        calls.append(call)
+    if calls:
+        ids = [call["id"] for call in calls]
+        participants = {call_id: [] for call_id in ids}
+        for row in conn.execute(
+            f"SELECT call_id, email FROM call_participants WHERE call_id IN ({_placeholders(ids)}) "
+            "ORDER BY call_id, position", ids
+        ):
+            participants[row["call_id"]].append(row["email"])
+        for call in calls:
+            call["participants"] = participants[call["id"]]
+    return calls
+
+# The JSON backend's monthly archive files, imported into call_archive
+CALL_ARCHIVE_DIR = "call_archive"
+
+def create_call(call_data):
+    conn = get_connection()
+    with conn:
+        _insert_call(conn, call_data)
+    return True
+
+def get_calls():
+    conn = get_connection()
+    return _calls_from_rows(conn, conn.execute("SELECT * FROM calls ORDER BY seq").fetchall())
+
+def get_call(call_id):
+    conn = get_connection()
+    calls = _calls_from_rows(conn, conn.execute("SELECT * FROM calls WHERE id = ?", (call_id,)).fetchall())
+    return calls[0] if calls else None
+
+def get_user_calls(user_email, limit=None):
+    """The user's calls, oldest first; with a limit, only the most recent ones"""
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT calls.* FROM calls JOIN call_participants ON call_participants.call_id = calls.id "
+        "WHERE call_participants.email = ? ORDER BY calls.seq DESC LIMIT ?",
+        (user_email, -1 if limit is None else limit)
+    ).fetchall()
+    return _calls_from_rows(conn, rows[::-1])
+
+def iter_calls(user=None):
+    """Calls oldest first, streamed one at a time; only the user's if `user` is given"""
+    conn = get_connection()
+    if user is None:
+        cursor = conn.execute("SELECT * FROM calls ORDER BY seq")
+    else:
+        cursor = conn.execute(
+            "SELECT calls.* FROM calls JOIN call_participants ON call_participants.call_id = calls.id "
+            "WHERE call_participants.email = ? ORDER BY calls.seq", (user,)
+        )
+    yield from _stream(cursor, lambda rows: _calls_from_rows(conn, rows))
+
+def update_call_status(call_id, status):
+    conn = get_connection()
+    with conn:
+        if status == 'ended':
+            cursor = conn.execute("UPDATE calls SET status = ?, end_time = ? WHERE id = ?",
+                                  (status, datetime.now().isoformat(), call_id))
+        else:
+            cursor = conn.execute("UPDATE calls SET status = ? WHERE id = ?", (status, call_id))
+    return cursor.rowcount > 0
+
+def heartbeat_call(call_id):
+    """Record that a participant still has the call open; False once it is no longer active"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("UPDATE calls SET last_heartbeat = ? WHERE id = ? AND status = 'active'",
+                              (datetime.now().isoformat(), call_id))
+    return cursor.rowcount > 0
+
+def reap_stale_calls(timeout_seconds=None):
+    """End active calls without a heartbeat for timeout_seconds as 'timed_out'"""
+    if timeout_seconds is None:
+        timeout_seconds = get_setting("calls", "timeout_seconds", 60)
+    cutoff = (datetime.now() - timedelta(seconds=timeout_seconds)).isoformat()
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "UPDATE calls SET status = 'timed_out', end_time = COALESCE(last_heartbeat, start_time) "
+            "WHERE status = 'active' AND COALESCE(last_heartbeat, start_time) < ?",
+            (cutoff,)
+        )
+    return cursor.rowcount
+
+def archive_calls(older_than_days=None):
+    """Move finished calls started more than older_than_days ago into call_archive;
+    returns how many were moved"""
+    if older_than_days is None:
+        older_than_days = get_setting("calls", "archive_after_days", 30)
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    conn = get_connection()
+    with conn:
+        calls = _calls_from_rows(conn, conn.execute(
+            "SELECT * FROM calls WHERE status != 'active' AND start_time < ?", (cutoff,)
+        ).fetchall())
+        _archive_calls(conn, calls)
+        conn.executemany("DELETE FROM calls WHERE id = ?", [(call["id"],) for call in calls])
+    return len(calls)
+
+def _archive_calls(conn, calls):
+    conn.executemany(
+        "INSERT OR IGNORE INTO call_archive (id, type, start_time, end_time, status, initiator, participants) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(call.get("id"), call.get("type"), call.get("start_time"), call.get("end_time"), call.get("status"),
+          call.get("initiator"), json.dumps(call.get("participants", []))) for call in calls]
+    )
+
+# Confession Functions
+def _insert_confession(conn, confession):
+    conn.execute(
+        "INSERT OR IGNORE INTO confessions "
+        "(id, text, category, user_email, anonymous_id, created_date, is_approved) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (confession.get("id"), confession.get("text"), confession.get("category"),
+         confession.get("user_email"), confession.get("anonymous_id"),
+         confession.get("created_date"), int(bool(confession.get("is_approved"))))
+    )
+
+def _insert_comment(conn, confession_id, comment):
+    conn.execute(
+        "INSERT INTO confession_comments "
+        "(id, confession_id, text, anonymous_id, user_email, created_date) VALUES (?, ?, ?, ?, ?, ?)",
+        (comment.get("id"), confession_id, comment.get("text"), comment.get("anonymous_id"),
+         comment.get("user_email"), comment.get("created_date"))
+    )
+
+def _confession_exists(conn, confession_id):
+    return conn.execute("SELECT 1 FROM confessions WHERE id = ?", (confession_id,)).fetchone() is not None
+
+def _load_confessions(conn, where="", params=(), order="seq", limit=None):
+    """Full confession dicts with comments; every confession unless `where` narrows them"""
+    query = f"SELECT * FROM confessions{where} ORDER BY {order}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params = list(params) + [limit]
+    confessions = []
+    by_id = {}
+    for row in conn.execute(query, params):
+        confession = dict(row)
+        del confession["seq"]
+        confession["is_approved"] = bool(confession["is_approved"])
+        confession["comments"] = []
+        confessions.append(confession)
+        by_id[confession["id"]] = confession
+    comments_query = "SELECT confession_id, id, text, created_date, anonymous_id, user_email FROM confession_comments"
+    comment_params = []
+    if where:
+        if not by_id:
+            return confessions
+        comment_params = list(by_id)
+        comments_query += f" WHERE confession_id IN ({_placeholders(comment_params)})"
+    for row in conn.execute(comments_query + " ORDER BY seq", comment_params):
+        if row["confession_id"] in by_id:
+            comment = dict(row)
+            del comment["confession_id"]
+            by_id[row["confession_id"]]["comments"].append(comment)
+    return confessions
+
+def _confessions_from_rows(conn, rows):
+    """Confession dicts with their comments for one batch of confession rows"""
+    confessions = []
+    for row in rows:
+        confession = dict(row)
+        del confession["seq"]
+        confession["is_approved"] = bool(confession["is_approved"])
+        confession["comments"] = []
+        confessions.append(confession)
+    if confessions:
+        by_id = {confession["id"]: confession for confession in confessions}
+        ids = list(by_id)
+        for row in conn.execute(
+            "SELECT confession_id, id, text, created_date, anonymous_id, user_email FROM confession_comments "
+            f"WHERE confession_id IN ({_placeholders(ids)}) ORDER BY seq", ids
+        ):
+            comment = dict(row)
+            del comment["confession_id"]
+            by_id[row["confession_id"]]["comments"].append(comment)
+    return confessions
+
+def create_confession(confession_data):
+    confession_data['anonymous_id'] = f"anon_{str(uuid.uuid4())[:8]}"
+    conn = get_connection()
+    with conn:
+        _insert_confession(conn, confession_data)
+        if confession_data.get('is_approved', False):
+            _bump_stats(conn, approved_confessions=1)
+        else:
+            _bump_stats(conn, pending_confessions=1)
+    return True
+
+def _student_feed(conn, where, params, order, limit=None):
+    """Sanitized approved confessions with anonymous comments, shaped like the JSON feed"""
+    query = (
+        "SELECT id, text, category, anonymous_id, created_date, is_approved "
+        f"FROM confessions WHERE is_approved = 1{where} ORDER BY {order}"
+    )
+    if limit is not None:
+        query += " LIMIT ?"
+        params = list(params) + [limit]
+    confessions = []
+    by_id = {}
+    for row in conn.execute(query, params):
+        confession = dict(row)
+        confession["is_approved"] = True
+        confession["comments"] = []
+        confessions.append(confession)
+        by_id[confession["id"]] = confession
+    if by_id:
+        ids = list(by_id)
+        for row in conn.execute(
+            "SELECT confession_id, id, text, created_date, anonymous_id FROM confession_comments "
+            f"WHERE confession_id IN ({_placeholders(ids)}) ORDER BY seq", ids
+        ):
+            comment = dict(row)
+            del comment["confession_id"]
+            by_id[row["confession_id"]]["comments"].append(comment)
+    return confessions
+
+def get_confessions_for_students():
+    """All approved confessions as students see them, oldest first"""
+    return _student_feed(get_connection(), "", [], "created_date, id")
+
+def get_confession_feed(cursor=None, limit=20):
+    """One page of the student feed, newest first, and the cursor for the next page"""
+    where, params = "", []
+    if cursor:
+        created_date, _, confession_id = cursor.partition('|')
+        where = " AND (created_date < ? OR (created_date = ? AND id < ?))"
+        params = [created_date, created_date, confession_id]
+    page = _student_feed(get_connection(), where, params, "created_date DESC, id DESC", limit + 1)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = f"{page[-1]['created_date']}|{page[-1]['id']}"
+    return page, next_cursor
+
+def get_confessions_for_admin():
+    return _load_confessions(get_connection())
+
+def iter_confessions(approved=None):
+    """Confessions oldest first, streamed one at a time; approved=True/False picks one side"""
+    conn = get_connection()
+    if approved is None:
+        cursor = conn.execute("SELECT * FROM confessions ORDER BY seq")
+    else:
+        cursor = conn.execute("SELECT * FROM confessions WHERE is_approved = ? ORDER BY seq", (int(approved),))
+    yield from _stream(cursor, lambda rows: _confessions_from_rows(conn, rows))
+
+def get_moderation_queue(cursor=None, limit=20):
+    """One page of pending confessions, oldest first, and the cursor for the next page"""
+    where, params = " WHERE is_approved = 0", []
+    if cursor:
+        created_date, _, confession_id = cursor.partition('|')
+        where += " AND (created_date > ? OR (created_date = ? AND id > ?))"
+        params = [created_date, created_date, confession_id]
+    page = _load_confessions(get_connection(), where, params, "created_date, id", limit + 1)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = f"{page[-1]['created_date']}|{page[-1]['id']}"
+    return page, next_cursor
+
+MODERATION_ACTIONS = ("approve", "reject", "delete")
+
+def moderate_confessions(confession_ids, action):
+    """Approve, reject or delete many confessions in one transaction.
+
+    "reject" removes pending confessions and leaves approved ones alone;
+    "delete" removes any. Returns how many confessions the action applied to.
+    """
+    if action not in MODERATION_ACTIONS:
+        raise ValueError(f"unknown moderation action: {action}")
+    confession_ids = list(dict.fromkeys(confession_ids))
+    conn = get_connection()
+    applied = pending = 0
+    with conn:
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(confession_ids), 500):
+            chunk = confession_ids[start:start + 500]
+            ids = f"id IN ({_placeholders(chunk)})"
+            if action == "approve":
+                applied += conn.execute(f"SELECT COUNT(*) FROM confessions WHERE {ids}", chunk).fetchone()[0]
+                pending += conn.execute(f"UPDATE confessions SET is_approved = 1 WHERE {ids} AND is_approved = 0",
+                                        chunk).rowcount
+            elif action == "reject":
+                rejected = conn.execute(f"DELETE FROM confessions WHERE {ids} AND is_approved = 0", chunk).rowcount
+                applied += rejected
+                pending += rejected
+            else:
+                pending += conn.execute(f"SELECT COUNT(*) FROM confessions WHERE {ids} AND is_approved = 0",
+                                        chunk).fetchone()[0]
+                applied += conn.execute(f"DELETE FROM confessions WHERE {ids}", chunk).rowcount
+        # Approving turns pending into approved; deleting removes approved ones too
+        approved = pending if action == "approve" else -(applied - pending) if action == "delete" else 0
+        if pending or approved:
+            _bump_stats(conn, pending_confessions=-pending, approved_confessions=approved)
+    return applied
+
+def approve_confession(confession_id):
+    return moderate_confessions([confession_id], "approve") > 0
+
+def delete_confession(confession_id):
+    return moderate_confessions([confession_id], "delete") > 0
+
+def like_confession(confession_id, student_email):
+    """Like a confession once per student; returns False for unknown or repeat likes"""
+    conn = get_connection()
+    with conn:
+        if not _confession_exists(conn, confession_id):
+            return False
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO confession_likes (confession_id, anonymous_id, user_email) VALUES (?, ?, ?)",
+            (confession_id, None, student_email)
+        )
+        if cursor.rowcount == 0:
+            return False
+        conn.execute("UPDATE confessions SET likes_count = likes_count + 1 WHERE id = ?", (confession_id,))
+    return True
+
+def has_liked(confession_id, student_email):
+    row = get_connection().execute(
+        "SELECT 1 FROM confession_likes WHERE confession_id = ? AND user_email = ?",
+        (confession_id, student_email)
+    ).fetchone()
+    return row is not None
+
+def get_likes_count(confession):
+    row = get_connection().execute(
+        "SELECT likes_count FROM confessions WHERE id = ?", (confession.get('id'),)
+    ).fetchone()
+    return row["likes_count"] if row else 0
+
+def add_comment(confession_id, comment_data, user_email):
+    conn = get_connection()
+    with conn:
+        if not _confession_exists(conn, confession_id):
+            return False
+        comment_data['anonymous_id'] = f"anon_{str(uuid.uuid4())[:8]}"
+        comment_data['user_email'] = user_email
+        _insert_comment(conn, confession_id, comment_data)
+    return True
+
+# Search Functions
+def rebuild_search_index():
+    """Recreate the search documents from announcements, clubs and approved confessions"""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM search_index")
+        for statement in SEARCH_BACKFILL:
+            conn.execute(statement)
+    return conn.execute("SELECT COUNT(*) FROM search_index").fetchone()[0]
+
+def search(query, limit=20):
+    """Announcements, clubs and approved confessions matching every word of the query,
+    best first. Words of two or more letters also match as prefixes."""
+    words = tokenize(query)
+    if not words:
+        return []
+    match = " ".join(f'"{word}"*' if len(word) >= MIN_PREFIX else f'"{word}"' for word in words)
+    rows = get_connection().execute(
+        "SELECT kind, doc_id AS id, title, body, date, bm25(search_index, 0, 0, 2.0, 1.0, 0) AS rank "
+        "FROM search_index WHERE search_index MATCH ? ORDER BY rank LIMIT ?",
+        (match, limit)
+    )
+    return [search_result(dict(row), -row["rank"]) for row in rows]
+
+# Stats Functions
+STAT_NAMES = ["students", "clubs", "announcements", "pending_confessions", "approved_confessions",
+              "pending_club_requests", "messages_today"]
+
+def rebuild_stats():
+    """Recount every dashboard counter from the tables"""
+    conn = get_connection()
+    today = datetime.now().date().isoformat()
+    counts = {
+        "students": "SELECT COUNT(*) FROM students",
+        "clubs": "SELECT COUNT(*) FROM clubs",
+        "announcements": "SELECT COUNT(*) FROM announcements",
+        "pending_confessions": "SELECT COUNT(*) FROM confessions WHERE is_approved = 0",
+        "approved_confessions": "SELECT COUNT(*) FROM confessions WHERE is_approved = 1",
+        "pending_club_requests": "SELECT COUNT(*) FROM club_requests WHERE status = 'pending'",
+    }
+    stats = {name: conn.execute(query).fetchone()[0] for name, query in counts.items()}
+    stats["messages_today"] = conn.execute(
+        "SELECT COUNT(*) FROM messages WHERE timestamp >= ?", (today,)
+    ).fetchone()[0]
+    with conn:
+        conn.execute("DELETE FROM stats")
+        conn.executemany("INSERT INTO stats (name, value) VALUES (?, ?)",
+                         list(stats.items()) + [("messages_date", today)])
+    return stats
+
+def _bump_stats(conn, **deltas):
+    """Adjust counters inside the caller's transaction"""
+    today = datetime.now().date().isoformat()
+    if "messages_today" in deltas:
+        conn.execute(
+            "UPDATE stats SET value = 0 WHERE name = 'messages_today' AND "
+            "(SELECT value FROM stats WHERE name = 'messages_date') IS NOT ?", (today,)
+        )
+        conn.execute("INSERT OR REPLACE INTO stats (name, value) VALUES ('messages_date', ?)", (today,))
+    for name, delta in deltas.items():
+        conn.execute("UPDATE stats SET value = MAX(0, value + ?) WHERE name = ?", (delta, name))
+
+def get_stats():
+    """Dashboard counters: students, clubs, announcements, pending_confessions,
+    approved_confessions, pending_club_requests and messages_today"""
+    conn = get_connection()
+    stats = {row["name"]: row["value"] for row in conn.execute("SELECT name, value FROM stats")}
+    if not all(name in stats for name in STAT_NAMES):
+        return rebuild_stats()
+    if stats.pop("messages_date", None) != datetime.now().date().isoformat():
+        stats["messages_today"] = 0
+    return stats
+
+# JSON Import
+def _archive_segments(data_dir, directory):
+    """Record lists of the JSON backend's monthly archive files, oldest month first"""
+    path = os.path.join(data_dir, directory)
+    if os.path.isdir(path):
+        for segment in sorted(os.listdir(path)):
+            if segment.endswith(".json"):
+                yield serializers.load_file(os.path.join(path, segment), [])
+
+def import_json_data(data_dir, conn=None, defaults=False):
+    """Copy every collection from the JSON data directory into SQLite.
+
+    The directory is only read: files are decoded as they are on disk, so
+    write-behind journal segments that were never flushed are not included.
+    With defaults=True a collection without a file gets the JSON backend's
+    default data instead (admin account, sample clubs and announcements).
+    Rows that already exist are left untouched, so running it twice is harmless.
+    """
+    from database import SimpleDB
+
+    conn = conn or get_connection()
+    builders = SimpleDB(data_dir).default_collections() if defaults else {}
+
+    def load(filename, default):
+        data = serializers.load_file(os.path.join(data_dir, filename))
+        if data is None:
+            data = builders[filename]() if filename in builders else default
+        return data
+
+    counts = {}
+
+    with conn:
+        users = load("users.json", {})
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (email, password, role, name) VALUES (?, ?, ?, ?)",
+            [(email, user.get("password"), user.get("role"), user.get("name")) for email, user in users.items()]
+        )
+        counts["users"] = len(users)
+
+        columns = ["email", "name", "year", "major", "password", "security_question",
+                   "security_answer", "role", "joined_date"]
+        students = load("students.json", {})
+        conn.executemany(
+            f"INSERT OR IGNORE INTO students ({', '.join(columns)}) VALUES ({_placeholders(columns)})",
+            [[email if column == "email" else student.get(column) for column in columns]
+             for email, student in students.items()]
+        )
+        counts["students"] = len(students)
+
+        announcements = load("announcements.json", [])
+        conn.executemany(
+            f"INSERT OR IGNORE INTO announcements ({', '.join(ANNOUNCEMENT_COLUMNS)}) "
+            f"VALUES ({_placeholders(ANNOUNCEMENT_COLUMNS)})",
+            [[announcement.get(column) for column in ANNOUNCEMENT_COLUMNS] for announcement in announcements]
+        )
+        counts["announcements"] = len(announcements)
+        archived = 0
+        for announcements in _archive_segments(data_dir, ANNOUNCEMENT_ARCHIVE_DIR):
+            conn.executemany(
+                f"INSERT OR IGNORE INTO announcement_archive ({', '.join(ANNOUNCEMENT_COLUMNS)}) "
+                f"VALUES ({_placeholders(ANNOUNCEMENT_COLUMNS)})",
+                [[announcement.get(column) for column in ANNOUNCEMENT_COLUMNS] for announcement in announcements]
+            )
+            archived += len(announcements)
+        counts["archived_announcements"] = archived
+
+        clubs = load("clubs.json", {})
+        for club_id, club in clubs.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO clubs "
+                "(id, name, category, description, meeting_schedule, location, created_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (club_id, club.get("name"), club.get("category"), club.get("description"),
+                 club.get("meeting_schedule"), club.get("location"), club.get("created_date"))
+            )
+            for role, key in (("member", "members"), ("pending", "pending_requests"), ("admin", "admins")):
+                conn.executemany(
+                    "INSERT OR IGNORE INTO club_members (club_id, email, role) VALUES (?, ?, ?)",
+                    [(club_id, email, role) for email in club.get(key, [])]
+                )
+        counts["clubs"] = len(clubs)
+
+        requests = load("club_requests.json", [])
+        conn.executemany(
+            "INSERT OR IGNORE INTO club_requests "
+            "(id, student_email, club_id, status, request_date, processed_date) VALUES (?, ?, ?, ?, ?, ?)",
+            [(r.get("id"), r.get("student_email"), r.get("club_id"), r.get("status"),
+              r.get("request_date"), r.get("processed_date")) for r in requests]
+        )
+        counts["club_requests"] = len(requests)
+        archived = 0
+        for requests in _archive_segments(data_dir, CLUB_REQUEST_ARCHIVE_DIR):
+            conn.executemany(
+                f"INSERT OR IGNORE INTO club_request_archive ({', '.join(CLUB_REQUEST_COLUMNS)}) "
+                f"VALUES ({_placeholders(CLUB_REQUEST_COLUMNS)})",
+                [[request.get(column) for column in CLUB_REQUEST_COLUMNS] for request in requests]
+            )
+            archived += len(requests)
+        counts["archived_club_requests"] = archived
+
+        chat_count = message_count = 0
+        for chat_id, chat, messages in read_chat_dir(data_dir):
+            _insert_chat(conn, chat_id, chat.get("participants", []), chat.get("created_date"))
+            conn.executemany(
+                "INSERT OR IGNORE INTO messages (id, chat_id, sender, message, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [(m.get("id"), chat_id, m.get("sender"), m.get("message"), m.get("timestamp")) for m in messages]
+            )
+            chat_count += 1
+            message_count += len(messages)
+        for statement in INBOX_BACKFILL:
+            conn.execute(statement)
+        counts["chats"] = chat_count
+        counts["messages"] = message_count
+
+        calls = load("calls.json", [])
+        for call in calls:
+            _insert_call(conn, call)
+        counts["calls"] = len(calls)
+        archived = 0
+        for calls in _archive_segments(data_dir, CALL_ARCHIVE_DIR):
+            _archive_calls(conn, calls)
+            archived += len(calls)
+        counts["archived_calls"] = archived
+
+        confessions = load("confessions.json", [])
+        for confession in confessions:
+            if _confession_exists(conn, confession.get("id")):
+                continue
+            _insert_confession(conn, confession)
+            for comment in confession.get("comments", []):
+                _insert_comment(conn, confession.get("id"), comment)
+        counts["confessions"] = len(confessions)
+
+        like_log = os.path.join(data_dir, LikeStore.FILENAME)
+        if os.path.exists(like_log):
+            like_rows = set(read_like_log(like_log))
+        else:
+            # Likes still stored inside each confession, from before the like log
+            like_rows = {(confession.get("id"), like.get("user_email"))
+                         for confession in confessions for like in confession.get("likes", [])}
+        conn.executemany(
+            "INSERT OR IGNORE INTO confession_likes (confession_id, user_email) "
+            "SELECT ?1, ?2 WHERE EXISTS (SELECT 1 FROM confessions WHERE id = ?1)",
+            like_rows
+        )
+        conn.execute(
+            "UPDATE confessions SET likes_count = "
+            "(SELECT COUNT(*) FROM confession_likes WHERE confession_id = confessions.id)"
+        )
+        counts["likes"] = len(like_rows)
+
+        # Dashboard counters are recomputed on the next get_stats()
+        conn.execute("DELETE FROM stats")
+
+    return counts
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else get_setting("storage", "data_dir", "data")
+    for collection, count in import_json_data(data_dir).items():
+        print(f"{collection}: {count}")